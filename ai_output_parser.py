@@ -0,0 +1,334 @@
+"""
+AI Output Parser - incremental parsing of LLM question and evaluation replies
+
+Question replies ("Q1: ..." blocks with options, answers and explanations),
+quiz replies (the same with a "Type:" line) and evaluation replies (SCORE /
+FEEDBACK / SUGGESTIONS / HINTS, optionally in "ANSWER <n>" blocks of a
+batched reply) are parsed by one line tokenizer: a single compiled regex
+classifies every line, and a small state machine assembles the blocks. Text
+can be fed in arbitrary chunks, so a streamed completion is parsed as it
+arrives and every block is returned as soon as the next one starts.
+Malformed blocks are recorded in `errors` instead of being dropped silently.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Start of a line that carries structure, one alternative per kind; the name of the matching
+# group is the token type and the rest of the line is its text
+_LINE = re.compile(r"""
+    [ \t*#(]*(?:
+        Q(?:uestion)?[ \t]*(?P<question>\d+)[ \t]*[:.)][ \t*]*
+      | (?P<option>[A-Ea-e])[).][ \t]+
+      | ANSWER[ \t]+(?P<answer>\d+)[ \t]*:?[ \t*]*$
+      | (?P<field>type|correct[ \t]answer|explanation|sample[ \t]answer|key[ \t]points
+                 |score|feedback|suggestions|hints)[ \t*]*:[ \t*]*
+      | (?P<separator>-{3,}|={3,})[ \t]*$
+    )
+""", re.IGNORECASE | re.VERBOSE)
+
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+_OPTION_LETTER = re.compile(r'^\(?([a-e])\b', re.IGNORECASE)
+
+# Field names as written by the model, mapped to the keys they fill
+_FIELD_KEYS = {
+    'type': 'type',
+    'correct answer': 'correct_answer',
+    'explanation': 'explanation',
+    'sample answer': 'sample_answer',
+    'key points': 'key_points',
+    'score': 'score',
+    'feedback': 'feedback_text',
+    'suggestions': 'suggestions',
+    'hints': 'hints'
+}
+
+# Fields after which an option line can still follow (question text, "Type:" line or another option)
+_OPTION_FIELDS = frozenset(('question', 'type', None))
+
+class _BlockParser:
+    """Line buffering and block assembly shared by the three reply formats"""
+
+    # Token type that starts a new block, and the key its text goes to
+    header = 'question'
+    header_field = 'question'
+
+    def __init__(self):
+        self.errors = []
+        self._partial = ''
+        self._block = None
+        self._field = None
+        self._blocks_seen = 0
+
+    def feed(self, text: str) -> List[Dict]:
+        """Consume a chunk of the reply, returning the records completed by it"""
+        self._partial += text
+        end = self._partial.rfind('\n')
+        if end == -1:
+            return []
+
+        # Only complete lines are tokenized; the unfinished last line waits for the next chunk
+        segment = self._partial[:end]
+        self._partial = self._partial[end + 1:]
+        records = []
+        self._consume(segment, records)
+        return records
+
+    def close(self) -> List[Dict]:
+        """Consume the rest of the reply, returning the remaining records"""
+        records = []
+        if self._partial:
+            self._consume(self._partial, records)
+            self._partial = ''
+        self._finish(records)
+        return records
+
+    def parse(self, text: str) -> List[Dict]:
+        """Parse a complete reply"""
+        return self.feed(text) + self.close()
+
+    def _consume(self, segment: str, records: List[Dict]) -> None:
+        # The state lives in locals while the lines of a chunk are consumed
+        match_line = _LINE.match
+        header = self.header
+        block = self._block
+        field = self._field
+
+        for line in segment.split('\n'):
+            match = match_line(line)
+            kind = match.lastgroup if match is not None else None
+
+            if kind == header:
+                self._block = block
+                self._finish(records)
+                self._blocks_seen += 1
+                block = self._start(match, line[match.end():].strip(' *'))
+                field = self.header_field
+                continue
+
+            if kind is not None and block is None:
+                block = self._implicit_block()
+                if block is None:
+                    continue  # preamble before the first block
+                self._blocks_seen += 1
+
+            if kind == 'field':
+                name = match.group('field').lower()
+                field = _FIELD_KEYS.get(name) or _FIELD_KEYS[' '.join(name.split())]
+                block[field] = line[match.end():].strip()
+            elif kind == 'option' and field in _OPTION_FIELDS and self._is_mcq(block):
+                field = None
+                block.setdefault('options', {})[match.group('option').lower()] = line[match.end():].strip()
+            elif kind == 'separator':
+                field = None
+            elif field is not None:
+                # Continuation of the question text or of the last field
+                text = line.strip()
+                if text:
+                    previous = block.get(field)
+                    block[field] = f"{previous} {text}" if previous else text
+
+        self._block = block
+        self._field = field
+
+    def _finish(self, records: List[Dict]) -> None:
+        if self._block is None:
+            return
+        block, self._block, self._field = self._block, None, None
+        record, error = self._build(block)
+        if error:
+            self.errors.append({'block': self._blocks_seen, 'error': error,
+                                'question': str(block.get('question', ''))[:80]})
+        if record is not None:
+            records.append(record)
+
+    def _start(self, match, text: str) -> Dict:
+        return {'question': text}
+
+    def _implicit_block(self) -> Optional[Dict]:
+        return None
+
+    def _is_mcq(self, block: Dict) -> bool:
+        # Elsewhere a line like "E. coli ..." is text, not an option
+        return False
+
+    def _build(self, block: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+        raise NotImplementedError
+
+def _correct_option(answer: str) -> str:
+    """Option letter of a "Correct Answer:" value such as "B", "b)" or "B) Newton" """
+    match = _OPTION_LETTER.match(answer.strip())
+    return match.group(1).lower() if match else answer.strip().lower()
+
+def _mcq_error(block: Dict) -> Optional[str]:
+    options = block.get('options', {})
+    if len(options) < 2:
+        return 'multiple choice question without options'
+    if _correct_option(block.get('correct_answer', '')) not in options:
+        return 'correct answer is not one of the options'
+    return None
+
+class QuestionParser(_BlockParser):
+    """Replies to the question generation prompt"""
+
+    def __init__(self, subject: str, topic: str, difficulty: str, question_type: str, language: str = 'en'):
+        super().__init__()
+        self.question_type = question_type
+        self.defaults = {
+            'subject': subject,
+            'topic': topic,
+            'difficulty': difficulty,
+            'type': question_type,
+            'language': language,
+            'source': 'ai_generated'
+        }
+
+    def _is_mcq(self, block):
+        return self.question_type.lower() == 'mcq'
+
+    def _build(self, block):
+        if not block.get('question'):
+            return None, 'question text missing'
+
+        question_data = dict(self.defaults, question=block['question'])
+        if self.question_type.lower() == 'mcq':
+            error = _mcq_error(block)
+            if error:
+                return None, error
+            question_data['options'] = block['options']
+            question_data['correct_answer'] = _correct_option(block.get('correct_answer', ''))
+            question_data['explanation'] = block.get('explanation', '')
+        elif self.question_type.lower() in ['short_answer', 'descriptive']:
+            question_data['sample_answer'] = block.get('sample_answer', '')
+            question_data['key_points'] = block.get('key_points', '')
+        return question_data, None
+
+class QuizParser(_BlockParser):
+    """Replies to the quiz-from-title prompt, whose blocks carry their own "Type:" line"""
+
+    def __init__(self, subject: str, difficulty: str):
+        super().__init__()
+        self.defaults = {
+            'subject': subject,
+            'topic': 'AI Generated',
+            'difficulty': difficulty,
+            'language': 'en',
+            'source': 'ai_generated_quiz'
+        }
+
+    def _is_mcq(self, block):
+        declared = block.get('type', '').lower()
+        return not declared or not ('short' in declared or 'descriptive' in declared)
+
+    def _build(self, block):
+        if not block.get('question'):
+            return None, 'question text missing'
+
+        declared = block.get('type', '').lower()
+        if 'short' in declared:
+            question_type = 'short_answer'
+        elif 'descriptive' in declared:
+            question_type = 'descriptive'
+        elif declared or block.get('options'):
+            question_type = 'mcq'
+        else:
+            question_type = 'short_answer' if block.get('sample_answer') else 'mcq'
+
+        question_data = dict(self.defaults, type=question_type, question=block['question'])
+        if question_type == 'mcq':
+            error = _mcq_error(block)
+            if error:
+                return None, error
+            question_data['options'] = block['options']
+            question_data['correct_answer'] = _correct_option(block.get('correct_answer', ''))
+            question_data['explanation'] = block.get('explanation', '')
+            question_data['marks'] = 2
+        else:
+            question_data['sample_answer'] = block.get('sample_answer', '')
+            question_data['key_points'] = block.get('key_points') or 'Key concepts and explanations'
+            question_data['marks'] = 5
+        return question_data, None
+
+class EvaluationParser(_BlockParser):
+    """Replies to the grading prompts
+
+    Without answer_count the whole reply is one evaluation. With answer_count it is a batched
+    reply of "ANSWER <n>" blocks, and `evaluations()` lists one evaluation per answer, None for
+    answers whose block is missing or malformed.
+    """
+
+    header = 'answer'
+    header_field = None
+
+    def __init__(self, max_marks: int, answer_count: Optional[int] = None):
+        super().__init__()
+        self.max_marks = max_marks
+        self.answer_count = answer_count
+        self._evaluations = [None] * (answer_count or 0)
+
+    def _start(self, match, text):
+        return {'number': int(match.group('answer'))}
+
+    def _implicit_block(self):
+        # A single evaluation has no header; a batched reply ignores text before the first one
+        return {'number': 1} if self.answer_count is None else None
+
+    def _build(self, block):
+        evaluation = {
+            'score': 0,
+            'max_score': self.max_marks,
+            'feedback_text': block.get('feedback_text', ''),
+            'suggestions': block.get('suggestions', ''),
+            'hints': block.get('hints', '')
+        }
+        error = None
+        score = _NUMBER.search(block.get('score', ''))
+        if score:
+            evaluation['score'] = min(float(score.group()), self.max_marks)
+        else:
+            error = 'SCORE missing or not a number'
+
+        if self.answer_count is None:
+            # The caller decides whether a score-less evaluation is usable
+            return evaluation, error
+
+        number = block['number']
+        if error:
+            return None, f'answer {number}: {error}'
+        if not 1 <= number <= self.answer_count:
+            return None, f'answer {number} is out of range'
+        if self._evaluations[number - 1] is not None:
+            return None, f'answer {number} is repeated'
+        evaluation['answer'] = number
+        self._evaluations[number - 1] = evaluation
+        return evaluation, None
+
+    def evaluations(self) -> List[Optional[Dict]]:
+        """Evaluations in answer order (batched replies)"""
+        return [None if evaluation is None else {key: value for key, value in evaluation.items() if key != 'answer'}
+                for evaluation in self._evaluations]
+
+def parse_questions(text: str, subject: str, topic: str, difficulty: str,
+                    question_type: str, language: str = 'en') -> Tuple[List[Dict], List[Dict]]:
+    """Questions and malformed block reports of a question generation reply"""
+    parser = QuestionParser(subject, topic, difficulty, question_type, language)
+    return parser.parse(text), parser.errors
+
+def parse_quiz_questions(text: str, subject: str, difficulty: str) -> Tuple[List[Dict], List[Dict]]:
+    """Questions and malformed block reports of a quiz-from-title reply"""
+    parser = QuizParser(subject, difficulty)
+    return parser.parse(text), parser.errors
+
+def parse_evaluation(text: str, max_marks: int) -> Tuple[Dict, List[Dict]]:
+    """The evaluation of a single-answer grading reply and its problems"""
+    parser = EvaluationParser(max_marks)
+    evaluations = parser.parse(text)
+    if evaluations:
+        return evaluations[0], parser.errors
+    return {'score': 0, 'max_score': max_marks, 'feedback_text': '', 'suggestions': '', 'hints': ''}, parser.errors
+
+def parse_batch_evaluation(text: str, max_marks: int, answer_count: int) -> Tuple[List[Optional[Dict]], List[Dict]]:
+    """Per-answer evaluations of a batched grading reply and its problems"""
+    parser = EvaluationParser(max_marks, answer_count)
+    parser.parse(text)
+    return parser.evaluations(), parser.errors
@@ -1,15 +1,27 @@
 import os
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory, make_response, g, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 import json
+from bson import ObjectId
 
 # Import our modules
-from database import db
-from auth import auth_manager, teacher_required, student_required, auth_required
-from question_generator import question_generator
+from database import db, DuplicateSubmissionError
+from auth import auth_manager, teacher_required, student_required, auth_required, revoke_user_tokens
+from question_generator import question_generator, SectionConfigError
 from evaluator import evaluator
+from grading_queue import grading_queue
+from evaluation_cache import evaluation_cache
+from grading_plan import grading_plans
+from question_stats import question_stats
+from question_pool import question_pool
+from generation_cache import generation_cache
+from password_hasher import password_hasher
+from dashboard_queries import dashboard_queries
+from exam_snapshot import exam_snapshots, HIDDEN_QUESTION_FIELDS
+from pagination import InvalidCursorError, listing_response
+from question_import import QuestionImporter, REQUIRED_QUESTION_FIELDS, QUESTION_IMPORT_BATCH_SIZE, detect_format
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -23,6 +35,12 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key')
 CORS(app)
 auth_manager.init_app(app)
 
+@app.before_request
+def start_grading_workers():
+    # Jobs left queued or leased by a previous process are picked up without waiting for a new
+    # submission. Started in the serving process (after any fork); a no-op once running
+    grading_queue.start()
+
 # Static files route
 @app.route('/static/<path:filename>')
 def static_files(filename):
@@ -34,6 +52,13 @@ def index():
     return render_template('index.html')
 
 # Authentication Routes
+def _auth_response(result, status_code):
+    """JSON response for an auth result, telling clients when to retry if hashing is overloaded"""
+    response = make_response(jsonify(result), status_code)
+    if status_code == 503 and 'retry_after' in result:
+        response.headers['Retry-After'] = str(result['retry_after'])
+    return response
+
 @app.route('/api/register', methods=['POST'])
 def register():
     try:
@@ -53,7 +78,7 @@ def register():
             full_name=data.get('full_name', '')
         )
 
-        return jsonify(result), status_code
+        return _auth_response(result, status_code)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -66,7 +91,7 @@ def login():
             return jsonify({'error': 'Email and password are required'}), 400
 
         result, status_code = auth_manager.login_user(data['email'], data['password'])
-        return jsonify(result), status_code
+        return _auth_response(result, status_code)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -74,13 +99,18 @@ def login():
 @auth_required
 def get_profile():
     try:
-        user_id = get_jwt_identity()
-        user = db.get_user_by_id(user_id)
-
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        return jsonify({'user': g.current_user}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        return jsonify({'user': user}), 200
+@app.route('/api/sessions/revoke', methods=['POST'])
+@auth_required
+def revoke_sessions():
+    try:
+        # Signs the user out everywhere; they need to log in again
+        if not revoke_user_tokens(g.current_user['_id']):
+            return jsonify({'error': 'Failed to revoke sessions'}), 500
+        return jsonify({'message': 'All sessions revoked'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -130,13 +160,30 @@ def generate_questions():
             question_type=data['type'],
             count=data['count'],
             language=data.get('language', 'en'),
-            ai_ratio=data.get('ai_ratio', 0.5)
+            ai_ratio=data.get('ai_ratio', 0.5),
+            fresh=data.get('fresh', False)
         )
 
         return jsonify({'questions': questions}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/question-pool/stats', methods=['GET'])
+@teacher_required
+def get_question_pool_stats():
+    try:
+        return jsonify(question_pool.stats()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _quiz_question_count(data):
+    """Requested number of quiz questions, None unless it is a positive integer"""
+    try:
+        count = int(data.get('count', 5))
+    except (TypeError, ValueError):
+        return None
+    return count if count > 0 else None
+
 @app.route('/api/generate-quiz-from-title', methods=['POST'])
 @teacher_required
 def generate_quiz_from_title():
@@ -157,8 +204,11 @@ def generate_quiz_from_title():
             if field not in data:
                 return jsonify({'error': f'{field} is required'}), 400
 
+        requested_count = _quiz_question_count(data)
+        if requested_count is None:
+            return jsonify({'error': 'count must be a positive integer'}), 400
+
         # Generate AI-powered questions based on quiz title
-        requested_count = data.get('count', 5)
         print(f"🎯 Calling question generator with count: {requested_count}")
 
         questions = question_generator.generate_quiz_questions_from_title(
@@ -166,7 +216,8 @@ def generate_quiz_from_title():
             subject=data['subject'],
             difficulty=data.get('difficulty', 'medium'),
             count=requested_count,
-            question_types=data.get('question_types', ['mcq', 'short_answer'])
+            question_types=data.get('question_types', ['mcq', 'short_answer']),
+            fresh=data.get('fresh', False)
         )
 
         print(f"📊 Question generator returned {len(questions)} questions")
@@ -175,11 +226,67 @@ def generate_quiz_from_title():
             'questions': questions,
             'quiz_title': data['quiz_title'],
             'total_questions': len(questions),
-            'generation_method': 'AI-powered' if questions and questions[0].get('source') == 'ai_generated_quiz' else 'Enhanced Template'
+            'generation_method': 'AI-powered' if questions and questions[0].get('source', '').startswith('ai_generated_quiz') else 'Enhanced Template'
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.route('/api/generate-quiz-from-title/stream', methods=['POST'])
+@teacher_required
+def stream_quiz_from_title():
+    try:
+        data = request.get_json()
+
+        # Validate required fields
+        required_fields = ['quiz_title', 'subject']
+        for field in required_fields:
+            if field not in data:
+                return jsonify({'error': f'{field} is required'}), 400
+
+        # Checked before the stream starts; a bad count would otherwise fail inside the generator
+        count = _quiz_question_count(data)
+        if count is None:
+            return jsonify({'error': 'count must be a positive integer'}), 400
+
+        questions = question_generator.stream_quiz_questions_from_title(
+            quiz_title=data['quiz_title'],
+            subject=data['subject'],
+            difficulty=data.get('difficulty', 'medium'),
+            count=count,
+            question_types=data.get('question_types', ['mcq', 'short_answer']),
+            fresh=data.get('fresh', False)
+        )
+
+        # One "question" event per question as soon as it is parsed, then "done"
+        def events():
+            total = 0
+            generation_method = 'Enhanced Template'
+            try:
+                for question in questions:
+                    if total == 0 and question.get('source', '').startswith('ai_generated_quiz'):
+                        generation_method = 'AI-powered'
+                    yield _sse_event('question', {'index': total, 'question': question})
+                    total += 1
+                yield _sse_event('done', {
+                    'quiz_title': data['quiz_title'],
+                    'total_questions': total,
+                    'generation_method': generation_method
+                })
+            except Exception as e:
+                yield _sse_event('error', {'error': str(e)})
+
+        response = Response(stream_with_context(events()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # Keep reverse proxies from buffering the stream
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/question-bank/browse', methods=['GET'])
 @auth_required
 def browse_question_bank():
@@ -222,8 +329,7 @@ def browse_question_bank():
 @auth_required
 def get_question_bank_subjects():
     try:
-        from static_question_bank import get_subjects
-        subjects = get_subjects()
+        subjects = question_stats.subjects()
         return jsonify({'subjects': subjects}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -232,12 +338,11 @@ def get_question_bank_subjects():
 @auth_required
 def get_question_bank_topics():
     try:
-        from static_question_bank import get_topics
         subject = request.args.get('subject')
         if not subject:
             return jsonify({'error': 'Subject parameter is required'}), 400
 
-        topics = get_topics(subject)
+        topics = question_stats.topics(subject)
         return jsonify({'topics': topics}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -246,9 +351,12 @@ def get_question_bank_topics():
 @auth_required
 def get_question_bank_stats():
     try:
-        from static_question_bank import get_question_stats
-        stats = get_question_stats()
-        return jsonify(stats), 200
+        stats = question_stats.snapshot()
+
+        # Clients revalidate with If-None-Match and get a 304 while the counters are unchanged
+        response = make_response(jsonify(stats), 200)
+        response.set_etag(stats['version'])
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -256,21 +364,16 @@ def get_question_bank_stats():
 @teacher_required
 def get_question_bank():
     try:
-        subject = request.args.get('subject')
-        topic = request.args.get('topic')
-        difficulty = request.args.get('difficulty')
-        question_type = request.args.get('type')
-        limit = request.args.get('limit', type=int)
-
-        questions = db.get_questions_from_bank(
-            subject=subject,
-            topic=topic,
-            difficulty=difficulty,
-            question_type=question_type,
-            limit=limit
+        # Paged with ?limit=&cursor=, or streamed as NDJSON with ?format=ndjson
+        pager = db.question_bank_pager(
+            subject=request.args.get('subject'),
+            topic=request.args.get('topic'),
+            difficulty=request.args.get('difficulty'),
+            question_type=request.args.get('type')
         )
-
-        return jsonify({'questions': questions}), 200
+        return listing_response(pager, 'questions')
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -281,8 +384,7 @@ def add_question_to_bank():
         data = request.get_json()
 
         # Validate required fields
-        required_fields = ['question', 'subject', 'topic', 'difficulty', 'type']
-        for field in required_fields:
+        for field in REQUIRED_QUESTION_FIELDS:
             if field not in data:
                 return jsonify({'error': f'{field} is required'}), 400
 
@@ -298,6 +400,28 @@ def add_question_to_bank():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/questions/bank/import', methods=['POST'])
+@teacher_required
+def import_questions_to_bank():
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return jsonify({'error': 'A CSV or JSONL file is required'}), 400
+
+        file_format = (request.form.get('format') or detect_format(upload.filename)).lower()
+        if file_format not in ('csv', 'jsonl'):
+            return jsonify({'error': 'format must be csv or jsonl'}), 400
+
+        batch_size = request.form.get('batch_size', QUESTION_IMPORT_BATCH_SIZE, type=int)
+
+        # The upload is parsed as a stream, one row at a time
+        summary = QuestionImporter(batch_size).import_stream(
+            upload.stream, file_format, created_by=get_jwt_identity()
+        )
+        return jsonify(summary), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Exam Management Routes
 @app.route('/api/exams', methods=['POST'])
 @teacher_required
@@ -350,9 +474,13 @@ def create_exam():
         exam_id = db.create_exam(exam_data)
 
         if exam_id:
+            # Prepare the student delivery copy before anyone asks for it
+            exam_snapshots.build(exam_id)
             return jsonify({'message': 'Exam created successfully', 'exam_id': exam_id, 'paper': paper}), 201
         else:
             return jsonify({'error': 'Failed to create exam'}), 500
+    except SectionConfigError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -361,14 +489,16 @@ def create_exam():
 def get_exams():
     try:
         user_id = get_jwt_identity()
-        user = db.get_user_by_id(user_id)
+        user = g.current_user
 
         if user['role'] == 'teacher':
-            exams = db.get_exams_by_teacher(user_id)
+            pager = db.exams_pager(teacher_id=user_id)
         else:
-            exams = db.get_available_exams()
+            pager = db.exams_pager()
 
-        return jsonify({'exams': exams}), 200
+        return listing_response(pager, 'exams')
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -376,20 +506,98 @@ def get_exams():
 @auth_required
 def get_exam(exam_id):
     try:
-        exam = db.get_exam_by_id(exam_id)
+        if g.current_user['role'] == 'teacher':
+            exam = db.get_exam_by_id(exam_id)
+
+            if not exam:
+                return jsonify({'error': 'Exam not found'}), 404
+
+            return jsonify({'exam': exam}), 200
+
+        # Students get the precomputed copy without answers, served from memory
+        snapshot = exam_snapshots.get(exam_id)
+        if not snapshot:
+            return jsonify({'error': 'Exam not found'}), 404
+
+        if request.if_none_match.contains(snapshot.etag):
+            response = make_response('', 304)
+        else:
+            body, encoding = snapshot.encoded(request.headers.get('Accept-Encoding', ''))
+            response = make_response(body, 200)
+            response.headers['Content-Type'] = 'application/json'
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(snapshot.etag)
+        response.headers['Vary'] = 'Accept-Encoding, Authorization'
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Exam fields a teacher can change after creation
+EDITABLE_EXAM_FIELDS = ('title', 'description', 'duration', 'is_active', 'start_time', 'end_time', 'paper_data')
 
+@app.route('/api/exams/<exam_id>', methods=['PUT'])
+@teacher_required
+def update_exam(exam_id):
+    try:
+        data = request.get_json() or {}
+
+        exam = db.get_exam_by_id(exam_id, include_paper=False)
         if not exam:
             return jsonify({'error': 'Exam not found'}), 404
+        if exam['created_by'] != get_jwt_identity():
+            return jsonify({'error': 'Access denied'}), 403
 
-        return jsonify({'exam': exam}), 200
+        updates = {field: data[field] for field in EDITABLE_EXAM_FIELDS if field in data}
+        if not updates:
+            return jsonify({'error': f"Nothing to update, editable fields: {', '.join(EDITABLE_EXAM_FIELDS)}"}), 400
+
+        paper = updates.get('paper_data')
+        if paper is not None:
+            if not isinstance(paper, dict) or not isinstance(paper.get('sections'), list):
+                return jsonify({'error': 'paper_data must have a sections list'}), 400
+            # Totals follow the per-question marks the evaluator grades with
+            for section in paper['sections']:
+                section['total_marks'] = sum(question.get('marks', 1) for question in section.get('questions', []))
+            paper['total_marks'] = sum(section['total_marks'] for section in paper['sections'])
+            updates['total_marks'] = paper['total_marks']
+
+        # update_exam bumps the exam version, so compiled grading plans and student copies are rebuilt
+        if not db.update_exam(exam_id, updates):
+            return jsonify({'error': 'Failed to update exam'}), 500
+        exam_snapshots.build(exam_id)
+
+        return jsonify({'message': 'Exam updated successfully', 'exam_id': exam_id}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/exams/<exam_id>/answers', methods=['GET'])
+@student_required
+def get_exam_answers(exam_id):
+    try:
+        # The answer key is only revealed after the student has submitted
+        if not db.get_response(exam_id, get_jwt_identity()):
+            return jsonify({'error': 'Submit the exam to see the answers'}), 403
+
+        exam = db.get_exam_by_id(exam_id)
+        if not exam:
+            return jsonify({'error': 'Exam not found'}), 404
+
+        paper = exam.get('paper_data', {})
+        questions = [question for section in paper.get('sections', []) for question in section.get('questions', [])]
+        questions = questions or paper.get('questions', [])
+
+        answers = [{field: question.get(field) for field in HIDDEN_QUESTION_FIELDS} for question in questions]
+        return jsonify({'answers': answers}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/exams/<exam_id>/responses', methods=['POST'])
 @student_required
-def submit_exam_response():
+def submit_exam_response(exam_id):
     try:
-        exam_id = request.view_args['exam_id']
         data = request.get_json()
 
         if 'responses' not in data:
@@ -397,45 +605,43 @@ def submit_exam_response():
 
         student_id = get_jwt_identity()
 
-        # Check if student has already submitted
-        existing_response = db.get_response(exam_id, student_id)
-        if existing_response:
-            return jsonify({'error': 'You have already submitted this exam'}), 400
-
-        # Get exam data
-        exam = db.get_exam_by_id(exam_id)
-        if not exam:
+        # Get the compiled grading plan of the exam
+        plan = grading_plans.get(exam_id)
+        if not plan:
             return jsonify({'error': 'Exam not found'}), 404
 
-        # Evaluate responses
-        evaluation = evaluator.evaluate_exam_response(exam['paper_data'], data['responses'])
-
-        # Save response
+        # Save response first; the unique (exam_id, student_id) index rejects a second submission
         response_data = {
             'exam_id': exam_id,
             'student_id': student_id,
             'responses': data['responses'],
-            'evaluation': evaluation
+            'grading_status': 'grading'
         }
 
-        response_id = db.save_response(response_data)
+        try:
+            response_id = db.save_response(response_data)
+        except DuplicateSubmissionError:
+            return jsonify({'error': 'You have already submitted this exam'}), 400
 
-        if response_id:
-            return jsonify({
-                'message': 'Exam submitted successfully',
-                'response_id': response_id,
-                'evaluation': evaluation
-            }), 201
-        else:
+        if not response_id:
             return jsonify({'error': 'Failed to submit exam'}), 500
+
+        # Evaluate responses
+        evaluation = evaluator.evaluate_exam_response(plan.paper, data['responses'], grading_plan=plan)
+        db.update_response_score(response_id, evaluation['total_score'], evaluation['overall_feedback'], evaluation)
+
+        return jsonify({
+            'message': 'Exam submitted successfully',
+            'response_id': response_id,
+            'evaluation': evaluation
+        }), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/exams/<exam_id>/submit', methods=['POST'])
 @student_required
-def submit_exam():
+def submit_exam(exam_id):
     try:
-        exam_id = request.view_args['exam_id']
         data = request.get_json()
 
         if 'answers' not in data:
@@ -443,72 +649,125 @@ def submit_exam():
 
         student_id = get_jwt_identity()
 
-        # Check if student has already submitted
-        existing_response = db.get_response(exam_id, student_id)
-        if existing_response:
-            return jsonify({'error': 'You have already submitted this exam'}), 400
-
-        # Get exam data
-        exam = db.get_exam_by_id(exam_id)
-        if not exam:
+        # Get the compiled grading plan of the exam
+        plan = grading_plans.get(exam_id)
+        if not plan:
             return jsonify({'error': 'Exam not found'}), 404
 
-        # Convert answers format to responses format
-        responses = {}
-        for question_index, answer in data['answers'].items():
-            responses[f"question_{question_index}"] = answer
-
-        # Evaluate responses
-        evaluation = evaluator.evaluate_exam_response(exam['paper_data'], responses)
-
-        # Calculate additional metrics
-        # Get total questions from all sections
-        total_questions = 0
-        if 'sections' in exam['paper_data']:
-            for section in exam['paper_data']['sections']:
-                if 'questions' in section:
-                    total_questions += len(section['questions'])
-        else:
-            # Fallback for old structure
-            total_questions = len(exam['paper_data'].get('questions', []))
+        # Answers are keyed by flat question index, map them to section question ids
+        responses = plan.map_flat_answers(data['answers'])
+        total_questions = plan.total_questions
 
         answered_questions = len([a for a in data['answers'].values() if a])
-        correct_answers = evaluation.get('correct_answers', 0)
-        total_marks = evaluation.get('total_marks', total_questions)
-        score = evaluation.get('score', 0)
-        percentage = round((score / total_marks) * 100, 1) if total_marks > 0 else 0
 
-        # Save response with additional data
+        # Save the raw answers; evaluation happens in the grading queue
         response_data = {
             'exam_id': exam_id,
             'student_id': student_id,
             'responses': responses,
             'answers': data['answers'],
-            'evaluation': evaluation,
+            'grading_status': 'queued',
+            'total_questions': total_questions,
+            'answered_questions': answered_questions,
             'time_taken': data.get('time_taken', 0),
             'auto_submitted': data.get('auto_submitted', False),
             'security_events': data.get('security_events', {}),
             'submitted_at': datetime.utcnow()
         }
 
-        response_id = db.save_response(response_data)
-
-        if response_id:
-            return jsonify({
-                'message': 'Exam submitted successfully',
-                'response_id': response_id,
-                'score': score,
-                'total_marks': total_marks,
-                'percentage': percentage,
-                'correct_answers': correct_answers,
-                'total_questions': total_questions,
-                'answered_questions': answered_questions,
-                'time_taken': data.get('time_taken', 0),
-                'evaluation': evaluation
-            }), 201
-        else:
+        # A single insert; the unique (exam_id, student_id) index rejects double submits
+        try:
+            response_id = db.save_response(response_data)
+        except DuplicateSubmissionError:
+            return jsonify({'error': 'You have already submitted this exam'}), 400
+
+        if not response_id:
             return jsonify({'error': 'Failed to submit exam'}), 500
 
+        job_id = grading_queue.enqueue(response_id, exam_id, student_id)
+        if job_id is None:
+            # Without a job nobody would grade the response: grade it within the request instead
+            evaluation = evaluator.evaluate_exam_response(plan.paper, responses, grading_plan=plan)
+            db.update_response_score(response_id, evaluation['total_score'], evaluation['overall_feedback'], evaluation)
+            response_data['evaluation'] = evaluation
+
+            result = {'message': 'Exam submitted successfully', 'response_id': response_id, 'status': 'completed'}
+            result.update(_submission_summary(response_data))
+            return jsonify(result), 201
+
+        return jsonify({
+            'message': 'Exam submitted successfully',
+            'response_id': response_id,
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/responses/{response_id}/status',
+            'total_questions': total_questions,
+            'answered_questions': answered_questions,
+            'time_taken': data.get('time_taken', 0)
+        }), 202
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _submission_summary(response):
+    """Build the result summary shown to a student for a graded response"""
+    evaluation = response.get('evaluation') or {}
+    total_questions = response.get('total_questions', 0)
+
+    correct_answers = 0
+    for section in evaluation.get('detailed_feedback', []):
+        for question in section.get('questions', []):
+            if question.get('evaluation', {}).get('is_correct'):
+                correct_answers += 1
+
+    score = evaluation.get('total_score', 0)
+    total_marks = evaluation.get('max_score', total_questions)
+    percentage = round((score / total_marks) * 100, 1) if total_marks > 0 else 0
+
+    return {
+        'score': score,
+        'total_marks': total_marks,
+        'percentage': percentage,
+        'correct_answers': correct_answers,
+        'total_questions': total_questions,
+        'answered_questions': response.get('answered_questions', 0),
+        'time_taken': response.get('time_taken', 0),
+        'evaluation': evaluation
+    }
+
+@app.route('/api/responses/<response_id>/status', methods=['GET'])
+@auth_required
+def get_response_status(response_id):
+    try:
+        user_id = get_jwt_identity()
+        user = g.current_user
+
+        response = db.get_response_by_id(response_id)
+        if not response:
+            return jsonify({'error': 'Response not found'}), 404
+
+        # Check permissions
+        if user['role'] == 'student' and response['student_id'] != user_id:
+            return jsonify({'error': 'Access denied'}), 403
+        elif user['role'] == 'teacher':
+            exam = db.get_exam_by_id(response['exam_id'], include_paper=False)
+            if not exam or exam['created_by'] != user_id:
+                return jsonify({'error': 'Access denied'}), 403
+
+        job = grading_queue.get_job_status(response_id)
+        status = job['status'] if job else response.get('grading_status', 'completed')
+
+        result = {
+            'response_id': response_id,
+            'status': status,
+            'progress': job['progress'] if job else {},
+            'error': job['error'] if job else None
+        }
+
+        if status == 'completed':
+            result.update(_submission_summary(response))
+
+        return jsonify(result), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -516,19 +775,68 @@ def submit_exam():
 @teacher_required
 def get_exam_responses(exam_id):
     try:
+        # Paged with ?limit=&cursor= (or NDJSON with ?format=ndjson), optional field selection
+        # (?fields=evaluation,submitted_at,student_info)
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+        projection = None
+        if fields:
+            projection = {field: 1 for field in fields if field != 'student_info'}
+            projection.update({'exam_id': 1, 'student_id': 1})
+
+        def add_student_info(responses):
+            # Every student of a page or stream batch fetched in one query
+            students = db.get_users_by_ids([response['student_id'] for response in responses])
+            for response in responses:
+                student = students.get(response['student_id'])
+                if student:
+                    response['student_info'] = {
+                        'username': student.get('username', ''),
+                        'full_name': student.get('full_name', ''),
+                        'email': student.get('email', '')
+                    }
+
+        enrich = add_student_info if not fields or 'student_info' in fields else None
+        return listing_response(db.exam_responses_pager(exam_id, projection, enrich), 'responses')
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/exams/<exam_id>/regrade', methods=['POST'])
+@teacher_required
+def regrade_exam_responses(exam_id):
+    try:
+        plan = grading_plans.get(exam_id)
+        if not plan:
+            return jsonify({'error': 'Exam not found'}), 404
+        if plan.created_by != get_jwt_identity():
+            return jsonify({'error': 'Access denied'}), 403
+
         responses = db.get_exam_responses(exam_id)
 
-        # Add student information to responses
-        for response in responses:
-            student = db.get_user_by_id(response['student_id'])
-            if student:
-                response['student_info'] = {
-                    'username': student['username'],
-                    'full_name': student.get('full_name', ''),
-                    'email': student['email']
-                }
+        # Text answers to the same question are graded together in batched prompts. Nothing is
+        # written unless the whole cohort was graded: an error here ends the request with a 500
+        evaluations = evaluator.evaluate_cohort_responses(
+            plan.paper,
+            [response.get('responses', {}) for response in responses],
+            grading_plan=plan
+        )
 
-        return jsonify({'responses': responses}), 200
+        updated = 0
+        for response, evaluation in zip(responses, evaluations):
+            if db.update_response_score(
+                response['_id'],
+                evaluation.get('total_score', 0),
+                evaluation.get('overall_feedback', ''),
+                evaluation
+            ):
+                updated += 1
+
+        return jsonify({
+            'message': 'Responses regraded successfully',
+            'total_responses': len(responses),
+            'updated_responses': updated
+        }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -537,10 +845,10 @@ def get_exam_responses(exam_id):
 def get_response(response_id):
     try:
         user_id = get_jwt_identity()
-        user = db.get_user_by_id(user_id)
+        user = g.current_user
 
         # Get response from database
-        response = db.responses.find_one({'_id': db.ObjectId(response_id)})
+        response = db.get_response_by_id(response_id)
 
         if not response:
             return jsonify({'error': 'Response not found'}), 404
@@ -550,11 +858,10 @@ def get_response(response_id):
             return jsonify({'error': 'Access denied'}), 403
         elif user['role'] == 'teacher':
             # Teachers can view responses for their exams
-            exam = db.get_exam_by_id(response['exam_id'])
+            exam = db.get_exam_by_id(response['exam_id'], include_paper=False)
             if not exam or exam['created_by'] != user_id:
                 return jsonify({'error': 'Access denied'}), 403
 
-        response['_id'] = str(response['_id'])
         return jsonify({'response': response}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -566,26 +873,9 @@ def teacher_dashboard():
     try:
         user_id = get_jwt_identity()
 
-        # Get teacher's exams
-        exams = db.get_exams_by_teacher(user_id)
-
-        # Get statistics
-        total_exams = len(exams)
-        total_responses = 0
-
-        for exam in exams:
-            responses = db.get_exam_responses(exam['_id'])
-            total_responses += len(responses)
-
-        # Get recent activity - show more exams (up to 20)
-        recent_exams = exams[:20]  # Last 20 exams
-
-        dashboard_data = {
-            'total_exams': total_exams,
-            'total_responses': total_responses,
-            'recent_exams': recent_exams,
-            'subjects': db.get_subjects()
-        }
+        # Counts come from one aggregation, recent exams are listed without their papers
+        dashboard_data = dashboard_queries.teacher_dashboard(user_id, recent_limit=20)
+        dashboard_data['subjects'] = db.get_subjects()
 
         return jsonify(dashboard_data), 200
     except Exception as e:
@@ -597,83 +887,8 @@ def student_dashboard():
     try:
         user_id = get_jwt_identity()
 
-        # Get available exams
-        available_exams = db.get_available_exams()
-
-        # Get student's completed exams
-        completed_responses = []
-        for exam in available_exams:
-            response = db.get_response(exam['_id'], user_id)
-            if response:
-                response['exam_title'] = exam['title']
-                completed_responses.append(response)
-
-        # Calculate average score
-        total_score = 0
-        total_max_score = 0
-        for response in completed_responses:
-            if 'evaluation' in response:
-                total_score += response['evaluation'].get('total_score', 0)
-                total_max_score += response['evaluation'].get('max_score', 0)
-
-        average_percentage = (total_score / total_max_score * 100) if total_max_score > 0 else 0
-
-        # Mock data for new features (in a real app, this would come from the database)
-        import random
-        from datetime import datetime, timedelta
-
-        # Generate mock progress data
-        progress_data = []
-        for i in range(5):
-            progress_data.append({
-                'exam': f'Exam {i+1}',
-                'score': random.randint(60, 95),
-                'date': (datetime.now() - timedelta(days=i*7)).isoformat()
-            })
-
-        # Generate mock upcoming exams
-        upcoming_exams = [
-            {
-                'id': 'upcoming_1',
-                'title': 'Advanced Chemistry Quiz',
-                'subject': 'Chemistry',
-                'duration': 45,
-                'scheduled_date': (datetime.now() + timedelta(days=3)).isoformat()
-            },
-            {
-                'id': 'upcoming_2',
-                'title': 'Physics Midterm',
-                'subject': 'Physics',
-                'duration': 90,
-                'scheduled_date': (datetime.now() + timedelta(days=7)).isoformat()
-            }
-        ]
-
-        # Mock achievements based on student performance
-        achievements = []
-        if len(completed_responses) > 0:
-            achievements.append('first_exam')
-        if average_percentage >= 90:
-            achievements.append('perfect_score')
-        if len(completed_responses) >= 3:
-            achievements.append('consistent')
-        if random.choice([True, False]):
-            achievements.append('improvement')
-
-        dashboard_data = {
-            'available_exams': len(available_exams),
-            'completed_exams': len(completed_responses),
-            'average_score': round(average_percentage, 1),
-            'recent_results': completed_responses[:5],
-            'available_exams_list': available_exams[:10],
-            # New enhanced features
-            'progress_data': progress_data,
-            'total_study_time': random.randint(120, 480),  # Mock study time in minutes
-            'streak_days': random.randint(0, 15),  # Mock study streak
-            'improvement_rate': random.randint(5, 25),  # Mock improvement percentage
-            'upcoming_exams': upcoming_exams,
-            'achievements': achievements
-        }
+        # One query over the student's responses, joined with a projected exam title map
+        dashboard_data = dashboard_queries.student_dashboard(user_id)
 
         return jsonify(dashboard_data), 200
     except Exception as e:
@@ -727,15 +942,29 @@ def internal_error(error):
 def health_check():
     return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()}), 200
 
+# Performance metrics
+@app.route('/api/metrics', methods=['GET'])
+@teacher_required
+def get_metrics():
+    try:
+        return jsonify({
+            'evaluation_cache': evaluation_cache.stats(),
+            'grading_plans': grading_plans.stats(),
+            'password_hasher': password_hasher.stats(),
+            'exam_snapshots': exam_snapshots.stats(),
+            'generation_cache': generation_cache.stats(),
+            'mongodb_pool': db.pool_stats()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Test endpoint to list users (for debugging)
 @app.route('/api/test/users', methods=['GET'])
 def test_list_users():
     try:
-        users = []
-        for user in db.users.find({}, {'password': 0}):  # Exclude password
-            user['_id'] = str(user['_id'])
-            users.append(user)
-        return jsonify({'users': users}), 200
+        return listing_response(db.users_pager(), 'users')
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,9 +1,59 @@
 import os
 from functools import wraps
-from flask import request, jsonify, current_app
-from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity, verify_jwt_in_request
+from flask import request, jsonify, current_app, g
+from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity, get_jwt
 from datetime import timedelta
+from cache import LRUCache
 from database import db
+from password_hasher import password_hasher, HasherBusyError
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '10000'))
+AUTH_USER_CACHE_TTL_SECONDS = int(os.getenv('AUTH_USER_CACHE_TTL_SECONDS', '60'))
+
+# Users of recent requests; a revocation elsewhere is picked up within the TTL
+user_cache = LRUCache(max_entries=AUTH_USER_CACHE_SIZE, ttl_seconds=AUTH_USER_CACHE_TTL_SECONDS)
+
+def load_user(user_id):
+    """Get a user through the user cache"""
+    user = user_cache.get(user_id)
+    if user is None:
+        user = db.get_user_by_id(user_id)
+        if user:
+            user_cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id):
+    """Drop a user from the user cache"""
+    user_cache.delete(user_id)
+
+def revoke_user_tokens(user_id):
+    """Invalidate every token issued to a user so far"""
+    revoked = db.increment_token_version(user_id)
+    invalidate_user(user_id)
+    return revoked
+
+def _authorize(required_role=None):
+    """Check the verified token and set g.current_user, returning an error response on failure"""
+    claims = get_jwt()
+
+    # Role comes from the signed claims, no database lookup needed
+    if required_role and claims.get('role') != required_role:
+        return jsonify({'error': f'Access denied. {required_role.title()} role required'}), 403
+
+    user = load_user(get_jwt_identity())
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    # Tokens issued before the user's last revocation carry an older version
+    if claims.get('uv', 0) != user.get('token_version', 0):
+        return jsonify({'error': 'Token has been revoked'}), 401
+
+    g.current_user = dict(user)
+    return None
 
 class AuthManager:
     def __init__(self, app=None):
@@ -39,27 +89,31 @@ class AuthManager:
             if existing_user:
                 return {'error': 'User with this email or username already exists'}, 400
             
-            # Create user
-            user_id = db.create_user(username, email, password, role, full_name)
+            # Hash off the request thread, then create user
+            password_hash = password_hasher.hash_password(password)
+            user_id = db.create_user(username, email, password, role, full_name, password_hash=password_hash)
             if user_id:
                 return {'message': 'User registered successfully', 'user_id': user_id}, 201
             else:
                 return {'error': 'Failed to register user'}, 500
+        except HasherBusyError as e:
+            return {'error': 'Server is busy, please try again shortly', 'retry_after': e.retry_after}, 503
         except Exception as e:
             return {'error': str(e)}, 500
     
     def login_user(self, email, password):
         """Login user and return JWT token"""
         try:
-            user = db.authenticate_user(email, password)
-            if user:
+            user = db.get_login_user(email)
+            if user and password_hasher.check_password(password, user.pop('password', b'')):
                 # Create access token
                 access_token = create_access_token(
                     identity=user['_id'],
                     additional_claims={
                         'role': user['role'],
                         'username': user['username'],
-                        'email': user['email']
+                        'email': user['email'],
+                        'uv': user.get('token_version', 0)
                     }
                 )
                 
@@ -75,15 +129,17 @@ class AuthManager:
                 }, 200
             else:
                 return {'error': 'Invalid email or password'}, 401
+        except HasherBusyError as e:
+            return {'error': 'Server is busy, please try again shortly', 'retry_after': e.retry_after}, 503
         except Exception as e:
             return {'error': str(e)}, 500
     
     def get_current_user(self):
         """Get current authenticated user"""
         try:
-            user_id = get_jwt_identity()
-            user = db.get_user_by_id(user_id)
-            return user
+            if 'current_user' in g:
+                return g.current_user
+            return load_user(get_jwt_identity())
         except Exception as e:
             return None
 
@@ -95,15 +151,9 @@ def role_required(required_role):
         @jwt_required()
         def decorated_function(*args, **kwargs):
             try:
-                verify_jwt_in_request()
-                user_id = get_jwt_identity()
-                user = db.get_user_by_id(user_id)
-                
-                if not user:
-                    return jsonify({'error': 'User not found'}), 404
-                
-                if user['role'] != required_role:
-                    return jsonify({'error': f'Access denied. {required_role.title()} role required'}), 403
+                error = _authorize(required_role)
+                if error:
+                    return error
                 
                 return f(*args, **kwargs)
             except Exception as e:
@@ -125,12 +175,9 @@ def auth_required(f):
     @jwt_required()
     def decorated_function(*args, **kwargs):
         try:
-            verify_jwt_in_request()
-            user_id = get_jwt_identity()
-            user = db.get_user_by_id(user_id)
-            
-            if not user:
-                return jsonify({'error': 'User not found'}), 404
+            error = _authorize()
+            if error:
+                return error
             
             return f(*args, **kwargs)
         except Exception as e:
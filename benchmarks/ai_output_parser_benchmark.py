@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+AI output parser benchmark - split-on-'Q' parsing vs. the incremental tokenizer
+
+Parses sample question, quiz and batched evaluation replies (written in the
+formats the prompts ask for, including the quirks the models produce: bold
+markers, a capital Q inside question text, a malformed block, a short answer
+line that looks like an option) with the
+previous parsers and with ai_output_parser, and reports replies parsed per
+second and the questions recovered. The streaming rows feed the reply in small
+chunks: the previous parsers can only re-parse the accumulated text after every
+chunk, while the incremental parser consumes each chunk once.
+
+Usage: python benchmarks/ai_output_parser_benchmark.py [--replies 2000] [--chunk 16]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_output_parser import (EvaluationParser, QuestionParser, parse_batch_evaluation,
+                              parse_questions)
+
+QUESTION_REPLY = """Here are the questions you asked for:
+
+Q1: What is the SI unit of electric charge?
+A) Ampere
+B) Coulomb
+C) Volt
+D) Ohm
+Correct Answer: B
+Explanation: Charge is measured in coulombs; one coulomb is one ampere-second.
+
+Q2: Which quantity does the Q factor of a resonant circuit describe?
+A) Its damping relative to stored energy
+B) Its resistance
+C) Its capacitance
+D) Its supply voltage
+Correct Answer: A
+Explanation: A higher Q means lower energy loss per cycle.
+
+**Q3:** A ball is thrown straight up. What is its acceleration at the highest point?
+A) Zero
+B) 9.8 m/s^2 upwards
+C) 9.8 m/s^2 downwards
+D) It depends on the mass
+**Correct Answer:** C
+Explanation: Gravity keeps acting on the ball at every point of its flight.
+
+Q4: Which of these is a vector quantity?
+A) Speed
+B) Mass
+Correct Answer: E
+Explanation: (malformed: the answer is not one of the options)
+
+Q5: What does Newton's second law relate?
+A) Force, mass and acceleration
+B) Energy and momentum
+C) Pressure and volume
+D) Charge and current
+Correct Answer: A
+Explanation: F = ma.
+"""
+
+SHORT_ANSWER_REPLY = """Q1: Name a bacterium that is widely used in genetics laboratories.
+Sample Answer: The most common choice is
+E. coli, because it grows quickly and is easy to modify.
+
+Q2: What does PCR amplify?
+Sample Answer: Specific segments of DNA.
+
+Q3: Why are plasmids useful as cloning vectors?
+Sample Answer: They replicate independently of the chromosome and
+carry selectable markers such as antibiotic resistance.
+"""
+
+EVALUATION_REPLY = """ANSWER 1
+SCORE: 4/5
+FEEDBACK: The answer names the law correctly and gives a relevant example,
+but the explanation of inertia is brief.
+SUGGESTIONS: Explain why mass is a measure of inertia.
+HINTS: Think about pushing an empty and a full trolley.
+
+ANSWER 2
+SCORE: 2
+FEEDBACK: Partially correct; the direction of the net force is wrong.
+SUGGESTIONS: Revise free body diagrams.
+HINTS: Which way does friction act?
+
+ANSWER 3
+FEEDBACK: The model forgot the score for this one.
+
+ANSWER 4
+SCORE: 5
+FEEDBACK: Complete and precise.
+SUGGESTIONS: None.
+HINTS: None.
+"""
+
+_LEGACY_BATCH_HEADER = re.compile(r'^\s*ANSWER\s+(\d+)\s*:?\s*$', re.MULTILINE)
+
+def legacy_parse_questions(response_text, subject, topic, difficulty, question_type, language):
+    """The previous QuestionGenerator._parse_ai_response"""
+    questions = []
+    for block in response_text.split('Q')[1:]:
+        if not block.strip():
+            continue
+        question_data = {'subject': subject, 'topic': topic, 'difficulty': difficulty,
+                         'type': question_type, 'language': language, 'source': 'ai_generated'}
+        lines = block.strip().split('\n')
+        question_data['question'] = lines[0].split(':', 1)[1].strip() if ':' in lines[0] else lines[0].strip()
+        options = {}
+        correct_answer = ''
+        explanation = ''
+        for line in lines[1:]:
+            line = line.strip()
+            if line.startswith(('A)', 'B)', 'C)', 'D)')):
+                options[line[0].lower()] = line[3:].strip()
+            elif line.startswith('Correct Answer:'):
+                correct_answer = line.split(':', 1)[1].strip().lower()
+            elif line.startswith('Explanation:'):
+                explanation = line.split(':', 1)[1].strip()
+        question_data.update(options=options, correct_answer=correct_answer, explanation=explanation)
+        questions.append(question_data)
+    return questions
+
+def legacy_parse_evaluation_block(evaluation_text, max_marks):
+    """The previous Evaluator._parse_evaluation_block"""
+    evaluation = {'score': 0, 'max_score': max_marks, 'feedback_text': '', 'suggestions': '', 'hints': ''}
+    has_score = False
+    current_section = None
+    for line in evaluation_text.split('\n'):
+        line = line.strip()
+        if line.startswith('SCORE:'):
+            score_match = re.search(r'(\d+(?:\.\d+)?)', line.split(':', 1)[1].strip())
+            if score_match:
+                evaluation['score'] = min(float(score_match.group(1)), max_marks)
+                has_score = True
+        elif line.startswith('FEEDBACK:'):
+            current_section = 'feedback_text'
+            evaluation['feedback_text'] = line.split(':', 1)[1].strip()
+        elif line.startswith('SUGGESTIONS:'):
+            current_section = 'suggestions'
+            evaluation['suggestions'] = line.split(':', 1)[1].strip()
+        elif line.startswith('HINTS:'):
+            current_section = 'hints'
+            evaluation['hints'] = line.split(':', 1)[1].strip()
+        elif current_section and line:
+            evaluation[current_section] += ' ' + line
+    return evaluation if has_score else None
+
+def legacy_parse_batch_evaluation(evaluation_text, max_marks, answer_count):
+    """The previous Evaluator._parse_batch_ai_evaluation"""
+    evaluations = [None] * answer_count
+    headers = list(_LEGACY_BATCH_HEADER.finditer(evaluation_text))
+    for index, header in enumerate(headers):
+        number = int(header.group(1))
+        if not 1 <= number <= answer_count or evaluations[number - 1] is not None:
+            continue
+        block_end = headers[index + 1].start() if index + 1 < len(headers) else len(evaluation_text)
+        evaluations[number - 1] = legacy_parse_evaluation_block(evaluation_text[header.end():block_end], max_marks)
+    return evaluations
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def legacy_streamed(parse, text, size):
+    """Without an incremental parser the accumulated reply is re-parsed after every chunk"""
+    received = ''
+    result = None
+    for chunk in chunks(text, size):
+        received += chunk
+        result = parse(received)
+    return result
+
+def incremental_streamed(parser, text, size):
+    records = []
+    for chunk in chunks(text, size):
+        records.extend(parser.feed(chunk))
+    return records + parser.close()
+
+def timed(function, replies):
+    started = time.perf_counter()
+    for _ in range(replies):
+        result = function()
+    return replies / (time.perf_counter() - started), result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the AI output parsers')
+    parser.add_argument('--replies', type=int, default=2000, help='replies parsed per measurement')
+    parser.add_argument('--chunk', type=int, default=16, help='characters per streamed chunk')
+    args = parser.parse_args()
+
+    question_args = ('Physics', 'mechanics', 'easy', 'mcq', 'en')
+    short_answer_args = ('Biology', 'genetics', 'medium', 'short_answer', 'en')
+    cases = [
+        ('questions, whole reply',
+         lambda: legacy_parse_questions(QUESTION_REPLY, *question_args),
+         lambda: parse_questions(QUESTION_REPLY, *question_args)[0]),
+        ('questions, streamed',
+         lambda: legacy_streamed(lambda text: legacy_parse_questions(text, *question_args), QUESTION_REPLY, args.chunk),
+         lambda: incremental_streamed(QuestionParser(*question_args), QUESTION_REPLY, args.chunk)),
+        ('short answers, whole reply',
+         lambda: legacy_parse_questions(SHORT_ANSWER_REPLY, *short_answer_args),
+         lambda: parse_questions(SHORT_ANSWER_REPLY, *short_answer_args)[0]),
+        ('evaluations, whole reply',
+         lambda: legacy_parse_batch_evaluation(EVALUATION_REPLY, 5, 4),
+         lambda: parse_batch_evaluation(EVALUATION_REPLY, 5, 4)[0]),
+        ('evaluations, streamed',
+         lambda: legacy_streamed(lambda text: legacy_parse_batch_evaluation(text, 5, 4), EVALUATION_REPLY, args.chunk),
+         lambda: incremental_streamed(EvaluationParser(5, 4), EVALUATION_REPLY, args.chunk)),
+    ]
+
+    print(f"{'case':<26} {'legacy/s':>10} {'tokenizer/s':>12} {'speedup':>8} {'records':>14}")
+    for name, legacy, incremental in cases:
+        legacy_rate, legacy_result = timed(legacy, args.replies)
+        new_rate, new_result = timed(incremental, args.replies)
+        records = f"{sum(r is not None for r in legacy_result)} -> {sum(r is not None for r in new_result)}"
+        print(f"{name:<26} {legacy_rate:>10.0f} {new_rate:>12.0f} {new_rate / legacy_rate:>7.1f}x {records:>14}")
+
+    # What the split on 'Q' did to the sample reply
+    legacy_questions = legacy_parse_questions(QUESTION_REPLY, *question_args)
+    questions, errors = parse_questions(QUESTION_REPLY, *question_args)
+    print(f"\nLegacy parser returned {len(legacy_questions)} question blocks, "
+          f"{sum(not q['options'] for q in legacy_questions)} of them without options")
+    print(f"Tokenizer returned {len(questions)} questions and reported {len(errors)} malformed block(s):")
+    for error in errors:
+        print(f"  block {error['block']}: {error['error']} ({error['question']})")
+
+    # A sample answer line starting with "E." is text, not an option
+    short_answers, _ = parse_questions(SHORT_ANSWER_REPLY, *short_answer_args)
+    print(f"\nFirst short answer: {short_answers[0]['sample_answer']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Teacher dashboard benchmark - per-exam response scans vs. one aggregation
+
+Seeds a throwaway database with one teacher's exams and a growing number of
+responses, then times the old dashboard (load every exam with its paper, fetch
+every response of every exam and len() it) against DashboardQueries. The
+aggregation's latency should stay roughly flat as responses grow.
+
+Usage: python benchmarks/teacher_dashboard_benchmark.py [--exams 200] [--responses 1000 10000 30000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient
+from dotenv import load_dotenv
+from dashboard_queries import DashboardQueries
+
+# Load environment variables
+load_dotenv()
+
+TEACHER_ID = 'benchmark-teacher'
+
+def _paper(questions_per_exam):
+    question = {
+        'question': 'Explain the significance of the benchmark question in detail.',
+        'type': 'short_answer',
+        'marks': 5,
+        'sample_answer': 'A reasonably long sample answer. ' * 10,
+        'key_points': 'point one, point two, point three'
+    }
+    return {'sections': [{'title': 'Section A', 'questions': [dict(question) for _ in range(questions_per_exam)]}]}
+
+def seed(database, exam_count, response_count, questions_per_exam):
+    """Create exams and responses spread evenly across them"""
+    database.exams.delete_many({})
+    database.responses.delete_many({})
+    database.exams.create_index([('created_by', 1), ('created_at', -1)])
+    database.responses.create_index([('exam_id', 1), ('student_id', 1)])
+
+    now = datetime.utcnow()
+    paper = _paper(questions_per_exam)
+    result = database.exams.insert_many([{
+        'title': f'Exam {i}',
+        'subject': 'Physics',
+        'duration': 60,
+        'total_marks': questions_per_exam * 5,
+        'created_by': TEACHER_ID,
+        'created_at': now - timedelta(minutes=i),
+        'is_active': True,
+        'paper_data': paper
+    } for i in range(exam_count)])
+    exam_ids = [str(exam_id) for exam_id in result.inserted_ids]
+
+    batch = []
+    for i in range(response_count):
+        batch.append({
+            'exam_id': exam_ids[i % exam_count],
+            'student_id': f'student-{i}',
+            'responses': {f'section_0_question_{q}': 'An answer ' * 20 for q in range(questions_per_exam)},
+            'total_score': 3,
+            'submitted_at': now
+        })
+        if len(batch) == 5000:
+            database.responses.insert_many(batch)
+            batch = []
+    if batch:
+        database.responses.insert_many(batch)
+
+def naive_dashboard(database):
+    """The previous implementation: every exam document, every response document"""
+    exams = []
+    for exam in database.exams.find({'created_by': TEACHER_ID}):
+        exam['_id'] = str(exam['_id'])
+        exams.append(exam)
+
+    total_responses = 0
+    for exam in exams:
+        total_responses += len(list(database.responses.find({'exam_id': exam['_id']})))
+
+    return {'total_exams': len(exams), 'total_responses': total_responses, 'recent_exams': exams[:20]}
+
+def timed(function, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the teacher dashboard queries')
+    parser.add_argument('--exams', type=int, default=200)
+    parser.add_argument('--responses', type=int, nargs='+', default=[1000, 10000, 30000])
+    parser.add_argument('--questions', type=int, default=20, help='questions per exam paper')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--database', default='ai_exam_system_benchmark')
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+    raw = client[args.database]
+    database = SimpleNamespace(exams=raw.exams, responses=raw.responses)
+    queries = DashboardQueries(database)
+
+    print(f"{'responses':>10} {'naive ms':>10} {'aggregated ms':>14} {'speedup':>8}")
+    try:
+        for response_count in args.responses:
+            seed(database, args.exams, response_count, args.questions)
+            naive_time, naive = timed(lambda: naive_dashboard(database), args.repeat)
+            fast_time, fast = timed(lambda: queries.teacher_dashboard(TEACHER_ID), args.repeat)
+
+            assert naive['total_exams'] == fast['total_exams']
+            assert naive['total_responses'] == fast['total_responses']
+            print(f"{response_count:>10} {naive_time * 1000:>10.1f} {fast_time * 1000:>14.1f} "
+                  f"{naive_time / fast_time:>7.1f}x")
+    finally:
+        client.drop_database(args.database)
+
+if __name__ == '__main__':
+    main()
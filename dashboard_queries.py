@@ -0,0 +1,183 @@
+"""
+Dashboard Queries - aggregation-backed data for the teacher and student dashboards
+
+Dashboards only need counts and a handful of exam fields, so they are answered
+with server-side counting, grouping, sorting and limits instead of loading
+whole exam papers and response documents into the web process. A student's
+dashboard is computed from a single scan of their own responses.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from bson import ObjectId
+from database import db, EXAM_LISTING_PROJECTION
+
+# Student response fields never needed by the dashboard
+_RESPONSE_DASHBOARD_PROJECTION = {
+    'responses': 0,
+    'answers': 0,
+    'security_events': 0,
+    'evaluation.detailed_feedback': 0
+}
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+        except ValueError:
+            return None
+    return None
+
+def _study_streak(days, today) -> int:
+    """Consecutive days with a submission, ending today or yesterday"""
+    day = today if today in days else today - timedelta(days=1)
+    streak = 0
+    while day in days:
+        streak += 1
+        day -= timedelta(days=1)
+    return streak
+
+class DashboardQueries:
+    def __init__(self, database=None):
+        # Anything with `exams` and `responses` collections, the global database by default
+        self.db = database or db
+
+    def response_counts(self, exam_ids: List[str]) -> Dict[str, int]:
+        """Number of responses per exam, counted in a single aggregation"""
+        if not exam_ids:
+            return {}
+        pipeline = [
+            {'$match': {'exam_id': {'$in': exam_ids}}},
+            {'$group': {'_id': '$exam_id', 'count': {'$sum': 1}}}
+        ]
+        return {group['_id']: group['count'] for group in self.db.responses.aggregate(pipeline)}
+
+    def teacher_dashboard(self, teacher_id: str, recent_limit: int = 20) -> Dict:
+        """Exam and response totals plus the most recent exams of a teacher"""
+        exam_ids = [str(exam['_id']) for exam in self.db.exams.find({'created_by': teacher_id}, {'_id': 1})]
+        counts = self.response_counts(exam_ids)
+
+        recent_exams = []
+        cursor = (self.db.exams.find({'created_by': teacher_id}, EXAM_LISTING_PROJECTION)
+                  .sort('created_at', -1)
+                  .limit(recent_limit))
+        for exam in cursor:
+            exam['_id'] = str(exam['_id'])
+            exam['response_count'] = counts.get(exam['_id'], 0)
+            recent_exams.append(exam)
+
+        return {
+            'total_exams': len(exam_ids),
+            'total_responses': sum(counts.values()),
+            'recent_exams': recent_exams
+        }
+
+    def student_dashboard(self, student_id: str, recent_limit: int = 5, available_limit: int = 10) -> Dict:
+        """Results, progress and available exams of a student from one pass over their responses"""
+        responses = list(
+            self.db.responses.find({'student_id': student_id}, _RESPONSE_DASHBOARD_PROJECTION)
+            .sort('submitted_at', -1)
+        )
+
+        # Titles of the exams the student took, joined in memory
+        exam_ids = list({response['exam_id'] for response in responses})
+        titles = {}
+        if exam_ids:
+            object_ids = [ObjectId(exam_id) for exam_id in exam_ids if ObjectId.is_valid(exam_id)]
+            for exam in self.db.exams.find({'_id': {'$in': object_ids}}, {'title': 1}):
+                titles[str(exam['_id'])] = exam.get('title', '')
+
+        total_score = 0
+        total_max_score = 0
+        total_seconds = 0
+        active_days = set()
+        graded = []  # (submitted_at, title, percentage), newest first
+
+        for response in responses:
+            response['_id'] = str(response['_id'])
+            response['exam_title'] = titles.get(response['exam_id'], '')
+            total_seconds += response.get('time_taken') or 0
+
+            submitted_at = _parse_datetime(response.get('submitted_at'))
+            if submitted_at:
+                active_days.add(submitted_at.date())
+
+            evaluation = response.get('evaluation')
+            if evaluation and evaluation.get('max_score'):
+                total_score += evaluation.get('total_score', 0)
+                total_max_score += evaluation['max_score']
+                graded.append((submitted_at, response['exam_title'],
+                               evaluation['total_score'] / evaluation['max_score'] * 100))
+
+        average_percentage = (total_score / total_max_score * 100) if total_max_score > 0 else 0
+
+        # Latest result compared with the first one
+        improvement_rate = round(graded[0][2] - graded[-1][2]) if len(graded) >= 2 else 0
+
+        progress_data = [{
+            'exam': title,
+            'score': round(percentage, 1),
+            'date': submitted_at.isoformat() if submitted_at else None
+        } for submitted_at, title, percentage in graded[:5]]
+
+        achievements = []
+        if responses:
+            achievements.append('first_exam')
+        if average_percentage >= 90:
+            achievements.append('perfect_score')
+        if len(responses) >= 3:
+            achievements.append('consistent')
+        if improvement_rate > 0:
+            achievements.append('improvement')
+
+        available_exams = []
+        for exam in (self.db.exams.find({'is_active': True}, EXAM_LISTING_PROJECTION)
+                     .sort('created_at', -1)
+                     .limit(available_limit)):
+            exam['_id'] = str(exam['_id'])
+            available_exams.append(exam)
+
+        return {
+            'available_exams': self.db.exams.count_documents({'is_active': True}),
+            'completed_exams': len(responses),
+            'average_score': round(average_percentage, 1),
+            'recent_results': responses[:recent_limit],
+            'available_exams_list': available_exams,
+            'progress_data': progress_data,
+            'total_study_time': round(total_seconds / 60),
+            'streak_days': _study_streak(active_days, datetime.utcnow().date()),
+            'improvement_rate': improvement_rate,
+            'upcoming_exams': self.upcoming_exams(),
+            'achievements': achievements
+        }
+
+    def upcoming_exams(self, limit: int = 5) -> List[Dict]:
+        """Active exams scheduled to start in the future, soonest first"""
+        now = datetime.utcnow()
+        projection = {'title': 1, 'subject': 1, 'duration': 1, 'start_time': 1}
+
+        # start_time is stored as sent, an ISO string or a datetime. Mongo only compares
+        # values of the same type, so each kind is filtered, sorted and limited on its own
+        upcoming = []
+        for after in (now, now.isoformat()):
+            cursor = (self.db.exams.find({'is_active': True, 'start_time': {'$gt': after}}, projection)
+                      .sort('start_time', 1)
+                      .limit(limit))
+            for exam in cursor:
+                start_time = _parse_datetime(exam.get('start_time'))
+                if start_time and start_time > now:
+                    upcoming.append({
+                        'id': str(exam['_id']),
+                        'title': exam.get('title', ''),
+                        'subject': exam.get('subject', ''),
+                        'duration': exam.get('duration', 0),
+                        'scheduled_date': start_time.isoformat()
+                    })
+
+        upcoming.sort(key=lambda exam: exam['scheduled_date'])
+        return upcoming[:limit]
+
+# Global dashboard queries instance
+dashboard_queries = DashboardQueries()
@@ -1,30 +1,198 @@
 import os
-from pymongo import MongoClient
+import hashlib
+import re
+import threading
+from pymongo import MongoClient, monitoring
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from datetime import datetime
 from bson import ObjectId
 import bcrypt
+from static_question_bank import question_stat_paths
+from pagination import KeysetPager
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-class Database:
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+MONGODB_DATABASE = os.getenv('MONGODB_DATABASE', 'ai_exam_system')
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '100'))
+MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+# Fail a checkout instead of waiting forever when the pool is exhausted
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', '5000'))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', '30000'))
+# Empty means the server default
+MONGODB_WRITE_CONCERN = os.getenv('MONGODB_WRITE_CONCERN', '')
+MONGODB_READ_CONCERN = os.getenv('MONGODB_READ_CONCERN', '')
+
+# Fields returned by exam listings; papers are only loaded for a single exam
+EXAM_LISTING_PROJECTION = {
+    'title': 1,
+    'subject': 1,
+    'description': 1,
+    'duration': 1,
+    'total_marks': 1,
+    'question_count': 1,
+    'section_count': 1,
+    'created_by': 1,
+    'created_at': 1,
+    'updated_at': 1,
+    'start_time': 1,
+    'end_time': 1,
+    'is_active': 1,
+    'version': 1
+}
+
+class DuplicateSubmissionError(Exception):
+    """Raised when a student submits the same exam twice"""
+
+def paper_counts(paper):
+    """Section and question counts stored on an exam for listings"""
+    sections = paper.get('sections', [])
+    question_count = sum(len(section.get('questions', [])) for section in sections) or len(paper.get('questions', []))
+    return {'section_count': len(sections), 'question_count': question_count}
+
+_WHITESPACE = re.compile(r'\s+')
+
+def question_hash(question):
+    """Hash of a question's normalized text, subject and type, used to dedupe the question bank"""
+    text = _WHITESPACE.sub(' ', str(question.get('question', '')).strip().lower())
+    subject = _WHITESPACE.sub(' ', str(question.get('subject', '')).strip().lower()).replace(' ', '_')
+    question_type = str(question.get('type', '')).strip().lower()
+    return hashlib.sha256(f"{subject}\x00{question_type}\x00{text}".encode('utf-8')).hexdigest()
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Connection pool counters, so pool exhaustion shows up in metrics"""
+
     def __init__(self):
-        self.client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
-        self.db = self.client.ai_exam_system
+        self._lock = threading.Lock()
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def _count(self, field, amount=1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count('pool_clears')
 
-        # Collections
-        self.users = self.db.users
-        self.questions = self.db.questions
-        self.exams = self.db.exams
-        self.responses = self.db.responses
-        self.question_bank = self.db.question_bank
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._count('connections_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count('connections_closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+            self._count('checkout_timeouts')
+        else:
+            self._count('checkout_failures')
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        self._count('checked_out', -1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_pool_size': MONGODB_MAX_POOL_SIZE,
+                'open_connections': self.connections_created - self.connections_closed,
+                'checked_out': self.checked_out,
+                'checkouts': self.checkouts,
+                'checkout_timeouts': self.checkout_timeouts,
+                'checkout_failures': self.checkout_failures,
+                'pool_clears': self.pool_clears
+            }
+
+def _collection(name):
+    return property(lambda self: self.db[name], doc=f"The {name} collection")
+
+class Database:
+    # Collections
+    users = _collection('users')
+    questions = _collection('questions')
+    exams = _collection('exams')
+    responses = _collection('responses')
+    question_bank = _collection('question_bank')
+    grading_jobs = _collection('grading_jobs')
+    evaluation_cache = _collection('evaluation_cache')
+    question_bank_stats = _collection('question_bank_stats')
+    exam_papers = _collection('exam_papers')
+    question_pool = _collection('question_pool')
+    question_pool_keys = _collection('question_pool_keys')
 
-        # Create indexes for better performance
-        self._create_indexes()
+    def __init__(self, uri=MONGODB_URI, database_name=MONGODB_DATABASE):
+        # Nothing connects until the first query; indexes are created by migrate.py
+        self.uri = uri
+        self.database_name = database_name
+        self.pool_monitor = PoolMonitor()
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
 
-    def _create_indexes(self):
-        """Create database indexes for better performance"""
+    def _client_options(self):
+        options = {
+            'maxPoolSize': MONGODB_MAX_POOL_SIZE,
+            'minPoolSize': MONGODB_MIN_POOL_SIZE,
+            'waitQueueTimeoutMS': MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            'serverSelectionTimeoutMS': MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            'connectTimeoutMS': MONGODB_CONNECT_TIMEOUT_MS,
+            'socketTimeoutMS': MONGODB_SOCKET_TIMEOUT_MS,
+            'event_listeners': [self.pool_monitor]
+        }
+        if MONGODB_WRITE_CONCERN:
+            options['w'] = int(MONGODB_WRITE_CONCERN) if MONGODB_WRITE_CONCERN.isdigit() else MONGODB_WRITE_CONCERN
+        if MONGODB_READ_CONCERN:
+            options['readConcernLevel'] = MONGODB_READ_CONCERN
+        return options
+
+    @property
+    def client(self):
+        """MongoClient of the current process, created on first use and again after a fork"""
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    # A client inherited through fork must not be used (or closed) by the child
+                    self._client = MongoClient(self.uri, **self._client_options())
+                    self._pid = os.getpid()
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self.database_name]
+
+    def pool_stats(self):
+        """Connection pool metrics of this process"""
+        return self.pool_monitor.stats()
+
+    def ensure_indexes(self):
+        """Create database indexes for better performance (run by migrate.py)"""
         # User indexes
         self.users.create_index("email", unique=True)
         self.users.create_index("username", unique=True)
@@ -32,20 +200,80 @@ class Database:
         # Question indexes
         self.questions.create_index([("subject", 1), ("topic", 1), ("difficulty", 1)])
         self.question_bank.create_index([("subject", 1), ("topic", 1), ("difficulty", 1)])
+        # Partial so questions stored before hashing was introduced don't collide
+        self.question_bank.create_index(
+            "question_hash",
+            unique=True,
+            partialFilterExpression={"question_hash": {"$exists": True}}
+        )
 
         # Exam indexes
         self.exams.create_index("created_by")
         self.exams.create_index("created_at")
+        self.exams.create_index([("created_by", 1), ("created_at", -1)])
+        self.exams.create_index([("is_active", 1), ("created_at", -1)])
+        self.exams.create_index([("is_active", 1), ("start_time", 1)])
+        self.exam_papers.create_index("exam_id", unique=True)
 
         # Response indexes
-        self.responses.create_index([("exam_id", 1), ("student_id", 1)])
+        self._ensure_unique_submission_index()
+        self.responses.create_index([("student_id", 1), ("submitted_at", -1)])
+        self.responses.create_index([("exam_id", 1), ("_id", 1)])
+
+        # Grading job indexes
+        self.grading_jobs.create_index("response_id", unique=True)
+        self.grading_jobs.create_index([("status", 1), ("created_at", 1)])
+
+        # Evaluation cache indexes (entries expire through the TTL index)
+        self.evaluation_cache.create_index("key", unique=True)
+        self.evaluation_cache.create_index(
+            "created_at",
+            expireAfterSeconds=int(os.getenv('EVALUATION_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+        )
+
+        # Question pool indexes (the same question is stocked once per pool key)
+        self.question_pool.create_index([("pool_key", 1), ("created_at", 1)])
+        self.question_pool.create_index([("pool_key", 1), ("question_hash", 1)], unique=True)
+        self.question_pool_keys.create_index("last_requested_at")
+
+    def _ensure_unique_submission_index(self):
+        """One response per student and exam, enforced by the database
+
+        Raises RuntimeError naming the (exam_id, student_id) pairs when duplicate submissions
+        already exist; they have to be cleaned up before the index can be built.
+        """
+        try:
+            self.responses.create_index([("exam_id", 1), ("student_id", 1)], unique=True)
+            return
+        except OperationFailure:
+            pass
+
+        duplicates = self.duplicate_submissions()
+        if duplicates:
+            pairs = ', '.join(f"({d['exam_id']}, {d['student_id']}) x{d['count']}" for d in duplicates)
+            raise RuntimeError(f"Cannot create the unique submission index, duplicate submissions exist: {pairs}")
+
+        # Replace the earlier non-unique index with the same keys
+        self.responses.drop_index([("exam_id", 1), ("student_id", 1)])
+        self.responses.create_index([("exam_id", 1), ("student_id", 1)], unique=True)
+
+    def duplicate_submissions(self, limit=50):
+        """(exam_id, student_id) pairs with more than one response"""
+        return [
+            {'exam_id': group['_id']['exam_id'], 'student_id': group['_id']['student_id'], 'count': group['count']}
+            for group in self.responses.aggregate([
+                {'$group': {'_id': {'exam_id': '$exam_id', 'student_id': '$student_id'}, 'count': {'$sum': 1}}},
+                {'$match': {'count': {'$gt': 1}}},
+                {'$limit': limit}
+            ], allowDiskUse=True)
+        ]
 
     # User Management Methods
-    def create_user(self, username, email, password, role='student', full_name=''):
-        """Create a new user"""
+    def create_user(self, username, email, password, role='student', full_name='', password_hash=None):
+        """Create a new user, optionally with a password already hashed elsewhere"""
         try:
             # Hash password
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            hashed_password = password_hash or bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
 
             user_data = {
                 'username': username,
@@ -77,6 +305,17 @@ class Database:
             print(f"Error authenticating user: {e}")
             return None
 
+    def get_login_user(self, email):
+        """Get an active user by email including the password hash, for verification elsewhere"""
+        try:
+            user = self.users.find_one({'email': email, 'is_active': True})
+            if user:
+                user['_id'] = str(user['_id'])
+            return user
+        except Exception as e:
+            print(f"Error getting user: {e}")
+            return None
+
     def get_user_by_id(self, user_id):
         """Get user by ID"""
         try:
@@ -89,30 +328,80 @@ class Database:
             print(f"Error getting user: {e}")
             return None
 
+    def get_users_by_ids(self, user_ids, fields=('username', 'full_name', 'email')):
+        """Get many users in one query, keyed by user ID and limited to the given fields"""
+        try:
+            object_ids = [ObjectId(user_id) for user_id in set(user_ids) if ObjectId.is_valid(user_id)]
+            if not object_ids:
+                return {}
+
+            users = {}
+            for user in self.users.find({'_id': {'$in': object_ids}}, {field: 1 for field in fields}):
+                users[str(user.pop('_id'))] = user
+            return users
+        except Exception as e:
+            print(f"Error getting users: {e}")
+            return {}
+
+    def users_pager(self):
+        """Paged listing of all users without their password hashes"""
+        return KeysetPager(self.users, {}, {'password': 0})
+
+    def increment_token_version(self, user_id):
+        """Bump a user's token version so previously issued tokens stop working"""
+        try:
+            result = self.users.update_one({'_id': ObjectId(user_id)}, {'$inc': {'token_version': 1}})
+            return result.modified_count > 0
+        except Exception as e:
+            print(f"Error revoking user tokens: {e}")
+            return False
+
     # Question Bank Methods
     def add_question_to_bank(self, question_data):
         """Add question to question bank"""
         try:
             question_data['created_at'] = datetime.utcnow()
+            question_data['question_hash'] = question_hash(question_data)
             result = self.question_bank.insert_one(question_data)
+            self.count_bank_questions([question_data])
             return str(result.inserted_id)
+        except DuplicateKeyError:
+            # Same question already in the bank, adding it again is a no-op
+            existing = self.question_bank.find_one({'question_hash': question_data['question_hash']}, {'_id': 1})
+            return str(existing['_id']) if existing else None
         except Exception as e:
             print(f"Error adding question to bank: {e}")
             return None
 
+    def count_bank_questions(self, questions):
+        """Add newly stored questions to the incrementally maintained bank statistics"""
+        try:
+            increments = {'total_questions': len(questions), 'version': 1}
+            for question in questions:
+                for path in question_stat_paths(question):
+                    increments[path] = increments.get(path, 0) + 1
+            # No upsert: a missing counter document is rebuilt from the whole collection on next read
+            self.question_bank_stats.update_one({'_id': 'question_bank'}, {'$inc': increments})
+        except Exception as e:
+            print(f"Error updating question bank statistics: {e}")
+
+    @staticmethod
+    def _question_bank_query(subject=None, topic=None, difficulty=None, question_type=None):
+        query = {}
+        if subject:
+            query['subject'] = subject
+        if topic:
+            query['topic'] = topic
+        if difficulty:
+            query['difficulty'] = difficulty
+        if question_type:
+            query['type'] = question_type
+        return query
+
     def get_questions_from_bank(self, subject=None, topic=None, difficulty=None, question_type=None, limit=None):
         """Get questions from question bank with filters"""
         try:
-            query = {}
-            if subject:
-                query['subject'] = subject
-            if topic:
-                query['topic'] = topic
-            if difficulty:
-                query['difficulty'] = difficulty
-            if question_type:
-                query['type'] = question_type
-
+            query = self._question_bank_query(subject, topic, difficulty, question_type)
             cursor = self.question_bank.find(query)
             if limit:
                 cursor = cursor.limit(limit)
@@ -126,60 +415,93 @@ class Database:
             print(f"Error getting questions from bank: {e}")
             return []
 
+    def question_bank_pager(self, subject=None, topic=None, difficulty=None, question_type=None):
+        """Paged listing of question bank questions with filters"""
+        query = self._question_bank_query(subject, topic, difficulty, question_type)
+        return KeysetPager(self.question_bank, query)
+
     # Exam Management Methods
     def create_exam(self, exam_data):
-        """Create a new exam"""
+        """Create a new exam, storing its question paper separately from the exam metadata"""
         try:
             exam_data['created_at'] = datetime.utcnow()
             exam_data['is_active'] = True
-            result = self.exams.insert_one(exam_data)
-            return str(result.inserted_id)
+            exam_data['version'] = 1
+
+            exam = {key: value for key, value in exam_data.items() if key != 'paper_data'}
+            paper = exam_data.get('paper_data', {})
+            exam.update(paper_counts(paper))
+
+            result = self.exams.insert_one(exam)
+            exam_id = str(result.inserted_id)
+            self.exam_papers.insert_one({'exam_id': exam_id, 'paper_data': paper, 'version': 1})
+            return exam_id
         except Exception as e:
             print(f"Error creating exam: {e}")
             return None
 
-    def get_exam_by_id(self, exam_id):
-        """Get exam by ID"""
+    def get_exam_by_id(self, exam_id, include_paper=True):
+        """Get exam by ID, with its question paper unless include_paper is False"""
         try:
-            exam = self.exams.find_one({'_id': ObjectId(exam_id)})
+            projection = None if include_paper else {'paper_data': 0}
+            exam = self.exams.find_one({'_id': ObjectId(exam_id)}, projection)
             if exam:
                 exam['_id'] = str(exam['_id'])
+                # Exams created before papers were split out keep paper_data inline
+                if include_paper and 'paper_data' not in exam:
+                    paper = self.exam_papers.find_one({'exam_id': exam['_id']}, {'paper_data': 1})
+                    exam['paper_data'] = paper['paper_data'] if paper else {}
             return exam
         except Exception as e:
             print(f"Error getting exam: {e}")
             return None
 
-    def get_exams_by_teacher(self, teacher_id):
-        """Get all exams created by a teacher"""
+    def get_exam_version(self, exam_id):
+        """Get the version stamp of an exam, None if it does not exist"""
         try:
-            exams = []
-            for exam in self.exams.find({'created_by': teacher_id}):
-                exam['_id'] = str(exam['_id'])
-                exams.append(exam)
-            return exams
+            exam = self.exams.find_one({'_id': ObjectId(exam_id)}, {'version': 1})
+            return exam.get('version', 0) if exam else None
         except Exception as e:
-            print(f"Error getting teacher exams: {e}")
-            return []
+            print(f"Error getting exam version: {e}")
+            return None
 
-    def get_available_exams(self):
-        """Get all available exams for students"""
+    def update_exam(self, exam_id, updates):
+        """Update an exam and bump its version so cached grading data is recompiled"""
         try:
-            exams = []
-            for exam in self.exams.find({'is_active': True}):
-                exam['_id'] = str(exam['_id'])
-                exams.append(exam)
-            return exams
+            updates = dict(updates)
+            updates['updated_at'] = datetime.utcnow()
+
+            update = {'$set': updates, '$inc': {'version': 1}}
+            paper = updates.pop('paper_data', None)
+            if paper is not None:
+                updates.update(paper_counts(paper))
+                update['$unset'] = {'paper_data': ''}
+                self.exam_papers.update_one(
+                    {'exam_id': exam_id},
+                    {'$set': {'paper_data': paper}, '$inc': {'version': 1}},
+                    upsert=True
+                )
+
+            result = self.exams.update_one({'_id': ObjectId(exam_id)}, update)
+            return result.modified_count > 0
         except Exception as e:
-            print(f"Error getting available exams: {e}")
-            return []
+            print(f"Error updating exam: {e}")
+            return False
+
+    def exams_pager(self, teacher_id=None):
+        """Paged listing of a teacher's exams, or of the exams available to students, newest first"""
+        query = {'created_by': teacher_id} if teacher_id else {'is_active': True}
+        return KeysetPager(self.exams, query, EXAM_LISTING_PROJECTION, sort=[('created_at', -1), ('_id', -1)])
 
     # Response Management Methods
     def save_response(self, response_data):
-        """Save student response"""
+        """Save student response, raising DuplicateSubmissionError if the student already submitted"""
         try:
-            response_data['submitted_at'] = datetime.utcnow()
+            response_data.setdefault('submitted_at', datetime.utcnow())
             result = self.responses.insert_one(response_data)
             return str(result.inserted_id)
+        except DuplicateKeyError:
+            raise DuplicateSubmissionError(response_data.get('exam_id'))
         except Exception as e:
             print(f"Error saving response: {e}")
             return None
@@ -198,11 +520,11 @@ class Database:
             print(f"Error getting response: {e}")
             return None
 
-    def get_exam_responses(self, exam_id):
+    def get_exam_responses(self, exam_id, projection=None):
         """Get all responses for an exam"""
         try:
             responses = []
-            for response in self.responses.find({'exam_id': exam_id}):
+            for response in self.responses.find({'exam_id': exam_id}, projection):
                 response['_id'] = str(response['_id'])
                 responses.append(response)
             return responses
@@ -210,24 +532,54 @@ class Database:
             print(f"Error getting exam responses: {e}")
             return []
 
-    def update_response_score(self, response_id, score, feedback):
+    def exam_responses_pager(self, exam_id, projection=None, enrich=None):
+        """Paged listing of the responses to an exam in submission order"""
+        return KeysetPager(self.responses, {'exam_id': exam_id}, projection, enrich=enrich)
+
+    def update_response_score(self, response_id, score, feedback, evaluation=None):
         """Update response with score and feedback"""
         try:
+            update = {
+                'score': score,
+                'feedback': feedback,
+                'evaluated_at': datetime.utcnow()
+            }
+            if evaluation is not None:
+                update['evaluation'] = evaluation
+                update['grading_status'] = 'completed'
+
             result = self.responses.update_one(
                 {'_id': ObjectId(response_id)},
-                {
-                    '$set': {
-                        'score': score,
-                        'feedback': feedback,
-                        'evaluated_at': datetime.utcnow()
-                    }
-                }
+                {'$set': update}
             )
             return result.modified_count > 0
         except Exception as e:
             print(f"Error updating response score: {e}")
             return False
 
+    def set_response_grading_status(self, response_id, status):
+        """Set the grading status of a response"""
+        try:
+            result = self.responses.update_one(
+                {'_id': ObjectId(response_id)},
+                {'$set': {'grading_status': status}}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            print(f"Error updating grading status: {e}")
+            return False
+
+    def get_response_by_id(self, response_id):
+        """Get response by ID"""
+        try:
+            response = self.responses.find_one({'_id': ObjectId(response_id)})
+            if response:
+                response['_id'] = str(response['_id'])
+            return response
+        except Exception as e:
+            print(f"Error getting response: {e}")
+            return None
+
     # Utility Methods
     def get_subjects(self):
         """Get all unique subjects from question bank"""
@@ -247,7 +599,10 @@ class Database:
 
     def close_connection(self):
         """Close database connection"""
-        self.client.close()
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
 
 # Global database instance
 db = Database()
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""
+Evaluation Cache - content-addressed cache for AI evaluations of text answers
+
+Identical (question, answer) pairs are graded by the LLM only once. Results are
+kept in an in-process LRU and in the MongoDB `evaluation_cache` collection,
+which expires entries through a TTL index and is trimmed to a maximum size.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+from cache import LRUCache
+from database import db
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+EVALUATION_CACHE_MEMORY_ENTRIES = int(os.getenv('EVALUATION_CACHE_MEMORY_ENTRIES', '5000'))
+EVALUATION_CACHE_MAX_ENTRIES = int(os.getenv('EVALUATION_CACHE_MAX_ENTRIES', '200000'))
+EVALUATION_CACHE_ENABLED = os.getenv('EVALUATION_CACHE_ENABLED', 'true').lower() == 'true'
+
+# How many writes happen between two size checks of the persistent tier
+_EVICTION_CHECK_INTERVAL = 500
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_answer(answer: str) -> str:
+    """Normalize a student answer so trivially different copies share a cache entry"""
+    answer = _WHITESPACE.sub(' ', (answer or '').strip().lower())
+    return answer.strip(' .!?;,')
+
+def evaluation_key(question: Dict, student_answer: str, model: str = '') -> str:
+    """Hash everything that influences the grade of a text answer"""
+    payload = json.dumps({
+        'model': model,
+        'question': question.get('question', ''),
+        'type': question.get('type', ''),
+        'marks': question.get('marks', 1),
+        'sample_answer': question.get('sample_answer', ''),
+        'key_points': question.get('key_points', ''),
+        'answer': normalize_answer(student_answer)
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class EvaluationCache:
+    def __init__(self, memory_entries: int = EVALUATION_CACHE_MEMORY_ENTRIES,
+                 max_entries: int = EVALUATION_CACHE_MAX_ENTRIES,
+                 enabled: bool = EVALUATION_CACHE_ENABLED):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.memory = LRUCache(max_entries=memory_entries)
+        self._lock = threading.Lock()
+        self._writes_since_check = 0
+        self.persistent_hits = 0
+        self.persistent_misses = 0
+        self.stores = 0
+        self.persistent_evictions = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Look up a cached evaluation, memory tier first"""
+        if not self.enabled:
+            return None
+
+        evaluation = self.memory.get(key)
+        if evaluation is not None:
+            return copy.deepcopy(evaluation)
+
+        try:
+            document = db.evaluation_cache.find_one({'key': key}, {'evaluation': 1})
+        except Exception as e:
+            print(f"Error reading evaluation cache: {e}")
+            document = None
+
+        with self._lock:
+            if document:
+                self.persistent_hits += 1
+            else:
+                self.persistent_misses += 1
+
+        if not document:
+            return None
+
+        self.memory.set(key, document['evaluation'])
+        return copy.deepcopy(document['evaluation'])
+
+    def set(self, key: str, evaluation: Dict) -> None:
+        """Store an evaluation in both tiers"""
+        if not self.enabled:
+            return
+
+        self.memory.set(key, copy.deepcopy(evaluation))
+        try:
+            db.evaluation_cache.update_one(
+                {'key': key},
+                {'$set': {'evaluation': evaluation, 'created_at': datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"Error writing evaluation cache: {e}")
+            return
+
+        with self._lock:
+            self.stores += 1
+            self._writes_since_check += 1
+            check_size = self._writes_since_check >= _EVICTION_CHECK_INTERVAL
+            if check_size:
+                self._writes_since_check = 0
+
+        if check_size:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        """Trim the persistent tier back to max_entries, oldest entries first"""
+        try:
+            excess = db.evaluation_cache.estimated_document_count() - self.max_entries
+            if excess <= 0:
+                return
+
+            oldest = db.evaluation_cache.find({}, {'_id': 1}).sort('created_at', 1).limit(excess)
+            ids = [document['_id'] for document in oldest]
+            if ids:
+                result = db.evaluation_cache.delete_many({'_id': {'$in': ids}})
+                with self._lock:
+                    self.persistent_evictions += result.deleted_count
+        except Exception as e:
+            print(f"Error evicting evaluation cache entries: {e}")
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters for both tiers"""
+        memory_stats = self.memory.stats()
+        hits = memory_stats['hits'] + self.persistent_hits
+        lookups = memory_stats['hits'] + memory_stats['misses']
+        return {
+            'enabled': self.enabled,
+            'hits': hits,
+            'misses': self.persistent_misses,
+            'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+            'stores': self.stores,
+            'memory': memory_stats,
+            'persistent': {
+                'hits': self.persistent_hits,
+                'misses': self.persistent_misses,
+                'evictions': self.persistent_evictions,
+                'max_entries': self.max_entries
+            }
+        }
+
+# Global evaluation cache instance
+evaluation_cache = EvaluationCache()
@@ -1,9 +1,15 @@
+import copy
 import os
+from concurrent.futures import ThreadPoolExecutor
 from groq import Groq
-import re
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Optional, Callable
 from datetime import datetime
 from database import db
+from evaluation_cache import evaluation_cache, evaluation_key
+from mcq_engine import CompiledAnswerKey
+from grading_plan import GradingPlan
+from fallback_scorer import local_scorer
+from ai_output_parser import parse_evaluation, parse_batch_evaluation
 from dotenv import load_dotenv
 # from googletrans import Translator
 # from langdetect import detect
@@ -14,10 +20,27 @@ load_dotenv()
 # Initialize Groq client (will be initialized when needed)
 groq_client = None
 
+# Model used to grade text answers
+EVALUATION_MODEL = "llama3-8b-8192"
+
+# Maximum number of text answers of one submission graded at the same time
+EVALUATION_CONCURRENCY = int(os.getenv('EVALUATION_CONCURRENCY', '8'))
+
+# Prompt + completion token budget of one batched grading request
+BATCH_GRADING_TOKEN_BUDGET = int(os.getenv('BATCH_GRADING_TOKEN_BUDGET', '6000'))
+BATCH_GRADING_MAX_ANSWERS = int(os.getenv('BATCH_GRADING_MAX_ANSWERS', '20'))
+
+# Completion tokens reserved for each answer in a batched grading reply
+_BATCH_TOKENS_PER_ANSWER = 200
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return len(text) // 4 + 1
+
 class ResponseEvaluator:
-    def __init__(self):
+    def __init__(self, max_concurrency: Optional[int] = None):
         # self.translator = Translator()
-        pass
+        self.max_concurrency = max_concurrency or EVALUATION_CONCURRENCY
 
     def evaluate_mcq_response(self, question: Dict, student_answer: str) -> Dict:
         """Evaluate MCQ response"""
@@ -59,11 +82,17 @@ class ResponseEvaluator:
             if groq_client is None:
                 groq_client = Groq(api_key=api_key)
 
+            # Identical answers to the same question are only graded once
+            cache_key = evaluation_key(question, student_answer, EVALUATION_MODEL)
+            cached_evaluation = evaluation_cache.get(cache_key)
+            if cached_evaluation is not None:
+                return cached_evaluation
+
             # Create evaluation prompt
             prompt = self._create_evaluation_prompt(question, student_answer)
 
             response = groq_client.chat.completions.create(
-                model="llama3-8b-8192",
+                model=EVALUATION_MODEL,
                 messages=[
                     {"role": "system", "content": "You are an expert educator evaluating student responses. Provide fair, constructive feedback with specific scores."},
                     {"role": "user", "content": prompt}
@@ -73,7 +102,10 @@ class ResponseEvaluator:
             )
 
             evaluation_text = response.choices[0].message.content
-            evaluation = self._parse_ai_evaluation(evaluation_text, question.get('marks', 1))
+            evaluation, errors = self._parse_ai_evaluation(evaluation_text, question.get('marks', 1))
+            # A reply without a usable SCORE is graded 0 this time, not for every identical answer
+            if not errors:
+                evaluation_cache.set(cache_key, evaluation)
 
             return evaluation
         except Exception as e:
@@ -118,96 +150,178 @@ class ResponseEvaluator:
 
         return prompt
 
-    def _parse_ai_evaluation(self, evaluation_text: str, max_marks: int) -> Dict:
-        """Parse AI evaluation response"""
+    def evaluate_text_responses_batch(self, question: Dict, student_answers: List[str],
+                                      max_concurrency: Optional[int] = None) -> List[Dict]:
+        """Evaluate many students' answers to the same text question with batched prompts
+
+        Answers are deduplicated and looked up in the evaluation cache first. The rest are packed
+        into prompts that fit BATCH_GRADING_TOKEN_BUDGET; any answer whose part of a batched reply
+        cannot be parsed is graded on its own.
+        """
         try:
-            evaluation = {
-                'score': 0,
-                'max_score': max_marks,
-                'feedback_text': '',
-                'suggestions': '',
-                'hints': ''
-            }
+            if self._get_groq_client() is None:
+                return local_scorer.evaluate_many(question, student_answers)
 
-            lines = evaluation_text.split('\n')
-            current_section = None
-
-            for line in lines:
-                line = line.strip()
-                if line.startswith('SCORE:'):
-                    score_text = line.split(':', 1)[1].strip()
-                    # Extract number from score text
-                    score_match = re.search(r'(\d+(?:\.\d+)?)', score_text)
-                    if score_match:
-                        evaluation['score'] = min(float(score_match.group(1)), max_marks)
-                elif line.startswith('FEEDBACK:'):
-                    current_section = 'feedback'
-                    evaluation['feedback_text'] = line.split(':', 1)[1].strip()
-                elif line.startswith('SUGGESTIONS:'):
-                    current_section = 'suggestions'
-                    evaluation['suggestions'] = line.split(':', 1)[1].strip()
-                elif line.startswith('HINTS:'):
-                    current_section = 'hints'
-                    evaluation['hints'] = line.split(':', 1)[1].strip()
-                elif current_section and line:
-                    if current_section == 'feedback':
-                        evaluation['feedback_text'] += ' ' + line
-                    elif current_section == 'suggestions':
-                        evaluation['suggestions'] += ' ' + line
-                    elif current_section == 'hints':
-                        evaluation['hints'] += ' ' + line
+            evaluations = [None] * len(student_answers)
+            pending = {}
 
-            return evaluation
+            for index, student_answer in enumerate(student_answers):
+                cache_key = evaluation_key(question, student_answer, EVALUATION_MODEL)
+                cached_evaluation = evaluation_cache.get(cache_key)
+                if cached_evaluation is not None:
+                    evaluations[index] = cached_evaluation
+                else:
+                    pending.setdefault(cache_key, []).append(index)
+
+            unique_answers = [(cache_key, student_answers[indexes[0]]) for cache_key, indexes in pending.items()]
+            batches = self._plan_evaluation_batches(question, [answer for _, answer in unique_answers])
+
+            def grade_batch(batch: List[int]) -> List[Dict]:
+                return self._evaluate_answer_batch(question, [unique_answers[i] for i in batch])
+
+            concurrency = max_concurrency or self.max_concurrency
+            if concurrency <= 1 or len(batches) <= 1:
+                batch_results = [grade_batch(batch) for batch in batches]
+            else:
+                with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as executor:
+                    batch_results = list(executor.map(grade_batch, batches))
+
+            for batch, results in zip(batches, batch_results):
+                for unique_index, evaluation in zip(batch, results):
+                    cache_key = unique_answers[unique_index][0]
+                    for index in pending[cache_key]:
+                        evaluations[index] = copy.deepcopy(evaluation)
+
+            return evaluations
         except Exception as e:
-            print(f"Error parsing AI evaluation: {e}")
-            return {'score': 0, 'max_score': max_marks, 'feedback_text': 'Error in evaluation parsing'}
+            print(f"Error in batched AI evaluation: {e}, grading answers individually")
+            return [self.evaluate_text_response_ai(question, answer) for answer in student_answers]
+
+    def _plan_evaluation_batches(self, question: Dict, student_answers: List[str]) -> List[List[int]]:
+        """Group answer indexes into batches that stay within the token budget"""
+        base_tokens = _estimate_tokens(self._create_batch_evaluation_prompt(question, []))
+        batches = []
+        current = []
+        current_tokens = base_tokens
+
+        for index, student_answer in enumerate(student_answers):
+            answer_tokens = _estimate_tokens(student_answer) + _BATCH_TOKENS_PER_ANSWER + 10
+            if current and (current_tokens + answer_tokens > BATCH_GRADING_TOKEN_BUDGET
+                            or len(current) >= BATCH_GRADING_MAX_ANSWERS):
+                batches.append(current)
+                current = []
+                current_tokens = base_tokens
+            current.append(index)
+            current_tokens += answer_tokens
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def _evaluate_answer_batch(self, question: Dict, batch: List[Tuple[str, str]]) -> List[Dict]:
+        """Grade (cache_key, answer) pairs with one LLM request, falling back to single grading"""
+        if len(batch) == 1:
+            return [self.evaluate_text_response_ai(question, batch[0][1])]
 
-    def _fallback_evaluation(self, question: Dict, student_answer: str) -> Dict:
-        """Fallback evaluation when AI fails"""
         max_marks = question.get('marks', 1)
+        try:
+            prompt = self._create_batch_evaluation_prompt(question, [answer for _, answer in batch])
+            response = self._get_groq_client().chat.completions.create(
+                model=EVALUATION_MODEL,
+                messages=[
+                    {"role": "system", "content": "You are an expert educator evaluating student responses. Provide fair, constructive feedback with specific scores."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=_BATCH_TOKENS_PER_ANSWER * len(batch) + 100,
+                temperature=0.3
+            )
+            parsed, _ = self._parse_ai_evaluation(response.choices[0].message.content, max_marks, answer_count=len(batch))
+        except Exception as e:
+            print(f"Error in batched AI evaluation: {e}, grading answers individually")
+            parsed = [None] * len(batch)
 
-        # Simple keyword-based evaluation
-        if not student_answer.strip():
-            return {
-                'score': 0,
-                'max_score': max_marks,
-                'feedback_text': 'No answer provided.',
-                'suggestions': 'Please provide an answer to receive marks.',
-                'hints': 'Review the topic and try to answer the question.'
-            }
+        evaluations = []
+        for (cache_key, student_answer), evaluation in zip(batch, parsed):
+            if evaluation is None:
+                evaluation = self.evaluate_text_response_ai(question, student_answer)
+            else:
+                evaluation_cache.set(cache_key, evaluation)
+            evaluations.append(evaluation)
+        return evaluations
 
-        # Basic length and keyword check
-        answer_length = len(student_answer.split())
-        sample_answer = question.get('sample_answer', '')
-        key_points = question.get('key_points', '')
+    def _create_batch_evaluation_prompt(self, question: Dict, student_answers: List[str]) -> str:
+        """Create one evaluation prompt covering several answers to the same question"""
+        max_marks = question.get('marks', 1)
+        question_type = question.get('type', 'short_answer')
 
-        score = 0
-        if answer_length >= 10:  # Minimum effort
-            score += max_marks * 0.3
+        prompt = f"""
+        Evaluate each of the following {len(student_answers)} student responses to the same question.
+        Grade every response independently of the others.
 
-        # Check for key terms
-        if sample_answer or key_points:
-            reference_text = (sample_answer + ' ' + key_points).lower()
-            student_text = student_answer.lower()
+        Question: {question['question']}
+        Question Type: {question_type}
+        Maximum Marks: {max_marks}
+        """
 
-            # Simple keyword matching
-            reference_words = set(reference_text.split())
-            student_words = set(student_text.split())
+        if question.get('sample_answer'):
+            prompt += f"\nSample Answer: {question['sample_answer']}"
 
-            common_words = reference_words.intersection(student_words)
-            if len(common_words) > 0:
-                keyword_score = min(len(common_words) / len(reference_words), 0.7)
-                score += max_marks * keyword_score
+        if question.get('key_points'):
+            prompt += f"\nKey Points to Cover: {question['key_points']}"
 
-        score = min(score, max_marks)
+        prompt += "\n\nStudent Responses:\n"
+        for number, student_answer in enumerate(student_answers, 1):
+            prompt += f"\nStudent Response {number}: {student_answer}\n"
 
-        return {
-            'score': round(score, 1),
-            'max_score': max_marks,
-            'feedback_text': f'Basic evaluation completed. Score: {score}/{max_marks}',
-            'suggestions': 'For detailed feedback, ensure AI evaluation is available.',
-            'hints': 'Review the topic materials and sample answers.'
-        }
+        prompt += f"""
+
+        For every response, in order, reply with exactly one block in this format and nothing else:
+        ANSWER [response number]
+        SCORE: [number out of {max_marks}]
+        FEEDBACK: [detailed feedback]
+        SUGGESTIONS: [improvement suggestions]
+        HINTS: [helpful hints]
+        """
+
+        return prompt
+
+    def _get_groq_client(self):
+        """Get the shared Groq client, or None when no API key is configured"""
+        api_key = os.getenv('GROQ_API_KEY')
+        if not api_key or api_key == 'your_groq_api_key_here':
+            return None
+
+        global groq_client
+        if groq_client is None:
+            groq_client = Groq(api_key=api_key)
+        return groq_client
+
+    def _parse_ai_evaluation(self, evaluation_text: str, max_marks: int,
+                             answer_count: Optional[int] = None):
+        """Parse AI evaluation response into (evaluation, problems found in the reply)
+
+        With answer_count set, the text is a batched reply made of ANSWER <n> blocks and a list
+        with one evaluation per answer is returned; answers whose block is missing or has no
+        SCORE line come back as None.
+        """
+        try:
+            if answer_count is not None:
+                parsed, errors = parse_batch_evaluation(evaluation_text, max_marks, answer_count)
+            else:
+                parsed, errors = parse_evaluation(evaluation_text, max_marks)
+            for error in errors:
+                print(f"Malformed AI evaluation block {error['block']}: {error['error']}")
+            return parsed, errors
+        except Exception as e:
+            print(f"Error parsing AI evaluation: {e}")
+            errors = [{'block': None, 'error': str(e)}]
+            if answer_count is not None:
+                return [None] * answer_count, errors
+            return {'score': 0, 'max_score': max_marks, 'feedback_text': 'Error in evaluation parsing'}, errors
+
+    def _fallback_evaluation(self, question: Dict, student_answer: str) -> Dict:
+        """Fallback evaluation when AI fails"""
+        return local_scorer.evaluate(question, student_answer)
 
     def evaluate_response(self, question: Dict, student_answer: str) -> Dict:
         """Main method to evaluate any type of response"""
@@ -229,56 +343,35 @@ class ResponseEvaluator:
                 'hints': ''
             }
 
-    def evaluate_exam_response(self, exam_data: Dict, student_responses: Dict) -> Dict:
-        """Evaluate complete exam response"""
+    def evaluate_exam_response(self, exam_data: Dict, student_responses: Dict,
+                               max_concurrency: Optional[int] = None,
+                               progress_callback: Optional[Callable[[int, int], None]] = None,
+                               grading_plan: Optional[GradingPlan] = None,
+                               raise_errors: bool = False) -> Dict:
+        """Evaluate complete exam response
+
+        progress_callback, if given, is called as (graded, total) after each text answer is graded.
+        With a grading_plan the exam is taken from the plan and nothing is recompiled. With
+        raise_errors a failure is raised instead of returned as a zero-score evaluation, so the
+        grading queue can retry the job or mark it failed.
+        """
         try:
-            total_score = 0
-            max_total_score = 0
-            detailed_feedback = []
-
-            for section in exam_data.get('sections', []):
-                section_feedback = {
-                    'section_title': section.get('title', 'Section'),
-                    'questions': []
-                }
-
-                for i, question in enumerate(section.get('questions', [])):
-                    question_id = f"section_{exam_data['sections'].index(section)}_question_{i}"
-                    student_answer = student_responses.get(question_id, '')
-
-                    # Evaluate individual question
-                    evaluation = self.evaluate_response(question, student_answer)
-
-                    question_feedback = {
-                        'question_number': i + 1,
-                        'question_text': question['question'],
-                        'student_answer': student_answer,
-                        'evaluation': evaluation
-                    }
-
-                    section_feedback['questions'].append(question_feedback)
-                    total_score += evaluation['score']
-                    max_total_score += evaluation['max_score']
-
-                detailed_feedback.append(section_feedback)
-
-            # Calculate percentage
-            percentage = (total_score / max_total_score * 100) if max_total_score > 0 else 0
-
-            # Generate overall feedback
-            overall_feedback = self._generate_overall_feedback(percentage, detailed_feedback)
+            if grading_plan is not None:
+                exam_data = grading_plan.paper
+                answer_key = grading_plan.answer_key
+            else:
+                answer_key = CompiledAnswerKey(exam_data)
+            correct_row, _ = answer_key.score_matrix(answer_key.encode_answers(student_responses))
 
-            return {
-                'total_score': round(total_score, 1),
-                'max_score': max_total_score,
-                'percentage': round(percentage, 1),
-                'grade': self._calculate_grade(percentage),
-                'overall_feedback': overall_feedback,
-                'detailed_feedback': detailed_feedback,
-                'evaluation_date': datetime.utcnow()
-            }
+            detailed_feedback, text_jobs = self._build_feedback_slots(
+                exam_data, student_responses, answer_key, correct_row
+            )
+            self._evaluate_text_jobs(text_jobs, max_concurrency or self.max_concurrency, progress_callback)
+            return self._summarize_evaluation(detailed_feedback)
         except Exception as e:
             print(f"Error evaluating exam response: {e}")
+            if raise_errors:
+                raise
             return {
                 'total_score': 0,
                 'max_score': 0,
@@ -288,6 +381,141 @@ class ResponseEvaluator:
                 'detailed_feedback': []
             }
 
+    def evaluate_cohort_responses(self, exam_data: Dict, cohort_responses: List[Dict],
+                                  max_concurrency: Optional[int] = None,
+                                  grading_plan: Optional[GradingPlan] = None) -> List[Dict]:
+        """Evaluate many students' responses to one exam, batching text answers per question
+
+        Errors are raised rather than turned into zero-score results, so a failed regrade leaves
+        the stored grades untouched.
+        """
+        try:
+            cohort_feedback = []
+            answers_by_question = {}
+
+            if grading_plan is not None:
+                exam_data = grading_plan.paper
+                answer_key = grading_plan.answer_key
+            else:
+                answer_key = CompiledAnswerKey(exam_data)
+
+            # All MCQs of the cohort are scored with one matrix comparison
+            correct_matrix = answer_key.score_cohort(cohort_responses)['correct']
+
+            for student_responses, correct_row in zip(cohort_responses, correct_matrix):
+                detailed_feedback, text_jobs = self._build_feedback_slots(
+                    exam_data, student_responses, answer_key, correct_row
+                )
+                cohort_feedback.append(detailed_feedback)
+                for question_id, question_feedback, question, student_answer in text_jobs:
+                    group = answers_by_question.setdefault(question_id, (question, []))
+                    group[1].append((question_feedback, student_answer))
+
+            for question, slots in answers_by_question.values():
+                evaluations = self.evaluate_text_responses_batch(
+                    question,
+                    [student_answer for _, student_answer in slots],
+                    max_concurrency
+                )
+                for (question_feedback, _), evaluation in zip(slots, evaluations):
+                    question_feedback['evaluation'] = evaluation
+
+            return [self._summarize_evaluation(detailed_feedback) for detailed_feedback in cohort_feedback]
+        except Exception as e:
+            # No placeholder results: the caller would store them over the existing grades
+            print(f"Error evaluating cohort responses: {e}")
+            raise
+
+    def _build_feedback_slots(self, exam_data: Dict, student_responses: Dict,
+                              answer_key: CompiledAnswerKey, correct_row) -> Tuple[List[Dict], List[Tuple]]:
+        """Lay out detailed feedback in exam order, filling in MCQs and collecting text answers
+
+        correct_row is the student's row of answer_key.score_matrix().
+
+        Returns the feedback sections and a list of (question_id, question_feedback, question,
+        student_answer) jobs whose evaluation still has to be filled in.
+        """
+        detailed_feedback = []
+        text_jobs = []
+
+        for section_index, section in enumerate(exam_data.get('sections', [])):
+            section_feedback = {
+                'section_title': section.get('title', 'Section'),
+                'questions': []
+            }
+
+            for i, question in enumerate(section.get('questions', [])):
+                question_id = f"section_{section_index}_question_{i}"
+                student_answer = student_responses.get(question_id, '')
+
+                question_feedback = {
+                    'question_number': i + 1,
+                    'question_text': question['question'],
+                    'student_answer': student_answer,
+                    'evaluation': None
+                }
+
+                # MCQs are already scored by the answer key, text answers go to the worker pool
+                column = answer_key.column(section_index, i)
+                if column >= 0:
+                    question_feedback['evaluation'] = answer_key.feedback(column, correct_row[column])
+                else:
+                    text_jobs.append((question_id, question_feedback, question, student_answer))
+
+                section_feedback['questions'].append(question_feedback)
+
+            detailed_feedback.append(section_feedback)
+
+        return detailed_feedback, text_jobs
+
+    def _summarize_evaluation(self, detailed_feedback: List[Dict]) -> Dict:
+        """Total up graded feedback sections into the stored evaluation document"""
+        total_score = 0
+        max_total_score = 0
+
+        for section_feedback in detailed_feedback:
+            for question_feedback in section_feedback['questions']:
+                total_score += question_feedback['evaluation']['score']
+                max_total_score += question_feedback['evaluation']['max_score']
+
+        # Calculate percentage
+        percentage = (total_score / max_total_score * 100) if max_total_score > 0 else 0
+
+        # Generate overall feedback
+        overall_feedback = self._generate_overall_feedback(percentage, detailed_feedback)
+
+        return {
+            'total_score': round(total_score, 1),
+            'max_score': max_total_score,
+            'percentage': round(percentage, 1),
+            'grade': self._calculate_grade(percentage),
+            'overall_feedback': overall_feedback,
+            'detailed_feedback': detailed_feedback,
+            'evaluation_date': datetime.utcnow()
+        }
+
+    def _evaluate_text_jobs(self, text_jobs: List[Tuple], max_concurrency: int,
+                            progress_callback: Optional[Callable[[int, int], None]] = None) -> None:
+        """Grade non-MCQ answers, fanning out over a bounded thread pool"""
+        def record(graded: int, question_feedback: Dict, evaluation: Dict) -> None:
+            question_feedback['evaluation'] = evaluation
+            if progress_callback:
+                progress_callback(graded, len(text_jobs))
+
+        if max_concurrency <= 1 or len(text_jobs) <= 1:
+            for graded, (_, question_feedback, question, student_answer) in enumerate(text_jobs, 1):
+                record(graded, question_feedback, self.evaluate_response(question, student_answer))
+            return
+
+        # evaluate_response falls back per question, so a failed LLM call never aborts the batch
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(text_jobs))) as executor:
+            evaluations = executor.map(
+                lambda job: self.evaluate_response(job[2], job[3]),
+                text_jobs
+            )
+            for graded, (job, evaluation) in enumerate(zip(text_jobs, evaluations), 1):
+                record(graded, job[1], evaluation)
+
     def _generate_overall_feedback(self, percentage: float, detailed_feedback: List) -> str:
         """Generate overall feedback based on performance"""
         if percentage >= 90:
@@ -0,0 +1,120 @@
+"""
+Exam Snapshot - precomputed, student-safe delivery copy of an exam
+
+When an exam starts every student fetches the same paper within seconds. A
+snapshot strips the answer key from the paper once, serializes it once, keeps
+gzip (and brotli, when installed) encodings of the bytes in memory, and tags
+them with a content hash ETag so repeat fetches are answered with 304.
+"""
+
+import copy
+import gzip
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Optional
+from flask import json
+from cache import LRUCache
+from database import db
+from dotenv import load_dotenv
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+# Load environment variables
+load_dotenv()
+
+EXAM_SNAPSHOT_CACHE_SIZE = int(os.getenv('EXAM_SNAPSHOT_CACHE_SIZE', '256'))
+# How long a snapshot is served before its exam version is checked again
+EXAM_SNAPSHOT_REVALIDATE_SECONDS = float(os.getenv('EXAM_SNAPSHOT_REVALIDATE_SECONDS', '5'))
+
+# Question fields students must not see before submitting
+HIDDEN_QUESTION_FIELDS = ('correct_answer', 'explanation', 'sample_answer', 'key_points', 'hints')
+
+def student_safe_exam(exam: Dict) -> Dict:
+    """Copy of an exam with the answer key removed from every question"""
+    exam = copy.deepcopy(exam)
+    paper = exam.get('paper_data') or {}
+    question_lists = [section.get('questions', []) for section in paper.get('sections', [])]
+    question_lists.append(paper.get('questions', []))
+
+    for questions in question_lists:
+        for question in questions:
+            for field in HIDDEN_QUESTION_FIELDS:
+                question.pop(field, None)
+    return exam
+
+class ExamSnapshot:
+    """Serialized and compressed bytes of a student-safe exam"""
+
+    def __init__(self, exam: Dict):
+        self.exam_id = exam['_id']
+        self.version = exam.get('version', 0)
+        self.body = json.dumps({'exam': student_safe_exam(exam)}).encode('utf-8')
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+        self.encodings = {'gzip': gzip.compress(self.body, compresslevel=6)}
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(self.body)
+        self.checked_at = time.monotonic()
+
+    def encoded(self, accept_encoding: str):
+        """Best body for an Accept-Encoding header, as (bytes, content encoding or None)"""
+        accepted = {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')}
+        for encoding in ('br', 'gzip'):
+            if encoding in accepted and encoding in self.encodings:
+                return self.encodings[encoding], encoding
+        return self.body, None
+
+class ExamSnapshotCache:
+    def __init__(self, max_entries: int = EXAM_SNAPSHOT_CACHE_SIZE,
+                 revalidate_seconds: float = EXAM_SNAPSHOT_REVALIDATE_SECONDS):
+        self.revalidate_seconds = revalidate_seconds
+        self._snapshots = LRUCache(max_entries=max_entries)
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.builds = 0
+
+    def build(self, exam_id: str) -> Optional[ExamSnapshot]:
+        """Build and cache the snapshot of an exam's current version"""
+        exam = db.get_exam_by_id(exam_id)
+        if not exam:
+            self._snapshots.delete(exam_id)
+            return None
+
+        snapshot = ExamSnapshot(exam)
+        self._snapshots.set(exam_id, snapshot)
+        with self._lock:
+            self.builds += 1
+        return snapshot
+
+    def get(self, exam_id: str) -> Optional[ExamSnapshot]:
+        """Get the snapshot of an exam, served from memory between version checks"""
+        snapshot = self._snapshots.get(exam_id)
+        if snapshot is not None:
+            if time.monotonic() - snapshot.checked_at < self.revalidate_seconds:
+                return snapshot
+            if db.get_exam_version(exam_id) == snapshot.version:
+                snapshot.checked_at = time.monotonic()
+                return snapshot
+
+        # Only one request per process rebuilds a missing or stale snapshot, the others reuse it
+        with self._build_lock:
+            current = self._snapshots.get(exam_id)
+            if current is not None and current is not snapshot:
+                return current
+            return self.build(exam_id)
+
+    def invalidate(self, exam_id: str) -> None:
+        """Drop the cached snapshot of an exam"""
+        self._snapshots.delete(exam_id)
+
+    def stats(self) -> Dict:
+        stats = self._snapshots.stats()
+        stats['builds'] = self.builds
+        return stats
+
+# Global exam snapshot cache instance
+exam_snapshots = ExamSnapshotCache()
@@ -0,0 +1,289 @@
+"""
+Fallback Scorer - offline TF-IDF / BM25 scoring of text answers
+
+Used when the Groq API key is missing or the LLM fails. Text is tokenized and
+stemmed once, inverse document frequencies come from a per-subject table built
+from the static question bank and the stored question bank, and every question
+gets a precomputed sparse reference vector. Answers are then scored with
+vectorized cosine similarity and BM25-style key term coverage.
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from cache import LRUCache
+from database import db
+from static_question_bank import STATIC_QUESTION_BANK, _normalize_subject_name
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+FALLBACK_REFERENCE_CACHE_SIZE = int(os.getenv('FALLBACK_REFERENCE_CACHE_SIZE', '4096'))
+FALLBACK_IDF_MAX_STORED_QUESTIONS = int(os.getenv('FALLBACK_IDF_MAX_STORED_QUESTIONS', '50000'))
+# Seconds before an IDF table built without the stored questions (database error) is rebuilt
+FALLBACK_IDF_RETRY_SECONDS = int(os.getenv('FALLBACK_IDF_RETRY_SECONDS', '60'))
+
+# BM25 saturation parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+_STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will
+with which what when where who how why can do does not no your you their they them then than
+there these those such into also but if so
+""".split())
+
+_SUFFIXES = ('ational', 'ization', 'fulness', 'iveness', 'ations', 'ation', 'ments', 'ment',
+             'ness', 'ings', 'ing', 'ies', 'ied', 'edly', 'ed', 'ly', 'es', 's')
+
+_TEXT_FIELDS = ('question', 'sample_answer', 'key_points', 'explanation')
+
+# Private key under which a grading plan attaches a precomputed reference vector to a question
+REFERENCE_VECTOR_KEY = '_reference_vector'
+
+@lru_cache(maxsize=100000)
+def stem(word: str) -> str:
+    """Light suffix-stripping stemmer"""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            base = word[:-len(suffix)]
+            return base + 'y' if suffix in ('ies', 'ied') else base
+    return word
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split, drop stopwords and stem"""
+    return [
+        stem(token)
+        for token in _TOKEN.findall((text or '').lower())
+        if token not in _STOPWORDS and (len(token) > 1 or token.isdigit())
+    ]
+
+def field_text(value) -> str:
+    """Text of a stored question field, which may be missing, None or a list"""
+    if isinstance(value, (list, tuple)):
+        return ' '.join(str(item) for item in value if item is not None)
+    return str(value) if value is not None else ''
+
+def _question_text(question: Dict) -> str:
+    return ' '.join(field_text(question.get(field)) for field in _TEXT_FIELDS)
+
+def _subject_key(subject: Optional[str]) -> str:
+    return (_normalize_subject_name(subject) or '') if subject else ''
+
+class IdfTable:
+    """Inverse document frequencies of one subject's questions and answers"""
+
+    def __init__(self, documents: List[List[str]]):
+        self.document_count = len(documents)
+        frequencies = {}
+        for tokens in documents:
+            for token in set(tokens):
+                frequencies[token] = frequencies.get(token, 0) + 1
+
+        self._idf = {
+            token: math.log((self.document_count + 1) / (count + 1)) + 1
+            for token, count in frequencies.items()
+        }
+        # Terms never seen in the bank are treated as maximally rare
+        self.default_idf = math.log(self.document_count + 1) + 1
+
+    def idf(self, token: str) -> float:
+        return self._idf.get(token, self.default_idf)
+
+class ReferenceVector:
+    """Sparse TF-IDF vector of a question's sample answer and key points"""
+
+    def __init__(self, tokens: List[str], idf_table: IdfTable):
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+
+        self.terms = list(counts)
+        self.term_index = {term: i for i, term in enumerate(self.terms)}
+        self.idf = np.array([idf_table.idf(term) for term in self.terms], dtype=np.float64)
+        self.weights = np.array([counts[term] for term in self.terms], dtype=np.float64) * self.idf
+        self.norm = float(np.linalg.norm(self.weights))
+        self.length = max(len(tokens), 1)
+        self.idf_table = idf_table
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+class LocalScorer:
+    def __init__(self, reference_cache_size: int = FALLBACK_REFERENCE_CACHE_SIZE):
+        self._idf_tables = {}
+        # Subjects whose table lacks the stored questions, with the time to try loading them again
+        self._idf_retry_at = {}
+        self._lock = threading.RLock()
+        self._references = LRUCache(max_entries=reference_cache_size)
+
+    def idf_table(self, subject: Optional[str] = None) -> IdfTable:
+        """Get (building on first use) the IDF table of a subject, '' for all subjects"""
+        subject_key = _subject_key(subject)
+        table = self._idf_tables.get(subject_key)
+        if table is None or self._idf_retry_due(subject_key):
+            with self._lock:
+                table = self._idf_tables.get(subject_key)
+                if table is None or self._idf_retry_due(subject_key):
+                    documents, complete = self._subject_documents(subject_key)
+                    table = IdfTable(documents)
+                    if table.document_count == 0 and subject_key:
+                        # Unknown subject, use statistics of the whole bank
+                        table = self.idf_table('')
+                    if subject_key in self._idf_tables:
+                        # Reference vectors weighted with the incomplete table are rebuilt too
+                        self._references.clear()
+                    self._idf_tables[subject_key] = table
+                    if complete:
+                        self._idf_retry_at.pop(subject_key, None)
+                    else:
+                        self._idf_retry_at[subject_key] = time.monotonic() + FALLBACK_IDF_RETRY_SECONDS
+        return table
+
+    def _idf_retry_due(self, subject_key: str) -> bool:
+        retry_at = self._idf_retry_at.get(subject_key)
+        return retry_at is not None and retry_at <= time.monotonic()
+
+    def _subject_documents(self, subject_key: str) -> Tuple[List[List[str]], bool]:
+        """Tokenized questions and answers of a subject from the static and stored banks
+
+        The flag is False when the stored questions could not be loaded.
+        """
+        documents = []
+        for subject, topics in STATIC_QUESTION_BANK.items():
+            if subject_key and subject != subject_key:
+                continue
+            for difficulties in topics.values():
+                for questions in difficulties.values():
+                    for question in questions:
+                        documents.append(tokenize(_question_text(question)))
+
+        try:
+            query = {}
+            if subject_key:
+                # Stored questions use display names ("Computer Science") as well as keys
+                pattern = re.escape(subject_key).replace('_', '[ _]')
+                query['subject'] = {'$regex': f"^{pattern}$", '$options': 'i'}
+            projection = {field: 1 for field in _TEXT_FIELDS}
+            projection['_id'] = 0
+            for question in db.question_bank.find(query, projection).limit(FALLBACK_IDF_MAX_STORED_QUESTIONS):
+                documents.append(tokenize(_question_text(question)))
+        except Exception as e:
+            print(f"Error loading stored questions for IDF table: {e}")
+            return documents, False
+
+        return documents, True
+
+    def refresh(self) -> None:
+        """Forget IDF tables and reference vectors so they are rebuilt from current data"""
+        with self._lock:
+            self._idf_tables = {}
+            self._idf_retry_at = {}
+        self._references.clear()
+
+    def reference_vector(self, question: Dict) -> ReferenceVector:
+        """Get the precomputed reference vector of a question"""
+        if question.get(REFERENCE_VECTOR_KEY) is not None:
+            return question[REFERENCE_VECTOR_KEY]
+
+        reference_text = field_text(question.get('sample_answer')) + ' ' + field_text(question.get('key_points'))
+        subject_key = _subject_key(question.get('subject'))
+        cache_key = hashlib.sha1(f"{subject_key}\x00{reference_text}".encode('utf-8')).hexdigest()
+
+        reference = self._references.get(cache_key)
+        if reference is None:
+            reference = ReferenceVector(tokenize(reference_text), self.idf_table(subject_key))
+            self._references.set(cache_key, reference)
+        return reference
+
+    def similarity(self, reference: ReferenceVector, answers: List[str]) -> np.ndarray:
+        """Blend of TF-IDF cosine similarity and BM25 key term coverage, one value in [0, 1] per answer"""
+        if not answers or len(reference) == 0:
+            return np.zeros(len(answers))
+
+        tokenized = [tokenize(answer) for answer in answers]
+        term_index = reference.term_index
+        idf = reference.idf_table.idf
+
+        # Term frequencies restricted to the reference vocabulary (answers x reference terms)
+        matrix = np.zeros((len(answers), len(reference)), dtype=np.float64)
+        answer_norms = np.zeros(len(answers), dtype=np.float64)
+        lengths = np.zeros(len(answers), dtype=np.float64)
+
+        for row, tokens in enumerate(tokenized):
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+                column = term_index.get(token)
+                if column is not None:
+                    matrix[row, column] += 1
+            answer_norms[row] = math.sqrt(sum((count * idf(token)) ** 2 for token, count in counts.items()))
+            lengths[row] = len(tokens)
+
+        # Cosine similarity of TF-IDF vectors
+        dot = (matrix * reference.idf) @ reference.weights
+        denominators = answer_norms * reference.norm
+        cosine = np.divide(dot, denominators, out=np.zeros_like(dot), where=denominators > 0)
+
+        # BM25-style saturated coverage of the reference terms, with the reference answer
+        # length as the expected length so a score never depends on the other answers
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / reference.length)
+        saturated = matrix * (BM25_K1 + 1) / (matrix + length_norm[:, None])
+        coverage = (saturated @ reference.idf) / ((BM25_K1 + 1) * reference.idf.sum())
+
+        return np.clip(0.5 * cosine + 0.5 * coverage, 0.0, 1.0)
+
+    def evaluate_many(self, question: Dict, student_answers: List[str]) -> List[Dict]:
+        """Score many answers to one question, same result shape as a single fallback evaluation"""
+        max_marks = question.get('marks', 1)
+        has_reference = bool(question.get('sample_answer') or question.get('key_points'))
+
+        answers = [answer if isinstance(answer, str) else '' for answer in student_answers]
+        similarities = (self.similarity(self.reference_vector(question), answers)
+                        if has_reference else np.zeros(len(answers)))
+
+        evaluations = []
+        for answer, similarity in zip(answers, similarities):
+            if not answer.strip():
+                evaluations.append({
+                    'score': 0,
+                    'max_score': max_marks,
+                    'feedback_text': 'No answer provided.',
+                    'suggestions': 'Please provide an answer to receive marks.',
+                    'hints': 'Review the topic and try to answer the question.'
+                })
+                continue
+
+            score = 0
+            if len(answer.split()) >= 10:  # Minimum effort
+                score += max_marks * 0.3
+            score += max_marks * 0.7 * float(similarity)
+            score = round(min(score, max_marks), 1)
+
+            evaluations.append({
+                'score': score,
+                'max_score': max_marks,
+                'feedback_text': f'Basic evaluation completed. Score: {score}/{max_marks}',
+                'suggestions': 'For detailed feedback, ensure AI evaluation is available.',
+                'hints': 'Review the topic materials and sample answers.'
+            })
+
+        return evaluations
+
+    def evaluate(self, question: Dict, student_answer: str) -> Dict:
+        """Score a single answer"""
+        return self.evaluate_many(question, [student_answer])[0]
+
+# Global local scorer instance
+local_scorer = LocalScorer()
@@ -0,0 +1,68 @@
+"""
+Generation Cache - LLM completions keyed by a fingerprint of the request
+
+The question and quiz prompts are built deterministically from their inputs,
+so teachers who reuse a quiz title or a (subject, topic, difficulty, type)
+combination send the exact same request again. The completion text of a
+request that produced usable questions is kept in an in-process LRU with a
+TTL, keyed on a hash of the model, the messages and the sampling parameters,
+and parsed again on a hit. Questions served from the cache carry a
+"_cached" suffix on their `source`; callers pass fresh=True to bypass it.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional
+from cache import LRUCache
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+GENERATION_CACHE_ENABLED = os.getenv('GENERATION_CACHE_ENABLED', 'true').lower() == 'true'
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv('GENERATION_CACHE_MAX_ENTRIES', '1000'))
+GENERATION_CACHE_TTL_SECONDS = int(os.getenv('GENERATION_CACHE_TTL_SECONDS', '86400'))
+
+CACHED_SOURCE_SUFFIX = '_cached'
+
+def generation_key(model: str, messages: List[Dict], params: Dict) -> str:
+    """Hash everything that determines an LLM completion"""
+    payload = json.dumps({
+        'model': model,
+        'messages': messages,
+        'params': params
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def tag_cached(questions: List[Dict]) -> List[Dict]:
+    """Mark questions parsed from a cached completion in their source"""
+    for question in questions:
+        question['source'] = f"{question.get('source', '')}{CACHED_SOURCE_SUFFIX}"
+    return questions
+
+class GenerationCache:
+    def __init__(self, max_entries: int = GENERATION_CACHE_MAX_ENTRIES,
+                 ttl_seconds: int = GENERATION_CACHE_TTL_SECONDS,
+                 enabled: bool = GENERATION_CACHE_ENABLED):
+        self.enabled = enabled
+        self.completions = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached completion text of a request, None when missing or expired"""
+        if not self.enabled:
+            return None
+        return self.completions.get(key)
+
+    def set(self, key: str, completion: str) -> None:
+        """Store the completion text of a request"""
+        if self.enabled and completion:
+            self.completions.set(key, completion)
+
+    def stats(self) -> Dict:
+        """Get hit/miss counters for the cache"""
+        return dict(self.completions.stats(), enabled=self.enabled,
+                    ttl_seconds=self.completions.ttl_seconds)
+
+# Global generation cache instance
+generation_cache = GenerationCache()
@@ -0,0 +1,97 @@
+"""
+Grading Plan - everything about an exam that grading needs, compiled once per
+exam version and kept in a bounded in-process LRU.
+
+A plan holds the question-id mapping, the compiled MCQ answer key, marks and the
+reference vectors used by fallback scoring, so submitting and regrading only
+do the student-dependent work.
+"""
+
+import os
+from typing import Dict, Optional
+from cache import LRUCache
+from database import db
+from fallback_scorer import local_scorer, REFERENCE_VECTOR_KEY
+from mcq_engine import CompiledAnswerKey
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+GRADING_PLAN_CACHE_SIZE = int(os.getenv('GRADING_PLAN_CACHE_SIZE', '256'))
+
+class GradingPlan:
+    def __init__(self, exam: Dict):
+        self.exam_id = exam['_id']
+        self.version = exam.get('version', 0)
+        self.created_by = exam.get('created_by')
+        self.title = exam.get('title', '')
+
+        paper = exam.get('paper_data', {})
+        self.question_ids = []
+        self.marks = {}
+        sections = []
+
+        for section_index, section in enumerate(paper.get('sections', [])):
+            questions = []
+            for i, question in enumerate(section.get('questions', [])):
+                question_id = f"section_{section_index}_question_{i}"
+                self.question_ids.append(question_id)
+                self.marks[question_id] = question.get('marks', 1)
+
+                if question.get('type', '').lower() != 'mcq':
+                    question = dict(question)
+                    question[REFERENCE_VECTOR_KEY] = local_scorer.reference_vector(question)
+                questions.append(question)
+
+            sections.append(dict(section, questions=questions))
+
+        # Copy of the paper whose text questions carry their fallback reference vectors
+        self.paper = dict(paper, sections=sections)
+        self.answer_key = CompiledAnswerKey(self.paper)
+        # Old papers without sections only have a flat question list
+        self.total_questions = len(self.question_ids) or len(paper.get('questions', []))
+        self.total_marks = sum(self.marks.values())
+
+    def map_flat_answers(self, answers: Dict) -> Dict:
+        """Convert answers keyed by flat question index (as sent by the exam page) to question ids"""
+        responses = {}
+        for question_index, answer in answers.items():
+            try:
+                responses[self.question_ids[int(question_index)]] = answer
+            except (ValueError, IndexError):
+                continue
+        return responses
+
+class GradingPlanCache:
+    def __init__(self, max_entries: int = GRADING_PLAN_CACHE_SIZE):
+        self._plans = LRUCache(max_entries=max_entries)
+
+    def get(self, exam_id: str) -> Optional[GradingPlan]:
+        """Get the grading plan of an exam, recompiling it when the exam version changed"""
+        version = db.get_exam_version(exam_id)
+        if version is None:
+            self._plans.delete(exam_id)
+            return None
+
+        plan = self._plans.get(exam_id)
+        if plan is not None and plan.version == version:
+            return plan
+
+        exam = db.get_exam_by_id(exam_id)
+        if not exam:
+            return None
+
+        plan = GradingPlan(exam)
+        self._plans.set(exam_id, plan)
+        return plan
+
+    def invalidate(self, exam_id: str) -> None:
+        """Drop the cached plan of an exam"""
+        self._plans.delete(exam_id)
+
+    def stats(self) -> Dict:
+        return self._plans.stats()
+
+# Global grading plan cache instance
+grading_plans = GradingPlanCache()
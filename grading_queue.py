@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Grading Queue - MongoDB backed job queue that evaluates exam submissions
+outside of the HTTP request.
+
+Jobs live in the `grading_jobs` collection, so they survive restarts and can
+be processed by the in-process workers started by the web app or by a
+standalone worker process (`python grading_queue.py [workers]`). Set
+GRADING_WORKERS=0 to keep the web process from grading at all.
+"""
+
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database import db
+from evaluator import evaluator
+from grading_plan import grading_plans
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+GRADING_WORKERS = int(os.getenv('GRADING_WORKERS', '4'))
+GRADING_LEASE_SECONDS = int(os.getenv('GRADING_LEASE_SECONDS', '300'))
+GRADING_MAX_ATTEMPTS = int(os.getenv('GRADING_MAX_ATTEMPTS', '3'))
+GRADING_POLL_INTERVAL = float(os.getenv('GRADING_POLL_INTERVAL', '1.0'))
+
+# Seconds between two sweeps for jobs abandoned during their last attempt
+_ABANDONED_SWEEP_INTERVAL = 30
+
+class GradingQueue:
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers if workers is not None else GRADING_WORKERS
+        self._threads = []
+        self._started_pid = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._last_sweep = 0.0
+
+    def enqueue(self, response_id: str, exam_id: str, student_id: str) -> Optional[str]:
+        """Queue a saved response for grading"""
+        try:
+            job = {
+                'response_id': response_id,
+                'exam_id': exam_id,
+                'student_id': student_id,
+                'status': 'queued',
+                'attempts': 0,
+                'progress': {'graded': 0, 'total': 0},
+                'created_at': datetime.utcnow(),
+                'lease_expires_at': None
+            }
+            result = db.grading_jobs.insert_one(job)
+            self.start()
+            return str(result.inserted_id)
+        except DuplicateKeyError:
+            existing = db.grading_jobs.find_one({'response_id': response_id}, {'_id': 1})
+            return str(existing['_id']) if existing else None
+        except Exception as e:
+            print(f"Error enqueuing grading job: {e}")
+            return None
+
+    def get_job_status(self, response_id: str) -> Optional[Dict]:
+        """Get the grading status of a response"""
+        try:
+            job = db.grading_jobs.find_one({'response_id': response_id})
+            if not job:
+                return None
+
+            return {
+                'job_id': str(job['_id']),
+                'response_id': job['response_id'],
+                'status': job['status'],
+                'attempts': job.get('attempts', 0),
+                'progress': job.get('progress', {}),
+                'error': job.get('error'),
+                'created_at': job.get('created_at'),
+                'completed_at': job.get('completed_at')
+            }
+        except Exception as e:
+            print(f"Error getting grading job status: {e}")
+            return None
+
+    def claim_next_job(self, worker_id: str) -> Optional[Dict]:
+        """Atomically lease the oldest queued job, or one whose lease has expired"""
+        now = datetime.utcnow()
+        return db.grading_jobs.find_one_and_update(
+            {
+                'attempts': {'$lt': GRADING_MAX_ATTEMPTS},
+                '$or': [
+                    {'status': 'queued'},
+                    {'status': 'running', 'lease_expires_at': {'$lt': now}}
+                ]
+            },
+            {
+                '$set': {
+                    'status': 'running',
+                    'worker': worker_id,
+                    'started_at': now,
+                    'lease_expires_at': now + timedelta(seconds=GRADING_LEASE_SECONDS)
+                },
+                '$inc': {'attempts': 1}
+            },
+            sort=[('created_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def fail_abandoned_jobs(self) -> int:
+        """Mark jobs whose worker died during their last attempt as failed
+
+        claim_next_job never hands these out again, so without this they would stay running and
+        their responses queued forever.
+        """
+        now = datetime.utcnow()
+        failed = 0
+        while True:
+            job = db.grading_jobs.find_one_and_update(
+                {
+                    'status': 'running',
+                    'lease_expires_at': {'$lt': now},
+                    'attempts': {'$gte': GRADING_MAX_ATTEMPTS}
+                },
+                {'$set': {
+                    'status': 'failed',
+                    'error': 'Grading worker stopped during the last attempt',
+                    'lease_expires_at': None
+                }},
+                projection={'response_id': 1}
+            )
+            if not job:
+                return failed
+            db.set_response_grading_status(job['response_id'], 'failed')
+            failed += 1
+
+    def process_job(self, job: Dict) -> bool:
+        """Evaluate the response referenced by a job and store the result"""
+        job_id = job['_id']
+        try:
+            response = db.get_response_by_id(job['response_id'])
+            if not response:
+                raise ValueError('Response not found')
+
+            plan = grading_plans.get(job['exam_id'])
+            if not plan:
+                raise ValueError('Exam not found')
+
+            def report_progress(graded, total):
+                db.grading_jobs.update_one(
+                    {'_id': job_id},
+                    {'$set': {'progress': {'graded': graded, 'total': total}}}
+                )
+
+            evaluation = evaluator.evaluate_exam_response(
+                plan.paper,
+                response.get('responses', {}),
+                progress_callback=report_progress,
+                grading_plan=plan,
+                raise_errors=True
+            )
+
+            db.update_response_score(
+                job['response_id'],
+                evaluation.get('total_score', 0),
+                evaluation.get('overall_feedback', ''),
+                evaluation
+            )
+
+            db.grading_jobs.update_one(
+                {'_id': job_id},
+                {'$set': {'status': 'completed', 'completed_at': datetime.utcnow(), 'error': None}}
+            )
+            return True
+        except Exception as e:
+            print(f"Error processing grading job {job_id}: {e}")
+            # Put the job back in the queue until it runs out of attempts
+            failed = job.get('attempts', 1) >= GRADING_MAX_ATTEMPTS
+            db.grading_jobs.update_one(
+                {'_id': job_id},
+                {'$set': {
+                    'status': 'failed' if failed else 'queued',
+                    'error': str(e),
+                    'lease_expires_at': None
+                }}
+            )
+            if failed:
+                db.set_response_grading_status(job['response_id'], 'failed')
+            return False
+
+    def run_once(self, worker_id: str) -> bool:
+        """Process a single job, returns False when the queue is empty"""
+        if time.time() - self._last_sweep >= _ABANDONED_SWEEP_INTERVAL:
+            self._last_sweep = time.time()
+            self.fail_abandoned_jobs()
+
+        job = self.claim_next_job(worker_id)
+        if not job:
+            return False
+        self.process_job(job)
+        return True
+
+    def _worker_loop(self, worker_id: str):
+        while not self._stop_event.is_set():
+            try:
+                if not self.run_once(worker_id):
+                    self._stop_event.wait(GRADING_POLL_INTERVAL)
+            except Exception as e:
+                print(f"Grading worker {worker_id} error: {e}")
+                self._stop_event.wait(GRADING_POLL_INTERVAL)
+
+    def start(self):
+        """Start the worker threads once per process (safe to call repeatedly and after fork)"""
+        if self.workers <= 0 or self._started_pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+
+            self._started_pid = os.getpid()
+            self._stop_event.clear()
+            self._threads = []
+            for i in range(self.workers):
+                worker_id = f"{socket.gethostname()}:{os.getpid()}:{i}"
+                thread = threading.Thread(target=self._worker_loop, args=(worker_id,), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """Signal the worker threads to exit"""
+        self._stop_event.set()
+        self._started_pid = None
+
+# Global grading queue instance
+grading_queue = GradingQueue()
+
+if __name__ == '__main__':
+    # Standalone worker process: python grading_queue.py [workers]
+    import sys
+    if len(sys.argv) > 1:
+        grading_queue.workers = int(sys.argv[1])
+    print(f"Starting {grading_queue.workers} grading workers...")
+    grading_queue.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        grading_queue.stop()
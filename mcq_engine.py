@@ -0,0 +1,111 @@
+"""
+MCQ Engine - vectorized grading of multiple choice questions
+
+An exam's MCQ answer key is compiled once into NumPy arrays of option codes and
+marks. Student submissions are encoded into an answer matrix (one row per
+student, one column per MCQ) so a single submission or a whole cohort is scored
+with array comparisons instead of per-question string handling.
+"""
+
+from typing import Dict, List, Tuple
+import numpy as np
+
+# Code used for answers that match no option of the answer key
+UNKNOWN_OPTION = -1
+
+def _normalize_option(answer) -> str:
+    return answer.lower().strip() if isinstance(answer, str) else ''
+
+class CompiledAnswerKey:
+    def __init__(self, exam_data: Dict):
+        self.question_ids = []
+        self.positions = []
+        self._option_codes = {}
+        self._feedback_templates = []
+
+        correct_codes = []
+        marks = []
+
+        for section_index, section in enumerate(exam_data.get('sections', [])):
+            for i, question in enumerate(section.get('questions', [])):
+                if question.get('type', '').lower() != 'mcq':
+                    continue
+
+                correct_answer = _normalize_option(question.get('correct_answer', ''))
+                code = self._option_codes.setdefault(correct_answer, len(self._option_codes))
+                question_marks = question.get('marks', 1)
+
+                self.question_ids.append(f"section_{section_index}_question_{i}")
+                self.positions.append((section_index, i))
+                correct_codes.append(code)
+                marks.append(question_marks)
+                self._feedback_templates.append(self._build_feedback_templates(question, correct_answer))
+
+        self.correct_codes = np.array(correct_codes, dtype=np.int32)
+        self.marks = np.array(marks, dtype=np.float64)
+        self._column_by_position = {position: column for column, position in enumerate(self.positions)}
+
+    @staticmethod
+    def _build_feedback_templates(question: Dict, correct_answer: str) -> Tuple[Dict, Dict]:
+        """Precompute the incorrect/correct feedback returned for a question"""
+        question_marks = question.get('marks', 1)
+        explanation = question.get('explanation', '')
+
+        incorrect_text = f"Incorrect. The correct answer is {correct_answer.upper()}."
+        if explanation:
+            incorrect_text += f" {explanation}"
+
+        base = {
+            'max_score': question_marks,
+            'correct_answer': correct_answer.upper(),
+            'explanation': explanation
+        }
+        incorrect = dict(base, is_correct=False, score=0, feedback_text=incorrect_text)
+        correct = dict(base, is_correct=True, score=question_marks, feedback_text='Correct!')
+        return incorrect, correct
+
+    def __len__(self) -> int:
+        return len(self.question_ids)
+
+    def column(self, section_index: int, question_index: int) -> int:
+        """Column of a question in the answer matrix, or -1 if it is not an MCQ"""
+        return self._column_by_position.get((section_index, question_index), -1)
+
+    def encode_answers(self, student_responses: Dict) -> np.ndarray:
+        """Encode one submission into a row of option codes"""
+        codes = self._option_codes
+        return np.fromiter(
+            (codes.get(_normalize_option(student_responses.get(question_id, '')), UNKNOWN_OPTION)
+             for question_id in self.question_ids),
+            dtype=np.int32,
+            count=len(self.question_ids)
+        )
+
+    def encode_cohort(self, cohort_responses: List[Dict]) -> np.ndarray:
+        """Encode many submissions into an answer matrix"""
+        matrix = np.full((len(cohort_responses), len(self.question_ids)), UNKNOWN_OPTION, dtype=np.int32)
+        for row, student_responses in enumerate(cohort_responses):
+            matrix[row] = self.encode_answers(student_responses)
+        return matrix
+
+    def score_matrix(self, answer_matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Compare an answer matrix (or a single row) with the key
+
+        Returns a boolean correctness array of the same shape and the MCQ score of each row.
+        """
+        correct = answer_matrix == self.correct_codes
+        return correct, correct @ self.marks
+
+    def score_cohort(self, cohort_responses: List[Dict]) -> Dict:
+        """Score the MCQ part of many submissions at once"""
+        correct, scores = self.score_matrix(self.encode_cohort(cohort_responses))
+        return {
+            'scores': scores,
+            'correct_counts': correct.sum(axis=1),
+            'max_score': float(self.marks.sum()),
+            'correct': correct
+        }
+
+    def feedback(self, column: int, is_correct: bool) -> Dict:
+        """Per-question feedback in the same shape as ResponseEvaluator.evaluate_mcq_response"""
+        return dict(self._feedback_templates[column][int(bool(is_correct))])
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Database migrations for the AI Exam System
+
+Index creation and data moves used to run every time the app imported the
+database module, which meant every web worker and script contacted MongoDB at
+import. Run this once per deploy instead:
+
+Usage: python migrate.py [--skip-papers] [--rebuild-stats]
+"""
+
+import argparse
+import sys
+import time
+from database import db, paper_counts
+
+def migrate_exam_papers(batch_size=100):
+    """Move papers still stored inline on exams into the exam_papers collection"""
+    moved = 0
+    while True:
+        exams = list(db.exams.find({'paper_data': {'$exists': True}}, {'paper_data': 1}).limit(batch_size))
+        if not exams:
+            return moved
+        for exam in exams:
+            exam_id = str(exam['_id'])
+            db.exam_papers.update_one(
+                {'exam_id': exam_id},
+                {'$setOnInsert': {'exam_id': exam_id, 'paper_data': exam['paper_data']}},
+                upsert=True
+            )
+            # Listings read the summary counts instead of the paper
+            db.exams.update_one(
+                {'_id': exam['_id']},
+                {'$set': paper_counts(exam['paper_data'] or {}), '$unset': {'paper_data': ''}}
+            )
+            moved += 1
+
+def backfill_exam_counts(batch_size=100):
+    """Set the summary counts on exams whose paper was moved without them"""
+    updated = 0
+    last_id = None
+    while True:
+        query = {'question_count': {'$exists': False}}
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        exams = list(db.exams.find(query, {'_id': 1}).sort('_id', 1).limit(batch_size))
+        if not exams:
+            return updated
+        for exam in exams:
+            last_id = exam['_id']
+            paper = db.exam_papers.find_one({'exam_id': str(exam['_id'])}, {'paper_data': 1})
+            if paper is None:
+                continue
+            db.exams.update_one({'_id': exam['_id']}, {'$set': paper_counts(paper.get('paper_data') or {})})
+            updated += 1
+
+def main():
+    parser = argparse.ArgumentParser(description='Create indexes and migrate data')
+    parser.add_argument('--skip-papers', action='store_true', help='do not move inline exam papers')
+    parser.add_argument('--rebuild-stats', action='store_true', help='recount the question bank stats')
+    args = parser.parse_args()
+
+    started = time.time()
+    try:
+        db.ensure_indexes()
+        print("Indexes are up to date")
+
+        if not args.skip_papers:
+            print(f"Moved {migrate_exam_papers()} inline exam papers to exam_papers")
+            print(f"Set question and section counts on {backfill_exam_counts()} exams")
+
+        if args.rebuild_stats:
+            from question_stats import question_stats
+            question_stats.rebuild()
+            print("Rebuilt question bank stats")
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        return 1
+    finally:
+        db.close_connection()
+
+    print(f"Done in {time.time() - started:.1f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
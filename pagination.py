@@ -0,0 +1,150 @@
+"""
+Pagination - keyset pages and NDJSON streaming for list endpoints
+
+List endpoints used to load every matching document into a Python list before
+serializing it. Pages are now read with a range condition on the sort keys
+(never skip()), capped at PAGE_SIZE_MAX, and continued with an opaque token
+that encodes the sort values of the last document returned. Clients that want
+everything can ask for NDJSON instead, which is written out batch by batch
+straight from the database cursor.
+"""
+
+import base64
+import os
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from bson import json_util
+from flask import Response, json, jsonify, request, stream_with_context
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', '50'))
+PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', '500'))
+# Documents fetched per round trip while streaming
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', '500'))
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+class InvalidCursorError(ValueError):
+    """Raised for a continuation token that was not issued for this listing"""
+
+def page_size(requested: Optional[int]) -> int:
+    """Requested page size clamped to the server limits"""
+    if not requested or requested < 1:
+        return PAGE_SIZE_DEFAULT
+    return min(requested, PAGE_SIZE_MAX)
+
+def encode_cursor(sort: Sequence[Tuple[str, int]], document: Dict) -> str:
+    """Continuation token holding the sort key values of a document"""
+    payload = {'s': [field for field, _ in sort], 'v': [document.get(field) for field, _ in sort]}
+    token = base64.urlsafe_b64encode(json_util.dumps(payload).encode('utf-8'))
+    return token.decode('ascii').rstrip('=')
+
+def decode_cursor(sort: Sequence[Tuple[str, int]], token: str) -> List:
+    """Sort key values of a continuation token, checked against the listing's sort"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = payload['v']
+        fields = payload['s']
+    except Exception:
+        raise InvalidCursorError('Invalid cursor')
+    if fields != [field for field, _ in sort] or len(values) != len(sort):
+        raise InvalidCursorError('Invalid cursor')
+    return values
+
+def keyset_filter(sort: Sequence[Tuple[str, int]], values: Sequence) -> Dict:
+    """Condition matching documents that sort after the given key values"""
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {sort[j][0]: values[j] for j in range(i)}
+        branch[field] = {'$gt' if direction == 1 else '$lt': values[i]}
+        branches.append(branch)
+    return branches[0] if len(branches) == 1 else {'$or': branches}
+
+def serialize_id(document: Dict) -> Dict:
+    document['_id'] = str(document['_id'])
+    return document
+
+class KeysetPager:
+    """A filtered, sorted listing of one collection that is read a page or a batch at a time"""
+
+    def __init__(self, collection, query: Dict, projection: Optional[Dict] = None,
+                 sort: Sequence[Tuple[str, int]] = (('_id', 1),),
+                 enrich: Optional[Callable[[List[Dict]], None]] = None):
+        # The last sort key must be unique (normally _id) so no document is skipped or repeated
+        self.collection = collection
+        self.query = query
+        self.sort = list(sort)
+        self.projection = projection
+        if projection and any(projection.values()):
+            self.projection = dict(projection, **{field: 1 for field, _ in self.sort})
+        # Called with each page or batch of documents, e.g. to join related data in one query
+        self.enrich = enrich
+
+    def _find(self, cursor: Optional[str]):
+        query = self.query
+        if cursor:
+            query = {'$and': [self.query, keyset_filter(self.sort, decode_cursor(self.sort, cursor))]}
+        return self.collection.find(query, self.projection).sort(self.sort)
+
+    def _finish(self, documents: List[Dict]) -> List[Dict]:
+        documents = [serialize_id(document) for document in documents]
+        if self.enrich and documents:
+            self.enrich(documents)
+        return documents
+
+    def page(self, limit: Optional[int] = None, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """One page of documents and the token for the next page (None on the last page)"""
+        limit = page_size(limit)
+        documents = list(self._find(cursor).limit(limit + 1))
+
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = encode_cursor(self.sort, documents[-1])
+        return self._finish(documents), next_cursor
+
+    def stream(self, cursor: Optional[str] = None, limit: Optional[int] = None,
+               batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Dict]:
+        """Every document after the cursor, fetched batch_size at a time"""
+        # Validate the token before the response starts
+        results = self._find(cursor).batch_size(batch_size)
+        if limit:
+            results = results.limit(limit)
+
+        def generate():
+            batch = []
+            for document in results:
+                batch.append(document)
+                if len(batch) == batch_size:
+                    yield from self._finish(batch)
+                    batch = []
+            if batch:
+                yield from self._finish(batch)
+
+        return generate()
+
+def wants_stream() -> bool:
+    """Whether the client asked for NDJSON (?format=ndjson or Accept: application/x-ndjson)"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+def ndjson_response(documents: Iterator[Dict]) -> Response:
+    """Stream documents as newline-delimited JSON"""
+    def generate():
+        for document in documents:
+            yield json.dumps(document) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+def listing_response(pager: KeysetPager, key: str):
+    """NDJSON stream or one JSON page of a listing, depending on the request"""
+    cursor = request.args.get('cursor')
+    if wants_stream():
+        return ndjson_response(pager.stream(cursor=cursor, limit=request.args.get('limit', type=int)))
+
+    documents, next_cursor = pager.page(request.args.get('limit', type=int), cursor)
+    return jsonify({key: documents, 'next_cursor': next_cursor}), 200
@@ -0,0 +1,179 @@
+"""
+Password Hasher - bcrypt hashing and verification off the request threads
+
+bcrypt is deliberately CPU-bound, so a burst of logins at exam start would
+otherwise tie up every Flask worker. Work is sent to a thread pool sized to the
+machine's cores (bcrypt releases the GIL while hashing, so the threads run in
+parallel), and new work is refused once too much is queued so callers can
+answer 503 with Retry-After instead of letting latency grow without bound.
+"""
+
+import math
+import os
+import threading
+import time
+from concurrent.futures import BrokenExecutor, ThreadPoolExecutor
+from typing import Dict, Optional
+import bcrypt
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 2)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', '64'))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '30'))
+
+class HasherBusyError(Exception):
+    """Raised when the hashing queue is full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__('Password hashing queue is full')
+        self.retry_after = retry_after
+
+def _hash_password(password: bytes, submitted_at: float):
+    """Hash a password in a worker thread, returning (hash, queue wait, hash time)"""
+    started = time.time()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt())
+    return hashed, started - submitted_at, time.time() - started
+
+def _check_password(password: bytes, hashed: bytes, submitted_at: float):
+    """Verify a password in a worker thread, returning (match, queue wait, hash time)"""
+    started = time.time()
+    matches = bcrypt.checkpw(password, hashed)
+    return matches, started - submitted_at, time.time() - started
+
+class _Timing:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        seconds = max(seconds, 0.0)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self) -> Dict:
+        return {'count': self.count, 'avg_ms': round(self.average * 1000, 2), 'max_ms': round(self.max * 1000, 2)}
+
+class PasswordHasher:
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE,
+                 timeout: float = PASSWORD_HASH_TIMEOUT):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+        self.failed = 0
+        self.hash_time = _Timing()
+        self.queue_wait = _Timing()
+
+    def _get_executor(self) -> Optional[ThreadPoolExecutor]:
+        """Create the pool on first use, and again in a forked child process (threads don't survive fork)"""
+        if self.workers <= 0:
+            return None
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hasher')
+            self._pid = os.getpid()
+        return self._executor
+
+    def _reset_executor(self, broken) -> None:
+        """Replace a broken pool so later calls don't keep failing"""
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, future=None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def _submit(self, executor, function, *args):
+        try:
+            try:
+                future = executor.submit(function, *args, time.time())
+            except BrokenExecutor:
+                # Rebuild the pool and retry once
+                self._reset_executor(executor)
+                with self._lock:
+                    executor = self._get_executor()
+                future = executor.submit(function, *args, time.time())
+        except Exception:
+            self._release()
+            raise
+        # The slot is held until the job really ends, even if the caller stops waiting for it
+        future.add_done_callback(self._release)
+        return future
+
+    def _retry_after(self) -> int:
+        """Seconds until the queue has likely drained"""
+        per_job = self.hash_time.average or 0.25
+        return max(1, math.ceil(self._in_flight / max(self.workers, 1) * per_job))
+
+    def _run(self, function, *args):
+        with self._lock:
+            if self._in_flight >= max(self.workers, 1) + self.max_queue:
+                self.rejected += 1
+                raise HasherBusyError(self._retry_after())
+            self._in_flight += 1
+            executor = self._get_executor()
+
+        try:
+            if executor is None:
+                try:
+                    result, waited, took = function(*args, time.time())
+                finally:
+                    self._release()
+            else:
+                result, waited, took = self._submit(executor, function, *args).result(timeout=self.timeout)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            if isinstance(e, BrokenExecutor):
+                self._reset_executor(executor)
+            raise
+
+        with self._lock:
+            self.queue_wait.add(waited)
+            self.hash_time.add(took)
+        return result
+
+    def hash_password(self, password: str) -> bytes:
+        """Hash a password with bcrypt"""
+        return self._run(_hash_password, password.encode('utf-8'))
+
+    def check_password(self, password: str, hashed: bytes) -> bool:
+        """Verify a password against a bcrypt hash"""
+        return self._run(_check_password, password.encode('utf-8'), hashed)
+
+    def stats(self) -> Dict:
+        """Get queue and timing metrics"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'in_flight': self._in_flight,
+                'rejected': self.rejected,
+                'failed': self.failed,
+                'queue_wait': self.queue_wait.to_dict(),
+                'hash_time': self.hash_time.to_dict()
+            }
+
+    def shutdown(self) -> None:
+        """Stop the worker threads"""
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+# Global password hasher instance
+password_hasher = PasswordHasher()
@@ -1,10 +1,16 @@
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from groq import Groq
 import json
 import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 from datetime import datetime
 from database import db
+from question_pool import question_pool, QUESTION_POOL_ENABLED
+from ai_output_parser import QuizParser, parse_questions, parse_quiz_questions
+from generation_cache import generation_cache, generation_key, tag_cached
 from dotenv import load_dotenv
 from static_question_bank import get_questions_by_criteria, get_subjects, get_topics, get_question_stats
 # from googletrans import Translator
@@ -16,6 +22,19 @@ load_dotenv()
 # Initialize Groq client (will be initialized when needed)
 groq_client = None
 
+GENERATION_MODEL = "llama3-8b-8192"
+
+# Sections of one question paper generated at the same time
+PAPER_SECTION_CONCURRENCY = int(os.getenv('PAPER_SECTION_CONCURRENCY', '6'))
+# Seconds a section may take before template questions are used instead
+PAPER_SECTION_TIMEOUT = float(os.getenv('PAPER_SECTION_TIMEOUT', '45'))
+
+# Settings a section needs when its questions are generated rather than supplied
+REQUIRED_SECTION_FIELDS = ('subject', 'topic', 'difficulty', 'type', 'count')
+
+class SectionConfigError(ValueError):
+    """Raised for a paper section that cannot be generated as configured"""
+
 class QuestionGenerator:
     def __init__(self):
         # self.translator = Translator()
@@ -29,8 +48,9 @@ class QuestionGenerator:
         }
 
     def generate_questions_ai(self, subject: str, topic: str, difficulty: str,
-                             question_type: str, count: int = 5, language: str = 'en') -> List[Dict]:
-        """Generate questions using Groq API or fallback templates"""
+                             question_type: str, count: int = 5, language: str = 'en',
+                             fresh: bool = False) -> List[Dict]:
+        """Generate questions using Groq API or fallback templates (fresh skips the generation cache)"""
         try:
             # Check if Groq API key is configured
             api_key = os.getenv('GROQ_API_KEY')
@@ -45,20 +65,25 @@ class QuestionGenerator:
 
             # Create prompt based on question type
             prompt = self._create_prompt(subject, topic, difficulty, question_type, count, language)
+            messages = [
+                {"role": "system", "content": "You are an expert educator and question generator. Generate high-quality educational questions in the specified format."},
+                {"role": "user", "content": prompt}
+            ]
+            params = {'max_tokens': 2000, 'temperature': 0.7}
 
-            response = groq_client.chat.completions.create(
-                model="llama3-8b-8192",
-                messages=[
-                    {"role": "system", "content": "You are an expert educator and question generator. Generate high-quality educational questions in the specified format."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=2000,
-                temperature=0.7
-            )
+            # Same prompt as a recent request: reuse its completion
+            cache_key = generation_key(GENERATION_MODEL, messages, params)
+            questions_text = None if fresh else generation_cache.get(cache_key)
+            if questions_text is not None:
+                return tag_cached(self._parse_ai_response(questions_text, subject, topic, difficulty, question_type, language))
+
+            response = groq_client.chat.completions.create(model=GENERATION_MODEL, messages=messages, **params)
 
             # Parse the response
             questions_text = response.choices[0].message.content
             questions = self._parse_ai_response(questions_text, subject, topic, difficulty, question_type, language)
+            if questions:
+                generation_cache.set(cache_key, questions_text)
 
             return questions
         except Exception as e:
@@ -120,68 +145,9 @@ class QuestionGenerator:
     def _parse_ai_response(self, response_text: str, subject: str, topic: str,
                           difficulty: str, question_type: str, language: str) -> List[Dict]:
         """Parse AI response into structured question format"""
-        questions = []
-
-        try:
-            # Split response into individual questions
-            question_blocks = response_text.split('Q')[1:]  # Remove empty first element
-
-            for i, block in enumerate(question_blocks):
-                if not block.strip():
-                    continue
-
-                question_data = {
-                    'subject': subject,
-                    'topic': topic,
-                    'difficulty': difficulty,
-                    'type': question_type,
-                    'language': language,
-                    'source': 'ai_generated'
-                }
-
-                lines = block.strip().split('\n')
-                question_text = lines[0].split(':', 1)[1].strip() if ':' in lines[0] else lines[0].strip()
-                question_data['question'] = question_text
-
-                if question_type.lower() == 'mcq':
-                    options = {}
-                    correct_answer = ''
-                    explanation = ''
-
-                    for line in lines[1:]:
-                        line = line.strip()
-                        if line.startswith(('A)', 'B)', 'C)', 'D)')):
-                            key = line[0].lower()
-                            value = line[3:].strip()
-                            options[key] = value
-                        elif line.startswith('Correct Answer:'):
-                            correct_answer = line.split(':', 1)[1].strip().lower()
-                        elif line.startswith('Explanation:'):
-                            explanation = line.split(':', 1)[1].strip()
-
-                    question_data['options'] = options
-                    question_data['correct_answer'] = correct_answer
-                    question_data['explanation'] = explanation
-
-                elif question_type.lower() in ['short_answer', 'descriptive']:
-                    sample_answer = ''
-                    key_points = ''
-
-                    for line in lines[1:]:
-                        line = line.strip()
-                        if line.startswith('Sample Answer:'):
-                            sample_answer = line.split(':', 1)[1].strip()
-                        elif line.startswith('Key Points:'):
-                            key_points = line.split(':', 1)[1].strip()
-
-                    question_data['sample_answer'] = sample_answer
-                    question_data['key_points'] = key_points
-
-                questions.append(question_data)
-
-        except Exception as e:
-            print(f"Error parsing AI response: {e}")
-
+        questions, errors = parse_questions(response_text, subject, topic, difficulty, question_type, language)
+        for error in errors:
+            print(f"Skipped malformed AI question {error['block']}: {error['error']}")
         return questions
 
     def _generate_fallback_questions(self, subject: str, topic: str, difficulty: str,
@@ -362,8 +328,9 @@ class QuestionGenerator:
 
     def generate_quiz_questions_from_title(self, quiz_title: str, subject: str,
                                          difficulty: str = 'medium', count: int = 5,
-                                         question_types: List[str] = None) -> List[Dict]:
-        """Generate AI-powered questions based on quiz title and subject"""
+                                         question_types: List[str] = None,
+                                         fresh: bool = False) -> List[Dict]:
+        """Generate AI-powered questions based on quiz title and subject (fresh skips the generation cache)"""
         if question_types is None:
             question_types = ['mcq', 'short_answer']
 
@@ -380,27 +347,107 @@ class QuestionGenerator:
                 groq_client = Groq(api_key=api_key)
 
             # Create AI prompt based on quiz title
-            prompt = self._create_quiz_title_prompt(quiz_title, subject, difficulty, count, question_types)
+            messages, params = self._quiz_title_request(quiz_title, subject, difficulty, count, question_types)
 
-            response = groq_client.chat.completions.create(
-                model="llama3-8b-8192",
-                messages=[
-                    {"role": "system", "content": "You are an expert educator and question generator. Generate high-quality educational questions based on the quiz title and requirements."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=2500,
-                temperature=0.7
-            )
+            # Same prompt as a recent request: reuse its completion
+            cache_key = generation_key(GENERATION_MODEL, messages, params)
+            questions_text = None if fresh else generation_cache.get(cache_key)
+            if questions_text is not None:
+                return tag_cached(self._parse_quiz_ai_response(questions_text, subject, difficulty, question_types))[:count]
+
+            response = groq_client.chat.completions.create(model=GENERATION_MODEL, messages=messages, **params)
 
             # Parse the response
             questions_text = response.choices[0].message.content
             questions = self._parse_quiz_ai_response(questions_text, subject, difficulty, question_types)
+            if questions:
+                generation_cache.set(cache_key, questions_text)
 
             return questions[:count]  # Ensure we don't exceed requested count
         except Exception as e:
             print(f"Error generating AI quiz questions: {e}, using enhanced templates")
             return self._generate_enhanced_template_questions(quiz_title, subject, difficulty, count, question_types)
 
+    def stream_quiz_questions_from_title(self, quiz_title: str, subject: str,
+                                        difficulty: str = 'medium', count: int = 5,
+                                        question_types: List[str] = None,
+                                        fresh: bool = False) -> Iterator[Dict]:
+        """Yield quiz questions one at a time, each as soon as its block of the completion has streamed in"""
+        if question_types is None:
+            question_types = ['mcq', 'short_answer']
+
+        sent = 0
+        completion = None
+        try:
+            # Check if Groq API key is configured
+            api_key = os.getenv('GROQ_API_KEY')
+            if not api_key or api_key == 'your_groq_api_key_here':
+                print("Groq API key not configured, using enhanced template generation")
+            else:
+                # Initialize Groq client
+                global groq_client
+                if groq_client is None:
+                    groq_client = Groq(api_key=api_key)
+
+                messages, params = self._quiz_title_request(quiz_title, subject, difficulty, count, question_types)
+                cache_key = generation_key(GENERATION_MODEL, messages, params)
+                cached_text = None if fresh else generation_cache.get(cache_key)
+
+                if cached_text is not None:
+                    # Same prompt as a recent request: replay its completion at once
+                    questions = self._parse_quiz_ai_response(cached_text, subject, difficulty, question_types)
+                    for question in tag_cached(questions[:count]):
+                        yield question
+                        sent += 1
+                else:
+                    completion = groq_client.chat.completions.create(
+                        model=GENERATION_MODEL, messages=messages, stream=True, **params
+                    )
+
+                    parser = QuizParser(subject, difficulty)
+                    received = []
+                    for chunk in completion:
+                        text = chunk.choices[0].delta.content if chunk.choices else None
+                        if text:
+                            received.append(text)
+                        for question in parser.feed(text or ''):
+                            yield question
+                            sent += 1
+                            if sent >= count:
+                                return
+                    remaining = parser.close()
+                    # Only a completion that streamed to the end and produced questions is cached
+                    if sent or remaining:
+                        generation_cache.set(cache_key, ''.join(received))
+                    for question in remaining:
+                        if sent < count:
+                            yield question
+                            sent += 1
+                    for error in parser.errors:
+                        print(f"Skipped malformed AI quiz question {error['block']}: {error['error']}")
+        except Exception as e:
+            print(f"Error streaming AI quiz questions: {e}, using enhanced templates")
+        finally:
+            # Stop the completion if the client went away or enough questions were sent
+            if completion is not None and hasattr(completion, 'close'):
+                completion.close()
+
+        # Whatever the model did not deliver comes from the enhanced templates
+        if sent < count:
+            yield from self._generate_enhanced_template_questions(
+                quiz_title, subject, difficulty, count - sent, question_types
+            )
+
+    def _quiz_title_request(self, quiz_title: str, subject: str, difficulty: str,
+                            count: int, question_types: List[str]):
+        """Messages and sampling parameters of a quiz-from-title completion"""
+        prompt = self._create_quiz_title_prompt(quiz_title, subject, difficulty, count, question_types)
+        messages = [
+            {"role": "system", "content": "You are an expert educator and question generator. Generate high-quality educational questions based on the quiz title and requirements."},
+            {"role": "user", "content": prompt}
+        ]
+        return messages, {'max_tokens': 2500, 'temperature': 0.7}
+
     def _create_quiz_title_prompt(self, quiz_title: str, subject: str, difficulty: str,
                                 count: int, question_types: List[str]) -> str:
         """Create AI prompt based on quiz title"""
@@ -639,75 +686,9 @@ class QuestionGenerator:
 
     def _parse_quiz_ai_response(self, response_text: str, subject: str, difficulty: str, question_types: List[str]) -> List[Dict]:
         """Parse AI response for quiz questions"""
-        questions = []
-
-        try:
-            # Split response into individual questions
-            question_blocks = response_text.split('Q')[1:]  # Remove empty first element
-
-            for i, block in enumerate(question_blocks):
-                if not block.strip():
-                    continue
-
-                lines = block.strip().split('\n')
-                question_text = lines[0].split(':', 1)[1].strip() if ':' in lines[0] else lines[0].strip()
-
-                question_data = {
-                    'subject': subject,
-                    'topic': 'AI Generated',
-                    'difficulty': difficulty,
-                    'language': 'en',
-                    'source': 'ai_generated_quiz'
-                }
-
-                # Determine question type
-                question_type = 'mcq'  # default
-                for line in lines:
-                    if 'Type:' in line:
-                        if 'Short Answer' in line:
-                            question_type = 'short_answer'
-                        break
-
-                question_data['type'] = question_type
-                question_data['question'] = question_text
-
-                if question_type == 'mcq':
-                    options = {}
-                    correct_answer = ''
-                    explanation = ''
-
-                    for line in lines[1:]:
-                        line = line.strip()
-                        if line.startswith(('A)', 'B)', 'C)', 'D)')):
-                            key = line[0].lower()
-                            value = line[3:].strip()
-                            options[key] = value
-                        elif line.startswith('Correct Answer:'):
-                            correct_answer = line.split(':', 1)[1].strip().lower()
-                        elif line.startswith('Explanation:'):
-                            explanation = line.split(':', 1)[1].strip()
-
-                    question_data['options'] = options
-                    question_data['correct_answer'] = correct_answer
-                    question_data['explanation'] = explanation
-                    question_data['marks'] = 2
-
-                else:  # short_answer
-                    sample_answer = ''
-                    for line in lines[1:]:
-                        line = line.strip()
-                        if line.startswith('Sample Answer:'):
-                            sample_answer = line.split(':', 1)[1].strip()
-
-                    question_data['sample_answer'] = sample_answer
-                    question_data['key_points'] = 'Key concepts and explanations'
-                    question_data['marks'] = 5
-
-                questions.append(question_data)
-
-        except Exception as e:
-            print(f"Error parsing AI quiz response: {e}")
-
+        questions, errors = parse_quiz_questions(response_text, subject, difficulty)
+        for error in errors:
+            print(f"Skipped malformed AI quiz question {error['block']}: {error['error']}")
         return questions
 
     def get_questions_from_bank(self, subject: str, topic: str, difficulty: str,
@@ -773,8 +754,9 @@ class QuestionGenerator:
 
     def generate_mixed_questions(self, subject: str, topic: str, difficulty: str,
                                 question_type: str, count: int = 5, language: str = 'en',
-                                ai_ratio: float = 0.5) -> List[Dict]:
-        """Generate questions using both AI and question bank"""
+                                ai_ratio: float = 0.5, fresh: bool = False,
+                                cancelled: Optional[threading.Event] = None) -> List[Dict]:
+        """Generate questions using both AI and question bank (stops once cancelled is set)"""
         try:
             print(f"🔧 Manual Section Question Generation:")
             print(f"   - Subject: {subject}")
@@ -803,15 +785,29 @@ class QuestionGenerator:
 
             # Generate remaining questions with AI or enhanced templates
             remaining_count = count - len(questions)
+            if cancelled is not None and cancelled.is_set():
+                # The caller gave up on this section, leave the pool to the ones still waiting
+                print(f"   - Section cancelled, skipping pool and AI generation")
+                return questions[:count]
             if remaining_count > 0:
                 print(f"   - Generating {remaining_count} additional questions...")
 
-                # Try AI generation first
-                ai_questions = self.generate_questions_ai(
+                # Pre-generated AI questions from the pool first, the LLM only for the shortfall
+                pooled_questions = question_pool.take(
                     subject, topic, difficulty, question_type, remaining_count, language
                 )
-                print(f"   - AI returned: {len(ai_questions)} questions")
-                questions.extend(ai_questions)
+                print(f"   - Pool returned: {len(pooled_questions)} questions")
+                questions.extend(pooled_questions)
+
+                if count - len(questions) > 0:
+                    # Pooled questions go to one caller each; a cached completion would hand the
+                    # same AI questions to everyone, so the cache is skipped while the pool is on
+                    ai_questions = self.generate_questions_ai(
+                        subject, topic, difficulty, question_type, count - len(questions), language,
+                        fresh or QUESTION_POOL_ENABLED
+                    )
+                    print(f"   - AI returned: {len(ai_questions)} questions")
+                    questions.extend(ai_questions)
 
                 # If still need more questions, use enhanced template generation
                 still_remaining = count - len(questions)
@@ -844,6 +840,99 @@ class QuestionGenerator:
         print(f"Translation feature temporarily disabled. Returning original question.")
         return question_data
 
+    def _validate_section(self, section_config: Dict):
+        """Raise SectionConfigError for a section that is missing what generation needs"""
+        if ((section_config.get('is_ai_generated') and section_config.get('ai_generated_questions'))
+                or section_config.get('pre_selected_questions')):
+            return
+        title = section_config.get('title', 'Section')
+        missing = [field for field in REQUIRED_SECTION_FIELDS if not section_config.get(field)]
+        if missing:
+            raise SectionConfigError(f"Section '{title}' is missing: {', '.join(missing)}")
+        count = section_config['count']
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            raise SectionConfigError(f"Section '{title}' needs a positive question count")
+
+    def _generate_section(self, section_config: Dict, language: str,
+                          cancelled: Optional[threading.Event] = None) -> List[Dict]:
+        """Questions of one section: pre-generated, pre-selected or freshly generated"""
+        title = section_config.get('title', 'Section')
+        # Check if this section has pre-generated AI questions
+        if section_config.get('is_ai_generated') and section_config.get('ai_generated_questions'):
+            print(f"Using pre-generated AI questions for section: {title}")
+            return section_config['ai_generated_questions']
+        # Check if this section has pre-selected questions from question bank
+        if section_config.get('pre_selected_questions'):
+            print(f"Using pre-selected questions for section: {title}")
+            return section_config['pre_selected_questions']
+
+        # Generate questions based on configuration
+        return self.generate_mixed_questions(
+            subject=section_config['subject'],
+            topic=section_config['topic'],
+            difficulty=section_config['difficulty'],
+            question_type=section_config['type'],
+            count=section_config['count'],
+            language=language,
+            ai_ratio=section_config.get('ai_ratio', 0.5),
+            cancelled=cancelled
+        )
+
+    def _template_section(self, section_config: Dict, language: str) -> List[Dict]:
+        """Template questions for a section whose generation failed or timed out"""
+        count = section_config['count']
+        questions = self._generate_fallback_questions(
+            section_config['subject'], section_config['topic'], section_config['difficulty'],
+            section_config['type'], count, language
+        )
+        if len(questions) < count:
+            questions.extend(self._generate_enhanced_template_questions(
+                quiz_title=f"{section_config['subject']} - {section_config['topic']}",
+                subject=section_config['subject'],
+                difficulty=section_config['difficulty'],
+                count=count - len(questions),
+                question_types=[section_config['type']]
+            ))
+        if not questions:
+            # An empty section would be saved as a 0-mark part of the paper
+            raise RuntimeError(f"No template questions for section '{section_config.get('title', 'Section')}'")
+        return questions[:count]
+
+    def _generate_section_questions(self, section_configs: List[Dict], language: str) -> List[List[Dict]]:
+        """Questions of every section in configured order, generating sections concurrently"""
+        # Bad settings are the teacher's to fix, not something template questions should paper over
+        for config in section_configs:
+            self._validate_section(config)
+
+        workers = min(PAPER_SECTION_CONCURRENCY, len(section_configs))
+        if workers <= 1:
+            return [self._generate_section(config, language) for config in section_configs]
+
+        # Not a with-block: leaving it would wait for sections that already timed out
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='paper-section')
+        try:
+            started = time.monotonic()
+            cancel_flags = [threading.Event() for _ in section_configs]
+            futures = [executor.submit(self._generate_section, config, language, cancelled)
+                       for config, cancelled in zip(section_configs, cancel_flags)]
+
+            results = []
+            for index, (config, future, cancelled) in enumerate(zip(section_configs, futures, cancel_flags)):
+                # Sections queued behind a full pool get one more timeout per wave they waited
+                deadline = started + PAPER_SECTION_TIMEOUT * (index // workers + 1)
+                try:
+                    results.append(future.result(timeout=max(deadline - time.monotonic(), 0)))
+                except Exception as e:
+                    reason = 'timed out' if not future.done() else f'failed: {e}'
+                    print(f"Section '{config.get('title', 'Section')}' {reason}, using template questions")
+                    # A section still running must not claim pooled questions nobody will use
+                    cancelled.set()
+                    future.cancel()
+                    results.append(self._template_section(config, language))
+            return results
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def create_question_paper(self, paper_config: Dict) -> Dict:
         """Create a complete question paper"""
         try:
@@ -858,8 +947,11 @@ class QuestionGenerator:
                 'language': paper_config.get('language', 'en')
             }
 
-            # Generate questions for each section
-            for section_config in paper_config.get('sections', []):
+            language = paper_config.get('language', 'en')
+            section_configs = paper_config.get('sections', [])
+            section_questions = self._generate_section_questions(section_configs, language)
+
+            for section_config, questions in zip(section_configs, section_questions):
                 section = {
                     'title': section_config.get('title', 'Section'),
                     'instructions': section_config.get('instructions', ''),
@@ -867,37 +959,19 @@ class QuestionGenerator:
                     'marks_per_question': section_config.get('marks_per_question', 1)
                 }
 
-                # Check if this section has pre-generated AI questions
-                if section_config.get('is_ai_generated') and section_config.get('ai_generated_questions'):
-                    questions = section_config['ai_generated_questions']
-                    print(f"Using pre-generated AI questions for section: {section['title']}")
-                # Check if this section has pre-selected questions from question bank
-                elif section_config.get('pre_selected_questions'):
-                    questions = section_config['pre_selected_questions']
-                    print(f"Using pre-selected questions for section: {section['title']}")
-                else:
-                    # Generate questions based on configuration
-                    questions = self.generate_mixed_questions(
-                        subject=section_config['subject'],
-                        topic=section_config['topic'],
-                        difficulty=section_config['difficulty'],
-                        question_type=section_config['type'],
-                        count=section_config['count'],
-                        language=paper_config.get('language', 'en'),
-                        ai_ratio=section_config.get('ai_ratio', 0.5)
-                    )
-
                 # Add marks to each question
                 for question in questions:
                     question['marks'] = section['marks_per_question']
 
                 section['questions'] = questions
                 section['total_marks'] = len(questions) * section['marks_per_question']
-                paper['total_marks'] += section['total_marks']
-
                 paper['sections'].append(section)
 
+            paper['total_marks'] = sum(section['total_marks'] for section in paper['sections'])
+
             return paper
+        except SectionConfigError:
+            raise
         except Exception as e:
             print(f"Error creating question paper: {e}")
             return {}
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Question Import - streaming bulk import of CSV/JSONL files into the question bank
+
+Rows are parsed one at a time by a generator, validated against the fields the
+question bank API requires, hashed for deduplication and written with unordered
+insert_many batches. Duplicates are rejected by the unique question_hash index,
+so memory stays flat no matter how large the file is.
+
+Usage: python question_import.py questions.csv [--format jsonl] [--batch-size 1000]
+"""
+
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+from pymongo.errors import BulkWriteError
+from database import db, question_hash
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+QUESTION_IMPORT_BATCH_SIZE = int(os.getenv('QUESTION_IMPORT_BATCH_SIZE', '1000'))
+
+# Fields POST /api/questions/bank requires
+REQUIRED_QUESTION_FIELDS = ['question', 'subject', 'topic', 'difficulty', 'type']
+
+# How many invalid or failed rows are reported back in detail
+MAX_REPORTED_ERRORS = 50
+
+_DUPLICATE_KEY_ERROR = 11000
+
+_OPTION_COLUMNS = ('option_a', 'option_b', 'option_c', 'option_d', 'option_e')
+
+def iter_csv(stream: TextIO) -> Iterator[Tuple[int, Dict]]:
+    """Yield (line number, row) pairs from a CSV file with a header row"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+def iter_jsonl(stream: TextIO) -> Iterator[Tuple[int, Dict]]:
+    """Yield (line number, row) pairs from a JSON Lines file, skipping blank lines"""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = {'_parse_error': f'invalid JSON: {e}'}
+        yield line_number, row if isinstance(row, dict) else {'_parse_error': 'row is not an object'}
+
+def iter_rows(stream: TextIO, file_format: str) -> Iterator[Tuple[int, Dict]]:
+    """Parse a stream in the given format ('csv' or 'jsonl')"""
+    if file_format == 'csv':
+        return iter_csv(stream)
+    if file_format in ('jsonl', 'ndjson'):
+        return iter_jsonl(stream)
+    raise ValueError(f'Unsupported import format: {file_format}')
+
+def detect_format(filename: str) -> str:
+    """Guess the import format from a file name"""
+    return 'csv' if (filename or '').lower().endswith('.csv') else 'jsonl'
+
+def _clean(value):
+    return value.strip() if isinstance(value, str) else value
+
+def validate_question(row: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+    """Turn a parsed row into a question document, or return the reason it is invalid"""
+    if '_parse_error' in row:
+        return None, row['_parse_error']
+
+    question = {key: _clean(value) for key, value in row.items()
+                if key and value not in (None, '') and key not in _OPTION_COLUMNS}
+
+    for field in REQUIRED_QUESTION_FIELDS:
+        if not question.get(field):
+            return None, f'{field} is required'
+
+    question['type'] = str(question['type']).lower()
+    question['difficulty'] = str(question['difficulty']).lower()
+
+    # CSV files carry options as option_a..option_e columns or a JSON object
+    options = question.get('options')
+    if isinstance(options, str):
+        try:
+            options = json.loads(options)
+        except ValueError:
+            return None, 'options must be a JSON object'
+    if options is None:
+        options = {column[-1]: _clean(row[column]) for column in _OPTION_COLUMNS if row.get(column)}
+    if options:
+        question['options'] = options
+    if question['type'] == 'mcq' and not (options and question.get('correct_answer')):
+        return None, 'mcq questions need options and correct_answer'
+
+    try:
+        question['marks'] = int(question.get('marks', 1))
+    except (TypeError, ValueError):
+        return None, 'marks must be a number'
+
+    tags = question.get('tags')
+    if isinstance(tags, str):
+        question['tags'] = [tag.strip() for tag in tags.replace(';', ',').split(',') if tag.strip()]
+
+    question['question_hash'] = question_hash(question)
+    return question, None
+
+class QuestionImporter:
+    def __init__(self, batch_size: int = QUESTION_IMPORT_BATCH_SIZE):
+        self.batch_size = max(1, batch_size)
+
+    def import_rows(self, rows: Iterable[Tuple[int, Dict]], created_by: Optional[str] = None,
+                    on_batch: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Validate and insert parsed rows in batches, returning a summary of the import"""
+        summary = {
+            'rows': 0,
+            'imported': 0,
+            'duplicates': 0,
+            'invalid': 0,
+            'failed': 0,
+            'errors': [],
+            'batches': []
+        }
+        started = time.perf_counter()
+        batch = []
+
+        for line_number, row in rows:
+            summary['rows'] += 1
+            question, error = validate_question(row)
+            if error:
+                summary['invalid'] += 1
+                self._report_error(summary, line_number, error)
+                continue
+
+            if created_by:
+                question['created_by'] = created_by
+            question['source'] = question.get('source', 'import')
+            batch.append(question)
+
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch, summary, on_batch)
+                batch = []
+
+        if batch:
+            self._write_batch(batch, summary, on_batch)
+
+        elapsed = time.perf_counter() - started
+        summary['seconds'] = round(elapsed, 3)
+        summary['rows_per_second'] = round(summary['rows'] / elapsed, 1) if elapsed > 0 else 0.0
+        return summary
+
+    def _write_batch(self, batch, summary: Dict, on_batch: Optional[Callable[[Dict], None]]) -> None:
+        """Insert one batch unordered, counting rows rejected by the unique hash index as duplicates"""
+        started = time.perf_counter()
+        created_at = datetime.utcnow()
+        for question in batch:
+            question['created_at'] = created_at
+
+        rejected = set()
+        duplicates = 0
+        try:
+            db.question_bank.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                rejected.add(write_error['index'])
+                if write_error.get('code') == _DUPLICATE_KEY_ERROR:
+                    duplicates += 1
+                else:
+                    summary['failed'] += 1
+                    self._report_error(summary, None, write_error.get('errmsg', 'write failed'))
+        except Exception as e:
+            print(f"Error importing question batch: {e}")
+            rejected = set(range(len(batch)))
+            summary['failed'] += len(batch)
+            self._report_error(summary, None, str(e))
+
+        inserted = [question for i, question in enumerate(batch) if i not in rejected]
+        if inserted:
+            db.count_bank_questions(inserted)
+
+        elapsed = time.perf_counter() - started
+        report = {
+            'batch': len(summary['batches']) + 1,
+            'size': len(batch),
+            'imported': len(inserted),
+            'duplicates': duplicates,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(len(batch) / elapsed, 1) if elapsed > 0 else 0.0
+        }
+        summary['imported'] += len(inserted)
+        summary['duplicates'] += duplicates
+        summary['batches'].append(report)
+        if on_batch:
+            on_batch(report)
+
+    @staticmethod
+    def _report_error(summary: Dict, line_number: Optional[int], message: str) -> None:
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'line': line_number, 'error': message})
+
+    def import_stream(self, stream, file_format: str, created_by: Optional[str] = None,
+                      on_batch: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Import from a text or binary stream"""
+        if not isinstance(stream, io.TextIOBase):
+            stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        return self.import_rows(iter_rows(stream, file_format), created_by=created_by, on_batch=on_batch)
+
+    def import_file(self, path: str, file_format: Optional[str] = None, created_by: Optional[str] = None,
+                    on_batch: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Import a CSV or JSONL file from disk"""
+        with open(path, 'r', encoding='utf-8-sig', newline='') as stream:
+            return self.import_stream(stream, file_format or detect_format(path),
+                                      created_by=created_by, on_batch=on_batch)
+
+# Global question importer instance
+question_importer = QuestionImporter()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Bulk import questions into the question bank')
+    parser.add_argument('path', help='CSV or JSONL file to import')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='file format (default: from extension)')
+    parser.add_argument('--batch-size', type=int, default=QUESTION_IMPORT_BATCH_SIZE)
+    parser.add_argument('--created-by', help='user id recorded on imported questions')
+    args = parser.parse_args()
+
+    def print_batch(report):
+        print(f"Batch {report['batch']}: {report['imported']}/{report['size']} imported, "
+              f"{report['duplicates']} duplicates, {report['rows_per_second']} rows/s")
+
+    result = QuestionImporter(args.batch_size).import_file(
+        args.path, args.format, created_by=args.created_by, on_batch=print_batch
+    )
+    print(f"Imported {result['imported']} of {result['rows']} rows in {result['seconds']}s "
+          f"({result['duplicates']} duplicates, {result['invalid']} invalid, {result['failed']} failed)")
+    for error in result['errors']:
+        print(f"  line {error['line']}: {error['error']}")
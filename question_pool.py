@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Question Pool - stock of pre-generated AI questions per (subject, topic,
+difficulty, type, language)
+
+Generating questions with the LLM takes seconds per request. The pool keeps
+validated AI questions in the `question_pool` collection so that
+generate_mixed_questions can hand them out immediately. Every key that has
+been asked for is tracked in `question_pool_keys` together with its hit and
+miss counts. When a key's stock drops below QUESTION_POOL_LOW_WATERMARK, a
+background refiller generates it back up to QUESTION_POOL_HIGH_WATERMARK.
+Keys are leased while they are refilled, so several processes never
+generate for the same key at once. Refillers run in the web process
+(QUESTION_POOL_REFILL_WORKERS) or standalone: `python question_pool.py`.
+"""
+
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from database import db, question_hash
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+QUESTION_POOL_ENABLED = os.getenv('QUESTION_POOL_ENABLED', 'true').lower() == 'true'
+QUESTION_POOL_HIGH_WATERMARK = int(os.getenv('QUESTION_POOL_HIGH_WATERMARK', '20'))
+QUESTION_POOL_LOW_WATERMARK = int(os.getenv('QUESTION_POOL_LOW_WATERMARK', '5'))
+# Questions requested from the LLM per generation call while refilling
+QUESTION_POOL_REFILL_BATCH = int(os.getenv('QUESTION_POOL_REFILL_BATCH', '10'))
+QUESTION_POOL_REFILL_WORKERS = int(os.getenv('QUESTION_POOL_REFILL_WORKERS', '1'))
+QUESTION_POOL_REFILL_INTERVAL = float(os.getenv('QUESTION_POOL_REFILL_INTERVAL', '30'))
+QUESTION_POOL_LEASE_SECONDS = int(os.getenv('QUESTION_POOL_LEASE_SECONDS', '300'))
+# Wait before retrying a key whose last refill produced no usable questions (e.g. no API key)
+QUESTION_POOL_RETRY_SECONDS = int(os.getenv('QUESTION_POOL_RETRY_SECONDS', '600'))
+# Keys not requested for this long are no longer refilled
+QUESTION_POOL_KEY_IDLE_DAYS = int(os.getenv('QUESTION_POOL_KEY_IDLE_DAYS', '14'))
+
+_KEY_FIELDS = ('subject', 'topic', 'difficulty', 'type', 'language')
+
+# Bookkeeping fields removed before a pooled question is handed out
+_POOL_FIELDS = ('_id', 'pool_key', 'question_hash', 'created_at')
+
+def _refillable(now: datetime) -> Dict:
+    """Condition for keys that are neither leased nor waiting to be retried"""
+    return {'$and': [
+        {'$or': [{'refill_lease_until': None}, {'refill_lease_until': {'$lt': now}}]},
+        {'$or': [{'refill_not_before': None}, {'refill_not_before': {'$lt': now}}]}
+    ]}
+
+def pool_key(subject: str, topic: str, difficulty: str, question_type: str, language: str = 'en') -> str:
+    """Normalized pool key of a question request"""
+    return '|'.join(str(value or '').strip().lower() for value in (subject, topic, difficulty, question_type, language))
+
+def validate_pool_question(question: Dict, question_type: str) -> Optional[str]:
+    """Reason a generated question can't be pooled, or None if it is usable"""
+    if question.get('source') != 'ai_generated':
+        return 'not AI generated'
+    if len(str(question.get('question', '')).strip()) < 10:
+        return 'question text missing or too short'
+
+    if question_type.lower() == 'mcq':
+        options = question.get('options') or {}
+        if len([value for value in options.values() if str(value).strip()]) < 4:
+            return 'fewer than four options'
+        if question.get('correct_answer') not in options:
+            return 'correct answer is not one of the options'
+    elif not (question.get('sample_answer') or question.get('key_points')):
+        return 'no sample answer or key points'
+    return None
+
+class QuestionPool:
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers if workers is not None else QUESTION_POOL_REFILL_WORKERS
+        self._threads = []
+        self._started_pid = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+    def take(self, subject: str, topic: str, difficulty: str, question_type: str,
+             count: int, language: str = 'en') -> List[Dict]:
+        """Remove up to count questions from the pool, recording hits and misses for the key"""
+        if not QUESTION_POOL_ENABLED or count <= 0:
+            return []
+
+        key = pool_key(subject, topic, difficulty, question_type, language)
+        questions = []
+        try:
+            # find_one_and_delete is atomic, so concurrent requests never get the same question
+            while len(questions) < count:
+                question = db.question_pool.find_one_and_delete({'pool_key': key}, sort=[('created_at', 1)])
+                if question is None:
+                    break
+                for field in _POOL_FIELDS:
+                    question.pop(field, None)
+                questions.append(question)
+
+            db.question_pool_keys.update_one(
+                {'_id': key},
+                {
+                    '$setOnInsert': dict(zip(_KEY_FIELDS, key.split('|'))),
+                    '$set': {'last_requested_at': datetime.utcnow()},
+                    '$inc': {'hits': len(questions), 'misses': count - len(questions)}
+                },
+                upsert=True
+            )
+
+            if len(questions) < count or self.stock(key) < QUESTION_POOL_LOW_WATERMARK:
+                self.start()
+                self._wake_event.set()
+        except Exception as e:
+            print(f"Error taking questions from pool: {e}")
+        return questions
+
+    def stock(self, key: str) -> int:
+        """Number of questions stocked for a key"""
+        return db.question_pool.count_documents({'pool_key': key})
+
+    def add(self, key: str, questions: List[Dict]) -> Dict:
+        """Validate generated questions and stock the usable ones under a key"""
+        question_type = key.split('|')[3]
+        documents = []
+        rejected = 0
+        for question in questions:
+            reason = validate_pool_question(question, question_type)
+            if reason:
+                rejected += 1
+                continue
+            document = dict(question)
+            document.update({
+                'pool_key': key,
+                'question_hash': question_hash(question),
+                'created_at': datetime.utcnow()
+            })
+            documents.append(document)
+
+        added = 0
+        if documents:
+            try:
+                added = len(db.question_pool.insert_many(documents, ordered=False).inserted_ids)
+            except BulkWriteError as e:
+                # Duplicates of questions already in stock are skipped
+                added = e.details.get('nInserted', 0)
+
+        db.question_pool_keys.update_one({'_id': key}, {'$inc': {'generated': added, 'rejected': rejected}})
+        return {'added': added, 'rejected': rejected, 'duplicates': len(documents) - added}
+
+    def claim_depleted_key(self, worker_id: str) -> Optional[Dict]:
+        """Lease the most recently requested key whose stock is below the low watermark"""
+        now = datetime.utcnow()
+        idle_since = now - timedelta(days=QUESTION_POOL_KEY_IDLE_DAYS)
+        candidates = db.question_pool_keys.find(
+            dict(_refillable(now), last_requested_at={'$gte': idle_since}),
+            {'_id': 1}
+        ).sort('last_requested_at', -1).limit(100)
+
+        for candidate in candidates:
+            if self.stock(candidate['_id']) >= QUESTION_POOL_LOW_WATERMARK:
+                continue
+            key_doc = db.question_pool_keys.find_one_and_update(
+                dict(_refillable(now), _id=candidate['_id']),
+                {'$set': {
+                    'refill_lease_until': now + timedelta(seconds=QUESTION_POOL_LEASE_SECONDS),
+                    'refill_worker': worker_id
+                }},
+                return_document=ReturnDocument.AFTER
+            )
+            if key_doc:
+                return key_doc
+        return None
+
+    def refill(self, key_doc: Dict) -> int:
+        """Generate questions for a key until it reaches the high watermark"""
+        # Imported here: the generator draws from this pool
+        from question_generator import question_generator
+
+        key = key_doc['_id']
+        added = 0
+        try:
+            # Stop after a generation call that adds nothing, so a bad prompt can't loop forever.
+            # The generation cache is bypassed: a cached completion only repeats stocked questions
+            while True:
+                missing = QUESTION_POOL_HIGH_WATERMARK - self.stock(key)
+                if missing <= 0 or self._stop_event.is_set():
+                    break
+                generated = question_generator.generate_questions_ai(
+                    key_doc['subject'], key_doc['topic'], key_doc['difficulty'], key_doc['type'],
+                    min(missing, QUESTION_POOL_REFILL_BATCH), key_doc['language'], fresh=True
+                )
+                result = self.add(key, generated)
+                if result['added'] == 0:
+                    break
+                added += result['added']
+        finally:
+            # A key still depleted after refilling is retried later instead of right away
+            now = datetime.utcnow()
+            depleted = self.stock(key) < QUESTION_POOL_LOW_WATERMARK
+            retry_at = now + timedelta(seconds=QUESTION_POOL_RETRY_SECONDS) if depleted else None
+            db.question_pool_keys.update_one(
+                {'_id': key},
+                {'$set': {'refill_lease_until': None, 'refill_not_before': retry_at, 'last_refilled_at': now}}
+            )
+        return added
+
+    def run_once(self, worker_id: str) -> bool:
+        """Refill a single depleted key, returns False when no key needs refilling"""
+        key_doc = self.claim_depleted_key(worker_id)
+        if not key_doc:
+            return False
+        self.refill(key_doc)
+        return True
+
+    def _worker_loop(self, worker_id: str):
+        while not self._stop_event.is_set():
+            try:
+                if not self.run_once(worker_id):
+                    self._wake_event.wait(QUESTION_POOL_REFILL_INTERVAL)
+                    self._wake_event.clear()
+            except Exception as e:
+                print(f"Question pool refiller {worker_id} error: {e}")
+                self._stop_event.wait(QUESTION_POOL_REFILL_INTERVAL)
+
+    def start(self):
+        """Start the refill threads once per process (safe to call repeatedly and after fork)"""
+        if self.workers <= 0:
+            return
+
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+
+            self._started_pid = os.getpid()
+            self._stop_event.clear()
+            self._threads = []
+            for i in range(self.workers):
+                worker_id = f"{socket.gethostname()}:{os.getpid()}:pool-{i}"
+                thread = threading.Thread(target=self._worker_loop, args=(worker_id,), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """Signal the refill threads to exit"""
+        self._stop_event.set()
+        self._wake_event.set()
+        self._started_pid = None
+
+    def stats(self, limit: int = 200) -> Dict:
+        """Stock and hit rate of the most recently requested keys"""
+        try:
+            stock = {group['_id']: group['count'] for group in db.question_pool.aggregate([
+                {'$group': {'_id': '$pool_key', 'count': {'$sum': 1}}}
+            ])}
+
+            keys = []
+            total_hits = total_misses = 0
+            for key_doc in db.question_pool_keys.find().sort('last_requested_at', -1).limit(limit):
+                hits = key_doc.get('hits', 0)
+                misses = key_doc.get('misses', 0)
+                total_hits += hits
+                total_misses += misses
+                keys.append({
+                    'key': {field: key_doc.get(field) for field in _KEY_FIELDS},
+                    'stock': stock.get(key_doc['_id'], 0),
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_rate': round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                    'generated': key_doc.get('generated', 0),
+                    'rejected': key_doc.get('rejected', 0),
+                    'refilling': bool(key_doc.get('refill_lease_until')),
+                    'last_requested_at': key_doc.get('last_requested_at'),
+                    'last_refilled_at': key_doc.get('last_refilled_at')
+                })
+
+            requested = total_hits + total_misses
+            return {
+                'enabled': QUESTION_POOL_ENABLED,
+                'low_watermark': QUESTION_POOL_LOW_WATERMARK,
+                'high_watermark': QUESTION_POOL_HIGH_WATERMARK,
+                'hits': total_hits,
+                'misses': total_misses,
+                'hit_rate': round(total_hits / requested, 3) if requested else 0.0,
+                'keys': keys
+            }
+        except Exception as e:
+            print(f"Error getting question pool stats: {e}")
+            return {}
+
+# Global question pool instance
+question_pool = QuestionPool()
+
+if __name__ == '__main__':
+    # Standalone refill process: python question_pool.py [workers]
+    import sys
+    if len(sys.argv) > 1:
+        question_pool.workers = int(sys.argv[1])
+    print(f"Starting {question_pool.workers} question pool refillers...")
+    question_pool.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        question_pool.stop()
@@ -0,0 +1,114 @@
+"""
+Question Stats - precomputed statistics for the static and stored question banks
+
+Static bank counts are computed once at import. Counters for teacher-added
+questions live in a single `question_bank_stats` document that is incremented
+whenever a question is stored, so a snapshot costs one small read and is only
+re-merged when the counter version changes.
+"""
+
+import copy
+import hashlib
+import json
+import threading
+from typing import Dict, List
+from database import db
+from static_question_bank import (
+    STATIC_QUESTION_STATS, get_subjects, get_topics, question_stat_paths,
+    empty_question_stats, add_stat_path, _display_subject_name, _normalize_subject_name
+)
+
+STATS_DOCUMENT_ID = 'question_bank'
+
+_COUNTER_FIELDS = ('by_subject', 'by_topic', 'by_difficulty', 'by_type', 'by_tag')
+
+# Changes whenever the static bank changes between deployments
+STATIC_STATS_DIGEST = hashlib.sha1(
+    json.dumps(STATIC_QUESTION_STATS, sort_keys=True).encode('utf-8')
+).hexdigest()[:12]
+
+def _merge_counts(target: Dict, source: Dict) -> None:
+    for key, value in source.items():
+        if isinstance(value, dict):
+            _merge_counts(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+
+class QuestionStatsService:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def stored_counters(self) -> Dict:
+        """Counter document of the stored bank, rebuilt from the collection if missing"""
+        try:
+            counters = db.question_bank_stats.find_one({'_id': STATS_DOCUMENT_ID})
+            if counters is None:
+                counters = self.rebuild()
+            return counters
+        except Exception as e:
+            print(f"Error reading question bank statistics: {e}")
+            return {'version': 0}
+
+    def rebuild(self) -> Dict:
+        """Recount the stored question bank from scratch"""
+        counters = empty_question_stats()
+        projection = {'subject': 1, 'topic': 1, 'difficulty': 1, 'type': 1, 'tags': 1, '_id': 0}
+        for question in db.question_bank.find({}, projection):
+            counters['total_questions'] += 1
+            for path in question_stat_paths(question):
+                add_stat_path(counters, path)
+
+        previous = db.question_bank_stats.find_one({'_id': STATS_DOCUMENT_ID}, {'version': 1}) or {}
+        counters['version'] = previous.get('version', 0) + 1
+        db.question_bank_stats.replace_one({'_id': STATS_DOCUMENT_ID}, counters, upsert=True)
+        counters['_id'] = STATS_DOCUMENT_ID
+        return counters
+
+    def snapshot(self) -> Dict:
+        """Combined statistics of both banks with a version stamp usable as an ETag"""
+        counters = self.stored_counters()
+        version = f"{STATIC_STATS_DIGEST}-{counters.get('version', 0)}"
+
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot['version'] == version:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is not None and self._snapshot['version'] == version:
+                return self._snapshot
+
+            stats = copy.deepcopy(STATIC_QUESTION_STATS)
+            stats['total_questions'] += counters.get('total_questions', 0)
+            for field in _COUNTER_FIELDS:
+                _merge_counts(stats[field], counters.get(field, {}))
+
+            stats['sources'] = {
+                'static_bank': STATIC_QUESTION_STATS['total_questions'],
+                'question_bank': counters.get('total_questions', 0)
+            }
+            stats['version'] = version
+            self._snapshot = stats
+            return stats
+
+    def subjects(self) -> List[str]:
+        """Display names of the subjects in either bank"""
+        subjects = get_subjects()
+        stored = self.snapshot()['by_subject']
+        for subject in stored:
+            name = _display_subject_name(subject)
+            if name not in subjects:
+                subjects.append(name)
+        return subjects
+
+    def topics(self, subject: str) -> List[str]:
+        """Topics of a subject in either bank"""
+        subject_key = _normalize_subject_name(subject)
+        topics = get_topics(subject_key)
+        for topic in self.snapshot()['by_topic'].get(subject_key, {}):
+            if topic not in topics:
+                topics.append(topic)
+        return topics
+
+# Global question stats instance
+question_stats = QuestionStatsService()
@@ -519,6 +519,47 @@ async function apiCall(endpoint, options = {}) {
     }
 }
 
+// Streaming API helper: POSTs JSON and calls onEvent(event, data) for each server-sent event
+async function apiStream(endpoint, body, onEvent) {
+    const headers = { 'Content-Type': 'application/json' };
+    if (authToken) {
+        headers['Authorization'] = `Bearer ${authToken}`;
+    }
+
+    const response = await fetch(`${API_BASE}${endpoint}`, {
+        method: 'POST',
+        headers: headers,
+        body: JSON.stringify(body)
+    });
+    if (!response.ok) {
+        const data = await response.json();
+        throw new Error(data.error || 'API request failed');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const raw = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message';
+            let data = '';
+            for (const line of raw.split('\n')) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            onEvent(event, data ? JSON.parse(data) : null);
+        }
+    }
+}
+
 // Format date helper
 function formatDate(dateString) {
     const date = new Date(dateString);
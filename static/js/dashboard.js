@@ -178,6 +178,13 @@ function createExamCard(exam, isTeacher) {
     return card;
 }
 
+// Submissions are graded in the background and have no evaluation until grading completes
+function gradingStateHtml(response) {
+    return response.grading_status === 'failed'
+        ? '<i class="fas fa-exclamation-triangle"></i> Grading failed'
+        : '<i class="fas fa-hourglass-half"></i> Grading…';
+}
+
 // Create result card element
 function createResultCard(result) {
     const card = document.createElement('div');
@@ -189,25 +196,33 @@ function createResultCard(result) {
     const meta = document.createElement('div');
     meta.className = 'result-meta';
     
-    const score = document.createElement('span');
-    score.className = 'meta-item';
-    score.innerHTML = `<i class="fas fa-star"></i> ${result.evaluation.total_score}/${result.evaluation.max_score}`;
-    
-    const percentage = document.createElement('span');
-    percentage.className = 'meta-item';
-    percentage.innerHTML = `<i class="fas fa-percent"></i> ${result.evaluation.percentage}%`;
-    
-    const grade = document.createElement('span');
-    grade.className = 'meta-item';
-    grade.innerHTML = `<i class="fas fa-medal"></i> Grade ${result.evaluation.grade}`;
+    if (result.evaluation) {
+        const score = document.createElement('span');
+        score.className = 'meta-item';
+        score.innerHTML = `<i class="fas fa-star"></i> ${result.evaluation.total_score}/${result.evaluation.max_score}`;
+
+        const percentage = document.createElement('span');
+        percentage.className = 'meta-item';
+        percentage.innerHTML = `<i class="fas fa-percent"></i> ${result.evaluation.percentage}%`;
+
+        const grade = document.createElement('span');
+        grade.className = 'meta-item';
+        grade.innerHTML = `<i class="fas fa-medal"></i> Grade ${result.evaluation.grade}`;
+
+        meta.appendChild(score);
+        meta.appendChild(percentage);
+        meta.appendChild(grade);
+    } else {
+        const state = document.createElement('span');
+        state.className = 'meta-item';
+        state.innerHTML = gradingStateHtml(result);
+        meta.appendChild(state);
+    }
     
     const date = document.createElement('span');
     date.className = 'meta-item';
     date.innerHTML = `<i class="fas fa-calendar"></i> ${formatDate(result.submitted_at)}`;
     
-    meta.appendChild(score);
-    meta.appendChild(percentage);
-    meta.appendChild(grade);
     meta.appendChild(date);
     
     const actions = document.createElement('div');
@@ -218,7 +233,10 @@ function createResultCard(result) {
     viewBtn.innerHTML = '<i class="fas fa-eye"></i> View Details';
     viewBtn.onclick = () => viewResult(result._id);
     
-    actions.appendChild(viewBtn);
+    // Nothing to show in detail before the submission is graded
+    if (result.evaluation) {
+        actions.appendChild(viewBtn);
+    }
     
     card.appendChild(title);
     card.appendChild(meta);
@@ -456,8 +474,14 @@ async function viewExam(examId) {
 async function viewExamResponses(examId) {
     try {
         showLoading(true);
-        const response = await apiCall(`/exams/${examId}/responses`);
-        const responses = response.responses;
+        // Responses are paged; follow next_cursor until every page is loaded
+        let responses = [];
+        let cursor = null;
+        do {
+            const page = await apiCall(`/exams/${examId}/responses` + (cursor ? `?cursor=${encodeURIComponent(cursor)}` : ''));
+            responses = responses.concat(page.responses);
+            cursor = page.next_cursor;
+        } while (cursor);
 
         // Create responses view modal
         const modal = document.createElement('div');
@@ -487,6 +511,15 @@ async function viewExamResponses(examId) {
                         </div>` :
                         `<div class="responses-list" style="display: grid; gap: 20px;">
                             ${responses.map((resp, index) => {
+                                if (!resp.evaluation) {
+                                    return `
+                                <div class="response-card" style="background: #f7fafc; border: 2px dashed #cbd5e0; padding: 25px; border-radius: 16px;">
+                                    <h4 style="margin: 0 0 10px 0; color: #2d3748; font-size: 20px; font-weight: 700;">${resp.student_info ? resp.student_info.full_name || resp.student_info.username : 'Unknown Student'}</h4>
+                                    <p style="margin: 0 0 5px 0; color: ${resp.grading_status === 'failed' ? '#c53030' : '#718096'}; font-weight: 600;">${gradingStateHtml(resp)}</p>
+                                    <p style="margin: 0; color: #718096; font-size: 14px;">Submitted ${new Date(resp.submitted_at).toLocaleString()}</p>
+                                </div>`;
+                                }
+
                                 const percentage = Math.round((resp.evaluation.score / resp.evaluation.total_marks) * 100);
                                 const isPass = percentage >= 60;
                                 const gradeColor = percentage >= 90 ? '#38a169' : percentage >= 80 ? '#48bb78' : percentage >= 70 ? '#ed8936' : percentage >= 60 ? '#f6ad55' : '#e53e3e';
@@ -627,6 +660,12 @@ async function viewDetailedResponse(responseId) {
         const response = await apiCall(`/responses/${responseId}`);
         const resp = response.response;
 
+        if (!resp.evaluation) {
+            showLoading(false);
+            showAlert(resp.grading_status === 'failed' ? 'Grading of this submission failed' : 'This submission is still being graded', 'warning');
+            return;
+        }
+
         // Create detailed response view modal
         const modal = document.createElement('div');
         modal.className = 'modal';
@@ -205,6 +205,43 @@ function removeExamSection(sectionId) {
     }
 }
 
+// Generate quiz questions from a title, showing progress while they stream in.
+// Recent results for the same request are served from the server's generation cache, so asking
+// again with unchanged settings (or with "Always generate new questions" checked) sets fresh.
+let lastQuizRequest = null;
+
+async function streamQuizQuestions(requestData) {
+    const requestKey = JSON.stringify(requestData);
+    const freshCheckbox = document.getElementById('ai-fresh');
+    requestData = {
+        ...requestData,
+        fresh: requestKey === lastQuizRequest || Boolean(freshCheckbox && freshCheckbox.checked)
+    };
+    lastQuizRequest = requestKey;
+
+    const questions = [];
+    let summary = {};
+    const status = document.querySelector('#loading-spinner p');
+    const statusText = status ? status.textContent : '';
+
+    try {
+        await apiStream('/generate-quiz-from-title/stream', requestData, (event, data) => {
+            if (event === 'question') {
+                questions.push(data.question);
+                if (status) status.textContent = `Generated ${questions.length} of ${requestData.count} questions...`;
+            } else if (event === 'done') {
+                summary = data;
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        });
+    } finally {
+        if (status) status.textContent = statusText;
+    }
+
+    return { ...summary, questions: questions, total_questions: questions.length };
+}
+
 // Generate AI-powered quiz from title
 async function generateAIQuiz() {
     console.log('🚀 generateAIQuiz() called');
@@ -293,10 +330,7 @@ async function generateAIQuiz() {
         console.log('📤 API Request Data:', requestData);
         alert('📤 Sending API request for ' + questionCount + ' questions of types: ' + questionTypes.join(', '));
 
-        const response = await apiCall('/generate-quiz-from-title', {
-            method: 'POST',
-            body: JSON.stringify(requestData)
-        });
+        const response = await streamQuizQuestions(requestData);
 
         console.log('📥 API Response:', response);
 
@@ -493,15 +527,12 @@ async function generateAIQuiz() {
             return;
         }
 
-        const response = await apiCall('/generate-quiz-from-title', {
-            method: 'POST',
-            body: JSON.stringify({
-                quiz_title: title,
-                subject: subject,
-                difficulty: difficulty,
-                count: questionCount, // Use user's input for question count
-                question_types: questionTypes // Use user's selected question types
-            })
+        const response = await streamQuizQuestions({
+            quiz_title: title,
+            subject: subject,
+            difficulty: difficulty,
+            count: questionCount, // Use user's input for question count
+            question_types: questionTypes // Use user's selected question types
         });
 
         if (response.questions && response.questions.length > 0) {
@@ -1322,7 +1353,24 @@ async function submitExam(autoSubmit = false) {
             throw new Error('Failed to submit exam');
         }
 
-        const result = await response.json();
+        let result = await response.json();
+        let graded = response.status !== 202;
+
+        // Grading runs in the background, wait for it to finish
+        if (!graded) {
+            try {
+                result = await waitForGrading(result);
+                graded = true;
+            } catch (gradingError) {
+                // The submission is saved, only the results are not ready yet
+                showAlert(gradingError.message, 'warning');
+            }
+        }
+
+        // Graded inline (201) or in the background (202), the review needs the answers either way
+        if (graded) {
+            await loadAnswerKey();
+        }
 
         // Remove anti-cheating measures
         removeAntiCheating();
@@ -1340,6 +1388,36 @@ async function submitExam(autoSubmit = false) {
     }
 }
 
+// Poll the grading status of a submitted exam until it has been evaluated
+async function waitForGrading(submission, intervalMs = 2000, maxAttempts = 150) {
+    for (let attempt = 0; attempt < maxAttempts; attempt++) {
+        const status = await apiCall(`/responses/${submission.response_id}/status`);
+
+        if (status.status === 'completed') {
+            return status;
+        }
+        if (status.status === 'failed') {
+            throw new Error(status.error || 'Grading failed');
+        }
+
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+
+    throw new Error('Grading is taking longer than expected. Check your results later.');
+}
+
+// The exam is delivered without answers; fetch them for the detailed review once submitted
+async function loadAnswerKey() {
+    try {
+        const data = await apiCall(`/exams/${currentExamData._id}/answers`);
+        currentExamData.questions.forEach((question, index) => {
+            Object.assign(question, data.answers[index] || {});
+        });
+    } catch (error) {
+        console.error('Failed to load answer key:', error);
+    }
+}
+
 // Remove anti-cheating measures
 function removeAntiCheating() {
     document.removeEventListener('contextmenu', preventRightClick);
@@ -2,6 +2,8 @@
 Static Question Bank - Comprehensive collection of educational questions
 """
 
+import random
+
 def _normalize_subject_name(subject_display_name):
     """Convert display subject name back to internal format"""
     if not subject_display_name:
@@ -278,92 +280,182 @@ STATIC_QUESTION_BANK = {
     }
 }
 
+class QuestionBankIndex:
+    """Inverted index over a question bank, built once
+
+    Every question gets an integer id in bank order. Each subject, topic,
+    difficulty, type and tag maps to a posting list stored as a bitset (a Python
+    int with bit i set for question i), so filters are bitwise intersections and
+    only the selected ids are turned into question dicts.
+    """
+
+    def __init__(self, bank):
+        self._questions = []
+        self._postings = {'subject': {}, 'topic': {}, 'difficulty': {}, 'type': {}, 'tag': {}}
+
+        for subj, topics in bank.items():
+            for top, difficulties in topics.items():
+                for diff, question_list in difficulties.items():
+                    for q in question_list:
+                        bit = 1 << len(self._questions)
+                        self._questions.append((q, subj, top, diff))
+
+                        self._add('subject', subj, bit)
+                        self._add('topic', top, bit)
+                        self._add('difficulty', diff, bit)
+                        self._add('type', q.get('type', ''), bit)
+                        for tag in q.get('tags', []):
+                            self._add('tag', tag, bit)
+
+        self.all_ids = (1 << len(self._questions)) - 1
+
+    def _add(self, field, value, bit):
+        postings = self._postings[field]
+        key = str(value).lower()
+        postings[key] = postings.get(key, 0) | bit
+
+    def posting(self, field, value):
+        """Bitset of the questions whose field equals value (case-insensitive)"""
+        return self._postings[field].get(str(value).lower(), 0)
+
+    def match(self, subject=None, topic=None, difficulty=None, question_type=None, tags=None):
+        """Bitset of the questions matching every given filter (any of the tags)"""
+        ids = self.all_ids
+        if subject:
+            ids &= self.posting('subject', subject)
+        if topic:
+            ids &= self.posting('topic', topic)
+        if difficulty:
+            ids &= self.posting('difficulty', difficulty)
+        if question_type:
+            ids &= self.posting('type', question_type)
+        if tags:
+            tag_ids = 0
+            for tag in tags:
+                tag_ids |= self.posting('tag', tag)
+            ids &= tag_ids
+        return ids
+
+    @staticmethod
+    def iter_ids(ids):
+        """Question ids set in a bitset, in bank order"""
+        while ids:
+            lowest = ids & -ids
+            yield lowest.bit_length() - 1
+            ids ^= lowest
+
+    def materialize(self, question_id):
+        """Copy of a question with its subject, topic and difficulty metadata"""
+        q, subj, top, diff = self._questions[question_id]
+        question_copy = q.copy()
+        question_copy['subject'] = subj
+        question_copy['topic'] = top
+        question_copy['difficulty'] = diff
+        question_copy['source'] = 'static_bank'
+        return question_copy
+
+    def __len__(self):
+        return len(self._questions)
+
+# Index of the static bank, built once at import
+QUESTION_INDEX = QuestionBankIndex(STATIC_QUESTION_BANK)
+
 def get_questions_by_criteria(subject=None, topic=None, difficulty=None, question_type=None, tags=None, limit=None):
     """
     Retrieve questions based on specified criteria
     """
-    questions = []
-
     # Normalize subject name if provided
     normalized_subject = _normalize_subject_name(subject) if subject else None
 
-    for subj, topics in STATIC_QUESTION_BANK.items():
-        if normalized_subject and subj.lower() != normalized_subject.lower():
-            continue
-            
-        for top, difficulties in topics.items():
-            if topic and top.lower() != topic.lower():
-                continue
-                
-            for diff, question_list in difficulties.items():
-                if difficulty and diff.lower() != difficulty.lower():
-                    continue
-                    
-                for q in question_list:
-                    # Filter by question type
-                    if question_type and q.get('type', '').lower() != question_type.lower():
-                        continue
-                    
-                    # Filter by tags
-                    if tags:
-                        question_tags = q.get('tags', [])
-                        if not any(tag.lower() in [t.lower() for t in question_tags] for tag in tags):
-                            continue
-                    
-                    # Add metadata
-                    question_copy = q.copy()
-                    question_copy['subject'] = subj
-                    question_copy['topic'] = top
-                    question_copy['difficulty'] = diff
-                    question_copy['source'] = 'static_bank'
-                    
-                    questions.append(question_copy)
-    
-    # Apply limit if specified
-    if limit and len(questions) > limit:
-        import random
-        questions = random.sample(questions, limit)
-    
-    return questions
+    ids = QUESTION_INDEX.match(
+        subject=normalized_subject,
+        topic=topic,
+        difficulty=difficulty,
+        question_type=question_type,
+        tags=tags
+    )
+    question_ids = list(QUESTION_INDEX.iter_ids(ids))
 
-def get_subjects():
-    """Get all available subjects"""
-    subjects = list(STATIC_QUESTION_BANK.keys())
-    # Convert to proper display format
-    formatted_subjects = []
-    for subject in subjects:
-        if subject == "computer_science":
-            formatted_subjects.append("Computer Science")
-        else:
-            formatted_subjects.append(subject.capitalize())
-    return formatted_subjects
+    # Apply limit by sampling ids before copying any question
+    if limit and len(question_ids) > limit:
+        question_ids = random.sample(question_ids, limit)
 
-def get_topics(subject):
-    """Get all topics for a subject"""
-    return list(STATIC_QUESTION_BANK.get(subject, {}).keys())
+    return [QUESTION_INDEX.materialize(question_id) for question_id in question_ids]
 
-def get_question_stats():
-    """Get statistics about the question bank"""
-    stats = {
+def _display_subject_name(subject):
+    """Convert internal subject name to display format"""
+    if subject == "computer_science":
+        return "Computer Science"
+    return subject.capitalize()
+
+def _stat_key(value):
+    """Counter key safe to use in a MongoDB field path"""
+    return str(value).strip().replace('.', '_').replace('$', '_') or 'unknown'
+
+def question_stat_paths(question, subject=None, topic=None, difficulty=None):
+    """Statistics counter paths ("by_subject.physics", ...) a question is counted under"""
+    subject = _stat_key(_normalize_subject_name(subject or question.get('subject')) or 'unknown')
+    topic = _stat_key(str(topic or question.get('topic') or 'general').lower().replace(' ', '_'))
+    difficulty = _stat_key(str(difficulty or question.get('difficulty') or 'medium').lower())
+    question_type = _stat_key(str(question.get('type') or 'mcq').lower())
+
+    paths = [
+        f'by_subject.{subject}',
+        f'by_topic.{subject}.{topic}',
+        f'by_difficulty.{difficulty}',
+        f'by_type.{question_type}'
+    ]
+    paths.extend(f'by_tag.{_stat_key(tag.lower())}' for tag in set(question.get('tags', [])) if isinstance(tag, str))
+    return paths
+
+def empty_question_stats():
+    """Statistics with no questions counted"""
+    return {
         'total_questions': 0,
         'by_subject': {},
+        'by_topic': {},
         'by_difficulty': {'easy': 0, 'medium': 0, 'hard': 0},
-        'by_type': {'mcq': 0, 'short_answer': 0, 'descriptive': 0}
+        'by_type': {'mcq': 0, 'short_answer': 0, 'descriptive': 0},
+        'by_tag': {}
     }
-    
+
+def add_stat_path(stats, path, amount=1):
+    """Increment a dotted counter path in a statistics dict"""
+    *parents, leaf = path.split('.')
+    node = stats
+    for key in parents:
+        node = node.setdefault(key, {})
+    node[leaf] = node.get(leaf, 0) + amount
+
+def _compute_static_stats():
+    stats = empty_question_stats()
     for subject, topics in STATIC_QUESTION_BANK.items():
-        subject_count = 0
         for topic, difficulties in topics.items():
             for difficulty, questions in difficulties.items():
-                count = len(questions)
-                subject_count += count
-                stats['total_questions'] += count
-                stats['by_difficulty'][difficulty] += count
-                
                 for q in questions:
-                    q_type = q.get('type', 'mcq')
-                    stats['by_type'][q_type] = stats['by_type'].get(q_type, 0) + 1
-        
-        stats['by_subject'][subject] = subject_count
-    
+                    stats['total_questions'] += 1
+                    for path in question_stat_paths(q, subject, topic, difficulty):
+                        add_stat_path(stats, path)
     return stats
+
+# Subjects, topics and statistics of the static bank never change at runtime
+_SUBJECTS = tuple(_display_subject_name(subject) for subject in STATIC_QUESTION_BANK)
+_TOPICS = {subject: tuple(topics) for subject, topics in STATIC_QUESTION_BANK.items()}
+STATIC_QUESTION_STATS = _compute_static_stats()
+
+def get_subjects():
+    """Get all available subjects"""
+    return list(_SUBJECTS)
+
+def get_topics(subject):
+    """Get all topics for a subject"""
+    return list(_TOPICS.get(subject, ()))
+
+def get_question_stats():
+    """Get statistics about the question bank"""
+    return {
+        'total_questions': STATIC_QUESTION_STATS['total_questions'],
+        'by_subject': dict(STATIC_QUESTION_STATS['by_subject']),
+        'by_difficulty': dict(STATIC_QUESTION_STATS['by_difficulty']),
+        'by_type': dict(STATIC_QUESTION_STATS['by_type'])
+    }